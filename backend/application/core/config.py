@@ -1,23 +1,146 @@
-from pydantic import BaseModel, Field
-from pydantic_settings import BaseSettings
+import typing
 
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-class QdrantSettings(BaseModel):
+
+class _EnvSettings(BaseSettings):
+    """Config group whose fields are read from the env var named by their alias"""
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_file_encoding='utf-8',
+        extra='ignore',
+    )
+
+
+class QdrantSettings(_EnvSettings):
     """Qdrant config"""
-    host: str = Field('localhost', env='QDRANT_HOST')
-    port: int = Field(6333, env='QDRANT_PORT')
-    collection: str = Field('nn_places', env='QDRANT_COLLECTION')
-    vector_size: int = Field(1536, env='VECTOR_SIZE')
+    host: str = Field('localhost', validation_alias='QDRANT_HOST')
+    port: int = Field(6333, validation_alias='QDRANT_PORT')
+    grpc_port: int = Field(6334, validation_alias='QDRANT_GRPC_PORT')
+    prefer_grpc: bool = Field(False, validation_alias='QDRANT_PREFER_GRPC')
+    use_async: bool = Field(False, validation_alias='QDRANT_USE_ASYNC')
+    collection: str = Field('nn_places', validation_alias='QDRANT_COLLECTION')
+    vector_size: int = Field(1536, validation_alias='VECTOR_SIZE')
         
     @property
     def connection_string(self) -> str:
         return f'http://{self.host}:{self.port}'
 
+
+class SearchSettings(_EnvSettings):
+    """Vector search config"""
+    backend: typing.Literal['qdrant', 'numpy'] = Field('qdrant', validation_alias='SEARCH_BACKEND')
+    vectors_path: str = Field('place_vectors.npz', validation_alias='SEARCH_VECTORS_PATH')
+    geo_filter: bool = Field(True, validation_alias='SEARCH_GEO_FILTER')
+    top_k: int = Field(10, validation_alias='SEARCH_TOP_K')
+    max_top_k: int = Field(80, validation_alias='SEARCH_MAX_TOP_K')
+
+
+class RouteSettings(_EnvSettings):
+    """Route search config"""
+    deadline_ms: float = Field(50, validation_alias='ROUTE_DEADLINE_MS')
+
+
+class CatalogSettings(_EnvSettings):
+    """Place catalog config"""
+    path: str = Field('place_catalog.bin', validation_alias='CATALOG_PATH')
+    watch_interval_seconds: float = Field(5, validation_alias='CATALOG_WATCH_INTERVAL_SECONDS')
+
+
+class EmbeddingSettings(_EnvSettings):
+    """Embedding model config"""
+    batch_size: int = Field(32, validation_alias='EMBEDDING_BATCH_SIZE')
+    max_length: int = Field(512, validation_alias='EMBEDDING_MAX_LENGTH')
+    batch_wait_ms: float = Field(5, validation_alias='EMBEDDING_BATCH_WAIT_MS')
+    backend: typing.Literal['torch', 'onnx'] = Field('torch', validation_alias='EMBEDDING_BACKEND')
+    onnx_path: str = Field('frida_onnx/model_int8.onnx', validation_alias='EMBEDDING_ONNX_PATH')
+    onnx_threads: int = Field(0, validation_alias='EMBEDDING_ONNX_THREADS')
+
+
+class EmbeddingCacheSettings(_EnvSettings):
+    """Query embedding cache config"""
+    enabled: bool = Field(True, validation_alias='EMBEDDING_CACHE_ENABLED')
+    path: str = Field('embedding_cache.sqlite3', validation_alias='EMBEDDING_CACHE_PATH')
+    max_entries: int = Field(100_000, validation_alias='EMBEDDING_CACHE_MAX_ENTRIES')
+    ttl_seconds: float = Field(30 * 24 * 3600, validation_alias='EMBEDDING_CACHE_TTL_SECONDS')
+
+
+class ModelsSettings(_EnvSettings):
+    """Model lifecycle config"""
+    preload: bool = Field(True, validation_alias='MODELS_PRELOAD')
+    warmup: bool = Field(True, validation_alias='MODELS_WARMUP')
+    server_socket: str | None = Field(None, validation_alias='MODEL_SERVER_SOCKET')
+    server_timeout_seconds: float = Field(300, validation_alias='MODEL_SERVER_TIMEOUT_SECONDS')
+    server_batch_wait_ms: float = Field(5, validation_alias='MODEL_SERVER_BATCH_WAIT_MS')
+    server_generation_batch_size: int = Field(16, validation_alias='MODEL_SERVER_GENERATION_BATCH_SIZE')
+
+
+class ResponseCacheSettings(_EnvSettings):
+    """Semantic /handle response cache config"""
+    enabled: bool = Field(True, validation_alias='RESPONSE_CACHE_ENABLED')
+    similarity_threshold: float = Field(0.97, validation_alias='RESPONSE_CACHE_SIMILARITY')
+    max_entries: int = Field(1024, validation_alias='RESPONSE_CACHE_MAX_ENTRIES')
+    ttl_seconds: float = Field(3600, validation_alias='RESPONSE_CACHE_TTL_SECONDS')
+    geohash_precision: int = Field(6, validation_alias='RESPONSE_CACHE_GEOHASH_PRECISION')
+
+
+class ExplanationStoreSettings(_EnvSettings):
+    """Pre-generated explanations config"""
+    enabled: bool = Field(False, validation_alias='EXPLANATION_STORE_ENABLED')
+    path: str = Field('explanations.json', validation_alias='EXPLANATION_STORE_PATH')
+    similarity_threshold: float = Field(0.8, validation_alias='EXPLANATION_STORE_SIMILARITY')
+
+
+class AdminSettings(_EnvSettings):
+    """Admin endpoints config"""
+    token: str | None = Field(None, validation_alias='ADMIN_TOKEN')
+
+
+class GenerationSettings(_EnvSettings):
+    """Text generation model config"""
+    max_new_tokens: int = Field(256, validation_alias='GENERATION_MAX_NEW_TOKENS')
+    mode: typing.Literal['sequential', 'batched', 'prefix_cache'] = Field(
+        'batched',
+        validation_alias='GENERATION_MODE',
+    )
+    precision: typing.Literal['auto', 'bf16', 'int8', 'int4'] = Field(
+        'auto',
+        validation_alias='GENERATION_PRECISION',
+    )
+    report_stats: bool = Field(False, validation_alias='GENERATION_REPORT_STATS')
+
+
+class AdmissionSettings(_EnvSettings):
+    """Admission control of the model stages"""
+    load_shedding: bool = Field(True, validation_alias='ADMISSION_LOAD_SHEDDING')
+    embedding_concurrency: int = Field(64, validation_alias='ADMISSION_EMBEDDING_CONCURRENCY')
+    generation_concurrency: int = Field(2, validation_alias='ADMISSION_GENERATION_CONCURRENCY')
+    max_wait_seconds: float = Field(10, validation_alias='ADMISSION_MAX_WAIT_SECONDS')
+    generation_overload: typing.Literal['reject', 'degrade'] = Field(
+        'degrade',
+        validation_alias='ADMISSION_GENERATION_OVERLOAD',
+    )
+
+
 class Settings(BaseSettings):
-    qdrant: QdrantSettings = QdrantSettings()
+    qdrant: QdrantSettings = Field(default_factory=QdrantSettings)
+    search: SearchSettings = Field(default_factory=SearchSettings)
+    route: RouteSettings = Field(default_factory=RouteSettings)
+    catalog: CatalogSettings = Field(default_factory=CatalogSettings)
+    embedding: EmbeddingSettings = Field(default_factory=EmbeddingSettings)
+    embedding_cache: EmbeddingCacheSettings = Field(default_factory=EmbeddingCacheSettings)
+    generation: GenerationSettings = Field(default_factory=GenerationSettings)
+    models: ModelsSettings = Field(default_factory=ModelsSettings)
+    response_cache: ResponseCacheSettings = Field(default_factory=ResponseCacheSettings)
+    explanation_store: ExplanationStoreSettings = Field(default_factory=ExplanationStoreSettings)
+    admin: AdminSettings = Field(default_factory=AdminSettings)
+    admission: AdmissionSettings = Field(default_factory=AdmissionSettings)
 
-    class Config:
-        env_file = '.env'
-        env_file_encoding = 'utf-8'
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_file_encoding='utf-8',
+        extra='ignore',
+    )
 
 settings = Settings()
@@ -0,0 +1,137 @@
+import pathlib
+import threading
+
+import numpy as np
+
+from core.config import settings
+from models.place_payload import PlacePayload
+
+BACKEND_ROOT = pathlib.Path(__file__).parent.parent.parent
+EARTH_RADIUS_METERS = 6_371_000
+
+
+def haversine_meters(
+    latitude: float,
+    longitude: float,
+    locations: np.ndarray,
+) -> np.ndarray:
+    """Great-circle distances from the point to every [lat, lon] row of locations."""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(locations[:, 0]), np.radians(locations[:, 1])
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def write_vectors(path: pathlib.Path, vectors: np.ndarray, payloads: list[dict]) -> None:
+    """
+    Saves vectors and Qdrant-style payloads for NumpyRepository.
+
+    Args:
+        path (pathlib.Path): output .npz file
+        vectors (np.ndarray): one embedding per payload
+        payloads (list[dict]): payloads with id, title, desc and location
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) != len(payloads):
+        raise ValueError(f'Got {len(vectors)} vectors for {len(payloads)} payloads')
+
+    np.savez(
+        path,
+        vectors=vectors,
+        ids=np.array([payload['id'] for payload in payloads], dtype=np.int64),
+        titles=np.array([payload['title'] for payload in payloads], dtype=np.str_),
+        descriptions=np.array([payload['desc'] for payload in payloads], dtype=np.str_),
+        locations=np.array(
+            [
+                [payload['location']['lat'], payload['location']['lon']]
+                for payload in payloads
+            ],
+            dtype=np.float64,
+        ).reshape(len(payloads), 2),
+    )
+
+
+class NumpyRepository:
+    """Exact cosine search over all places held in memory."""
+
+    def __init__(self, path: pathlib.Path | None = None) -> None:
+        path = path or BACKEND_ROOT / settings.search.vectors_path
+        with np.load(path) as data:
+            vectors = data['vectors'].astype(np.float32)
+            self.ids: np.ndarray = data['ids']
+            self.titles: np.ndarray = data['titles']
+            self.descriptions: np.ndarray = data['descriptions']
+            self.locations: np.ndarray = data['locations']
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors: np.ndarray = vectors / np.where(norms == 0, 1, norms)
+
+    def search(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        origin: tuple[float, float] | None = None,
+        radius: float | None = None,
+    ) -> list[PlacePayload]:
+        """
+        Searches for the top-k places based on semantic similarity to the user's query.
+
+        Args:
+            vector (List[float]): query vector
+            top_k (int): number of nearest places to return
+            origin (tuple[float, float] | None): latitude and longitude of the user
+            radius (float | None): only places within this many meters of origin
+
+        Returns:
+            List[PlacePayload]: a list of places with metadata and score
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0 or len(self.vectors) == 0:
+            return []
+
+        candidates = np.arange(len(self.vectors))
+        if origin is not None and radius is not None:
+            distances = haversine_meters(origin[0], origin[1], self.locations)
+            candidates = np.flatnonzero(distances <= radius)
+            if len(candidates) == 0:
+                return []
+
+        scores = self.vectors[candidates] @ (query / query_norm)
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        output: list[PlacePayload] = []
+        for index in top:
+            row = candidates[index]
+            try:
+                place = PlacePayload(
+                    id=int(self.ids[row]),
+                    title=str(self.titles[row]),
+                    description=str(self.descriptions[row]),
+                    score=float(scores[index]),
+                    latitude=float(self.locations[row, 0]),
+                    longitude=float(self.locations[row, 1]),
+                )
+                output.append(place)
+            except Exception as e:
+                print(f'Create PlacePayload error: {e}')
+
+        return output
+
+
+_repository: NumpyRepository | None = None
+_repository_lock = threading.Lock()
+
+
+def get_repository() -> NumpyRepository:
+    """Repository shared by all requests of the process."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = NumpyRepository()
+    return _repository
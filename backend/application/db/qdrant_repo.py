@@ -1,12 +1,62 @@
-from qdrant_client import QdrantClient, models
+import threading
+
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
 
 from core.config import settings
 from models.place_payload import PlacePayload
 
 
+def _to_place_payloads(points: list[models.ScoredPoint]) -> list[PlacePayload]:
+    output: list[PlacePayload] = []
+
+    for point in points:
+        raw_payload = point.payload or {}
+
+        payload_data = {
+            'id': raw_payload.get('id'),
+            'title': raw_payload.get('title'),
+            'description': raw_payload.get('desc'),
+            'score': point.score,
+            'latitude': raw_payload.get('location', {}).get('lat'),
+            'longitude': raw_payload.get('location', {}).get('lon'),
+        }
+
+        try:
+            place = PlacePayload(**payload_data)
+            output.append(place)
+        except Exception as e:
+            print(f'Create PlacePayload error: {e}')
+
+    return output
+
+
+def _geo_filter(
+    origin: tuple[float, float] | None,
+    radius: float | None,
+) -> models.Filter | None:
+    if origin is None or radius is None:
+        return None
+
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key='location',
+                geo_radius=models.GeoRadius(
+                    center=models.GeoPoint(lat=origin[0], lon=origin[1]),
+                    radius=radius,
+                ),
+            ),
+        ],
+    )
+
+
 class QdrantRepository:
     def __init__(self) -> None:
-        self.client = QdrantClient(url=settings.qdrant.connection_string)
+        self.client = QdrantClient(
+            url=settings.qdrant.connection_string,
+            grpc_port=settings.qdrant.grpc_port,
+            prefer_grpc=settings.qdrant.prefer_grpc,
+        )
         self.collection_name = settings.qdrant.collection
 
     def create_collection(self) -> None:
@@ -18,14 +68,27 @@ class QdrantRepository:
                     distance=models.Distance.COSINE,
                 ),
             )
+        self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name='location',
+            field_schema=models.PayloadSchemaType.GEO,
+        )
 
-    def search(self, vector: list[float], top_k: int = 10) -> list[PlacePayload]:
+    def search(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        origin: tuple[float, float] | None = None,
+        radius: float | None = None,
+    ) -> list[PlacePayload]:
         """
         Searches for the top-k places based on semantic similarity to the user's query.
 
         Args:
             vector (List[float]): query vector
             top_k (int): number of nearest places to return
+            origin (tuple[float, float] | None): latitude and longitude of the user
+            radius (float | None): only places within this many meters of origin
 
         Returns:
             List[PlacePayload]: a list of places with metadata and score
@@ -33,27 +96,72 @@ class QdrantRepository:
         results = self.client.query_points(
             collection_name=self.collection_name,
             query=vector,
+            query_filter=_geo_filter(origin, radius),
             limit=top_k,
         )
+        return _to_place_payloads(results.points)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class AsyncQdrantRepository:
+    def __init__(self) -> None:
+        self.client = AsyncQdrantClient(
+            url=settings.qdrant.connection_string,
+            grpc_port=settings.qdrant.grpc_port,
+            prefer_grpc=settings.qdrant.prefer_grpc,
+        )
+        self.collection_name = settings.qdrant.collection
+
+    async def search(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        origin: tuple[float, float] | None = None,
+        radius: float | None = None,
+    ) -> list[PlacePayload]:
+        """Async variant of QdrantRepository.search."""
+        results = await self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            query_filter=_geo_filter(origin, radius),
+            limit=top_k,
+        )
+        return _to_place_payloads(results.points)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+_repository: QdrantRepository | None = None
+_async_repository: AsyncQdrantRepository | None = None
+_repository_lock = threading.Lock()
+
 
-        output: list[PlacePayload] = []
+def get_repository() -> QdrantRepository:
+    """Repository shared by all requests of the process."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = QdrantRepository()
+    return _repository
 
-        for point in results.points:
-            raw_payload = point.payload or {}
 
-            payload_data = {
-                'id': raw_payload.get('id'),
-                'title': raw_payload.get('title'),
-                'description': raw_payload.get('desc'),
-                'score': point.score,
-                'latitude': raw_payload.get('location', {}).get('lat'),
-                'longitude': raw_payload.get('location', {}).get('lon'),
-            }
+def get_async_repository() -> AsyncQdrantRepository:
+    """Async repository shared by all requests of the process."""
+    global _async_repository
+    if _async_repository is None:
+        _async_repository = AsyncQdrantRepository()
+    return _async_repository
 
-            try:
-                place = PlacePayload(**payload_data)
-                output.append(place)
-            except Exception as e:
-                print(f'Create PlacePayload error: {e}')
 
-        return output
+async def close_repositories() -> None:
+    """Closes the shared clients, called on application shutdown."""
+    global _repository, _async_repository
+    if _repository is not None:
+        _repository.close()
+        _repository = None
+    if _async_repository is not None:
+        await _async_repository.close()
+        _async_repository = None
@@ -0,0 +1,26 @@
+import typing
+
+import db.numpy_repo
+import db.qdrant_repo
+from core.config import settings
+from models.place_payload import PlacePayload
+
+
+class SearchBackend(typing.Protocol):
+    def search(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        origin: tuple[float, float] | None = None,
+        radius: float | None = None,
+    ) -> list[PlacePayload]: ...
+
+
+def get_search_backend() -> SearchBackend:
+    """Search backend selected by settings.search.backend."""
+    if settings.search.backend == 'numpy':
+        return db.numpy_repo.get_repository()
+    if settings.search.backend == 'qdrant':
+        return db.qdrant_repo.get_repository()
+
+    raise ValueError(f'Unknown search backend: {settings.search.backend}')
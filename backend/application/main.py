@@ -1,18 +1,115 @@
 """Entrypoint of the application."""
 
+import asyncio
+import contextlib
+import json
+import secrets
+import typing
+
 import fastapi
+import fastapi.concurrency
+import fastapi.responses
 import slowapi
 import slowapi.errors
+import starlette.background
 import uvicorn
 
+import core.config
 import db.qdrant_repo
+import db.search_backend
 import models.place_payload
 import schemas.user_io
+import services.admission
+import services.catalog
+import services.embedding_cache
+import services.explanation_store
 import services.limiter
+import services.metrics
 import services.ml
+import services.response_cache
+import services.scheduler
 import services.utils
 
-app = fastapi.FastAPI()
+MODEL_SERVER_RETRY_MIN_SECONDS = 1.
+MODEL_SERVER_RETRY_MAX_SECONDS = 30.
+
+
+def _load_models() -> None:
+    if core.config.settings.models.warmup:
+        services.ml.warmup()
+    else:
+        services.ml.get_embedding_model()
+        services.ml.get_text_generation_model()
+    services.explanation_store.get_explanation_store()
+
+
+async def _prepare_models(app: fastapi.FastAPI) -> None:
+    delay = MODEL_SERVER_RETRY_MIN_SECONDS
+    while True:
+        try:
+            await fastapi.concurrency.run_in_threadpool(_load_models)
+            break
+        except Exception as e:
+            print(f'Failed to load models: {e}')
+            # The model server may still be loading its models.
+            if core.config.settings.models.server_socket is None:
+                return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MODEL_SERVER_RETRY_MAX_SECONDS)
+    app.state.models_ready = True
+
+
+def _on_catalog_swap(catalog: services.catalog.Catalog) -> None:
+    print(f'Catalog {catalog.version:016x} with {len(catalog)} places loaded')
+    services.response_cache.response_cache.invalidate()
+    services.explanation_store.invalidate()
+
+
+services.utils.catalog_holder.add_listener(_on_catalog_swap)
+
+services.metrics.register_cache(
+    'response',
+    lambda: (
+        services.response_cache.response_cache
+        if core.config.settings.response_cache.enabled else None
+    ),
+)
+services.metrics.register_cache('embedding', services.embedding_cache.get_embedding_cache)
+services.metrics.register_cache(
+    'explanation_store',
+    services.explanation_store.get_explanation_store,
+)
+
+
+async def _watch_catalog(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await fastapi.concurrency.run_in_threadpool(
+                services.utils.catalog_holder.reload_if_changed,
+            )
+        except (OSError, services.catalog.CatalogError) as e:
+            print(f'Failed to reload catalog: {e}')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI) -> typing.AsyncIterator[None]:
+    app.state.models_ready = False
+    if core.config.settings.models.preload:
+        app.state.models_task = asyncio.create_task(_prepare_models(app))
+    watch_interval = core.config.settings.catalog.watch_interval_seconds
+    watcher = (
+        asyncio.create_task(_watch_catalog(watch_interval))
+        if watch_interval > 0 else None
+    )
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await services.scheduler.embedding_batcher.close()
+    await db.qdrant_repo.close_repositories()
+
+
+app = fastapi.FastAPI(lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -31,52 +128,418 @@ app.add_exception_handler(
 )
 
 
-@app.post('/handle')
-@services.limiter.limiter.limit('3/second')
-def handle_input(
+@app.exception_handler(services.admission.OverloadedError)
+def _overloaded_handler(
     request: fastapi.Request,
+    exc: services.admission.OverloadedError,
+) -> fastapi.responses.JSONResponse:
+    services.metrics.REQUESTS.inc(endpoint=request.url.path, outcome='rejected')
+    return fastapi.responses.JSONResponse(
+        {'detail': str(exc)},
+        status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+NO_PLACES_MESSAGE = (
+    'There are no places that matches your description.'
+    ' Please try to search something else.'
+)
+
+
+async def _search(
+    embedding: list[float],
+    top_k: int,
+    origin: tuple[float, float],
+    radius: float | None,
+) -> list[models.place_payload.PlacePayload]:
+    if (
+        core.config.settings.search.backend == 'qdrant'
+        and core.config.settings.qdrant.use_async
+    ):
+        return await db.qdrant_repo.get_async_repository().search(
+            embedding,
+            top_k,
+            origin,
+            radius,
+        )
+
+    return await fastapi.concurrency.run_in_threadpool(
+        db.search_backend.get_search_backend().search,
+        embedding,
+        top_k,
+        origin,
+        radius,
+    )
+
+
+async def _search_candidates(
     data: schemas.user_io.UserInput,
-) -> schemas.user_io.UserOutput:
-    """Endpoint for receiving user input from frontend."""
+    embedding: list[float],
+    catalog: services.catalog.Catalog,
+) -> list[models.place_payload.PlacePayload]:
+    """
+    Searches places within walking distance of the user.
 
-    embedding: list[float] = services.ml.embedding_model(data.prompt)
-    repository: db.qdrant_repo.QdrantRepository = db.qdrant_repo.QdrantRepository()
-    places: models.place_payload.PlacePayload = repository.search(embedding)
-    route_info: tuple[list[models.place_payload.PlacePayload], int] = (
-        services.utils.get_best_route(
+    top_k is doubled up to settings.search.max_top_k while the search keeps
+    returning full pages with too few places reachable within the budget.
+    """
+    search_settings = core.config.settings.search
+    origin = (data.latitude, data.longitude)
+    radius = (
+        services.utils.get_search_radius(data.time_for_walk)
+        if search_settings.geo_filter else None
+    )
+    top_k = search_settings.top_k
+    while True:
+        places = await _search(embedding, top_k, origin, radius)
+        if len(places) < top_k or top_k >= search_settings.max_top_k:
+            return places
+
+        reachable = services.utils.count_reachable(
             places,
             data.time_for_walk,
             data.latitude,
             data.longitude,
+            catalog,
+        )
+        if reachable >= services.utils.MAX_PLACES_COUNT:
+            return places
+        top_k = min(top_k * 2, search_settings.max_top_k)
+
+
+async def _find_route(
+    data: schemas.user_io.UserInput,
+    embedding: list[float],
+    timer: services.metrics.StageTimer,
+) -> tuple[list[models.place_payload.PlacePayload], int, bool] | None:
+    catalog = services.utils.catalog_holder.get()
+    with timer.stage('search'):
+        places = await _search_candidates(data, embedding, catalog)
+    with timer.stage('route'):
+        return await fastapi.concurrency.run_in_threadpool(
+            services.utils.get_best_route,
+            places,
+            data.time_for_walk,
+            data.latitude,
+            data.longitude,
+            catalog,
+        )
+
+
+def _admit_generation() -> bool:
+    """
+    Checks the queue of the text generation model.
+
+    Returns:
+        bool: False when the response should be degraded to the route only
+    """
+    try:
+        services.admission.generation_gate.check()
+    except services.admission.OverloadedError:
+        if core.config.settings.admission.generation_overload == 'reject':
+            raise
+        return False
+    return True
+
+
+def _get_stored_explanations(
+    prompt: str,
+    embedding: list[float],
+    route: list[models.place_payload.PlacePayload],
+    timer: services.metrics.StageTimer,
+) -> list[str] | None:
+    # Runs in the threadpool, the first call reads the store from disk.
+    store = services.explanation_store.get_explanation_store()
+    if store is None:
+        return None
+    with timer.stage('explanation_store'):
+        return store.explain(prompt, embedding, route)
+
+
+def _get_desc_selection(
+    prompt: str,
+    route: list[models.place_payload.PlacePayload],
+) -> list[str]:
+    # Runs in a worker thread, the first call loads the model.
+    return services.ml.get_text_generation_model().get_desc_selection(prompt, route)
+
+
+def _iter_desc_selection(
+    prompt: str,
+    route: list[models.place_payload.PlacePayload],
+) -> typing.Iterator[str]:
+    # Runs in a worker thread, the first call loads the model.
+    return services.ml.get_text_generation_model().iter_desc_selection(prompt, route)
+
+
+async def _handle(
+    data: schemas.user_io.UserInput,
+    timer: services.metrics.StageTimer,
+) -> tuple[schemas.user_io.UserOutput, str]:
+    """Response to the request and the outcome label of the requests counter."""
+    with timer.stage('embedding'):
+        embedding: list[float] = await services.scheduler.embed(data.prompt)
+    cache = (
+        services.response_cache.response_cache
+        if core.config.settings.response_cache.enabled else None
+    )
+    if cache is not None:
+        with timer.stage('response_cache'):
+            cached_response = cache.get(
+                embedding,
+                data.latitude,
+                data.longitude,
+                data.time_for_walk,
+            )
+        if cached_response is not None:
+            return cached_response, 'cached'
+
+    route_info = await _find_route(data, embedding, timer)
+    if route_info is None:
+        no_places = schemas.user_io.UserOutput(
+            walking_time=None,
+            walking_path=[],
+            explanation=[NO_PLACES_MESSAGE],
+        )
+        return no_places, 'no_route'
+
+    best_route, best_time, optimal = route_info
+    explanation = await fastapi.concurrency.run_in_threadpool(
+        _get_stored_explanations,
+        data.prompt,
+        embedding,
+        best_route,
+        timer,
+    )
+    if explanation is None and not _admit_generation():
+        degraded = schemas.user_io.UserOutput(
+            walking_time=best_time,
+            walking_path=best_route,
+            explanation=[],
+            optimal=optimal,
         )
+        return degraded, 'degraded'
+    if explanation is None:
+        with timer.stage('generation'):
+            async with services.admission.generation_gate.slot():
+                explanation = await services.admission.run_to_completion(
+                    _get_desc_selection,
+                    data.prompt,
+                    best_route,
+                )
+
+    response = schemas.user_io.UserOutput(
+        walking_time=best_time,
+        walking_path=best_route,
+        explanation=explanation,
+        optimal=optimal,
     )
-    best_route: list[models.place_payload.PlacePayload] = route_info[0]
-    best_time: int = route_info[1]
-    # print(best_route)
-    # print(len(best_route))
-    print(best_time)
-    if best_route is not None:
-        explanation = services.ml.text_generation_model.get_desc_selection(
-            data.prompt,
-            best_route,
+    # A route cut by the solver deadline may be improved by the next request.
+    if cache is not None and optimal:
+        cache.put(
+            embedding,
+            data.latitude,
+            data.longitude,
+            data.time_for_walk,
+            response,
+        )
+    return response, 'route'
+
+
+@app.post('/handle')
+@services.limiter.limiter.limit('3/second')
+async def handle_input(
+    request: fastapi.Request,
+    response: fastapi.Response,
+    data: schemas.user_io.UserInput,
+) -> schemas.user_io.UserOutput:
+    """Endpoint for receiving user input from frontend."""
+    timer = services.metrics.StageTimer()
+    with services.metrics.REQUESTS_IN_FLIGHT.track_inprogress(endpoint='/handle'):
+        output, outcome = await _handle(data, timer)
+
+    services.metrics.REQUESTS.inc(endpoint='/handle', outcome=outcome)
+    response.headers['Server-Timing'] = timer.server_timing()
+    return output
+
+
+def _to_ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + '\n'
+
+
+async def _stream_events(
+    data: schemas.user_io.UserInput,
+    route_info: tuple[list[models.place_payload.PlacePayload], int, bool] | None,
+    stored_explanations: list[str] | None,
+    timer: services.metrics.StageTimer,
+) -> typing.AsyncIterator[str]:
+    if route_info is None:
+        yield _to_ndjson({'event': 'route', 'walking_time': None, 'walking_path': []})
+        yield _to_ndjson({'event': 'explanation', 'index': 0, 'text': NO_PLACES_MESSAGE})
+    else:
+        best_route, best_time, optimal = route_info
+        yield _to_ndjson(
+            {
+                'event': 'route',
+                'walking_time': best_time,
+                'walking_path': [place.model_dump() for place in best_route],
+                'optimal': optimal,
+            },
         )
-        print(explanation)
-
-        return {
-            'walking_time': best_time,
-            'walking_path': best_route,
-            'explanation': explanation,
-        }
-
-    return schemas.user_io.UserOutput(
-        walking_time=None,
-        walking_path=[],
-        explanation=[
-            'There are no places that matches your description.'
-            ' Please try to search something else.',
-        ],
+        if stored_explanations is not None:
+            for index, text in enumerate(stored_explanations):
+                yield _to_ndjson({'event': 'explanation', 'index': index, 'text': text})
+        else:
+            async with services.admission.generation_gate.slot():
+                explanations = await services.admission.run_to_completion(
+                    _iter_desc_selection,
+                    data.prompt,
+                    best_route,
+                )
+                for index in range(len(best_route)):
+                    with timer.stage('generation', observe=False):
+                        text = await services.admission.run_to_completion(
+                            next,
+                            explanations,
+                        )
+                    yield _to_ndjson({'event': 'explanation', 'index': index, 'text': text})
+            timer.observe('generation')
+
+    yield _to_ndjson({'event': 'done'})
+
+
+@app.post('/handle/stream')
+@services.limiter.limiter.limit('3/second')
+async def handle_input_stream(
+    request: fastapi.Request,
+    data: schemas.user_io.UserInput,
+) -> fastapi.responses.StreamingResponse:
+    """
+    Streaming variant of /handle.
+
+    Responds with NDJSON: a "route" event as soon as the route is found, one
+    "explanation" event per place as it is generated and a final "done" event.
+    A degraded response under overload has no "explanation" events.
+    The Server-Timing header is sent before generation starts, so it only
+    covers the stages up to the route and the stored explanations.
+    """
+    timer = services.metrics.StageTimer()
+    services.metrics.REQUESTS_IN_FLIGHT.inc(endpoint='/handle/stream')
+    try:
+        with timer.stage('embedding'):
+            embedding: list[float] = await services.scheduler.embed(data.prompt)
+        route_info = await _find_route(data, embedding, timer)
+        stored_explanations = (
+            await fastapi.concurrency.run_in_threadpool(
+                _get_stored_explanations,
+                data.prompt,
+                embedding,
+                route_info[0],
+                timer,
+            )
+            if route_info is not None else None
+        )
+        outcome = 'route' if route_info is not None else 'no_route'
+        if stored_explanations is None and route_info is not None and not _admit_generation():
+            stored_explanations = []
+            outcome = 'degraded'
+    except BaseException:
+        services.metrics.REQUESTS_IN_FLIGHT.dec(endpoint='/handle/stream')
+        raise
+
+    services.metrics.REQUESTS.inc(endpoint='/handle/stream', outcome=outcome)
+    return fastapi.responses.StreamingResponse(
+        _stream_events(data, route_info, stored_explanations, timer),
+        media_type='application/x-ndjson',
+        headers={'Server-Timing': timer.server_timing()},
+        background=starlette.background.BackgroundTask(
+            services.metrics.REQUESTS_IN_FLIGHT.dec,
+            endpoint='/handle/stream',
+        ),
     )
 
 
+@app.get('/metrics')
+def metrics() -> fastapi.responses.PlainTextResponse:
+    """Prometheus metrics of the process."""
+    return fastapi.responses.PlainTextResponse(
+        services.metrics.registry.render(),
+        media_type=services.metrics.CONTENT_TYPE,
+    )
+
+
+def _search_backend_available() -> bool:
+    try:
+        if core.config.settings.search.backend == 'qdrant':
+            repository = db.qdrant_repo.get_repository()
+            return repository.client.collection_exists(repository.collection_name)
+        db.search_backend.get_search_backend()
+    except Exception as e:
+        print(f'Search backend is not available: {e}')
+        return False
+    return True
+
+
+@app.get('/ready')
+async def ready(response: fastapi.Response) -> dict[str, bool]:
+    """Readiness probe: models are loaded and warmed up, search backend answers."""
+    if core.config.settings.models.preload:
+        models_ready = getattr(app.state, 'models_ready', False)
+    else:
+        models_ready = services.ml.models_loaded()
+    search_ready = await fastapi.concurrency.run_in_threadpool(_search_backend_available)
+
+    if not (models_ready and search_ready):
+        response.status_code = fastapi.status.HTTP_503_SERVICE_UNAVAILABLE
+    return {'models': models_ready, 'search': search_ready}
+
+
+def _check_admin_token(
+    x_admin_token: typing.Annotated[str | None, fastapi.Header()] = None,
+) -> None:
+    token = core.config.settings.admin.token
+    if token is None:
+        raise fastapi.HTTPException(status_code=403, detail='Admin endpoints are disabled')
+    if not secrets.compare_digest(x_admin_token or '', token):
+        raise fastapi.HTTPException(status_code=403, detail='Invalid admin token')
+
+
+@app.post(
+    '/admin/cache/invalidate',
+    dependencies=[fastapi.Depends(_check_admin_token)],
+)
+def invalidate_response_cache() -> dict[str, int]:
+    """Drops all cached /handle responses, e.g. after the catalog has changed."""
+    dropped = len(services.response_cache.response_cache)
+    services.response_cache.response_cache.invalidate()
+    return {'dropped': dropped}
+
+
+@app.post(
+    '/admin/catalog/reload',
+    dependencies=[fastapi.Depends(_check_admin_token)],
+)
+def reload_catalog() -> dict[str, bool | str | int]:
+    """
+    Swaps in the catalog file rebuilt by build_catalog.py.
+
+    Requests already running keep the previous catalog, the response cache
+    is dropped when the data version changes. Only this worker reloads at
+    once, the others pick the file up with their catalog watcher.
+    """
+    try:
+        reloaded = services.utils.catalog_holder.reload()
+    except (OSError, services.catalog.CatalogError) as e:
+        raise fastapi.HTTPException(status_code=422, detail=str(e)) from e
+
+    catalog = services.utils.catalog_holder.get()
+    return {
+        'reloaded': reloaded,
+        'version': f'{catalog.version:016x}',
+        'places': len(catalog),
+    }
+
+
 if __name__ == '__main__':
     uvicorn.run('main:app', reload=True)
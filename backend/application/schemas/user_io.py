@@ -21,4 +21,5 @@ class UserOutput(pydantic.BaseModel):
     walking_path: list[models.place_payload.PlacePayload] = (
         pydantic.Field(..., min_length=1),
         )
-    explanation: list[str] = pydantic.Field(...)
\ No newline at end of file
+    explanation: list[str] = pydantic.Field(...)
+    optimal: bool | None = None
\ No newline at end of file
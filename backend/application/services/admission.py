@@ -0,0 +1,156 @@
+"""Admission control of the model stages based on their queue depth."""
+
+import asyncio
+import contextlib
+import math
+import time
+import typing
+
+import services.metrics
+from core.config import settings
+
+_EWMA_ALPHA: typing.Final[float] = 0.2
+
+_Result = typing.TypeVar('_Result')
+
+
+class OverloadedError(Exception):
+    """Raised when a request would wait for a stage longer than the budget."""
+
+    def __init__(self: typing.Self, stage: str, estimated_wait: float) -> None:
+        super().__init__(f'Stage {stage} is overloaded, estimated wait {estimated_wait:.1f}s')
+        self.stage = stage
+        self.estimated_wait = estimated_wait
+
+    @property
+    def retry_after(self: typing.Self) -> int:
+        """Seconds for the Retry-After header."""
+        return max(1, math.ceil(self.estimated_wait))
+
+
+class StageGate:
+    """
+    Bounds the number of concurrent calls of one stage.
+
+    The service time of a call is tracked as an exponentially weighted moving
+    average, so the wait of a new call can be estimated from the number of
+    calls running and queued before it. The check is done before a request
+    enters the queue, so under a burst the excess requests are turned away at
+    once instead of all of them timing out together.
+    """
+
+    def __init__(
+        self: typing.Self,
+        name: str,
+        max_concurrency: int,
+        max_wait_seconds: float,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_wait_seconds = max_wait_seconds
+        self.service_seconds = 0.
+        self.running = 0
+        self.waiting = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def estimated_wait(self: typing.Self) -> float:
+        """Seconds a call submitted now would wait for a free slot."""
+        queued = self.running + self.waiting - self.max_concurrency + 1
+        if queued <= 0:
+            return 0.
+        return queued / self.max_concurrency * self.service_seconds
+
+    def check(self: typing.Self) -> None:
+        """Raises OverloadedError when the estimated wait exceeds the budget."""
+        if not settings.admission.load_shedding:
+            return
+        estimated_wait = self.estimated_wait()
+        if estimated_wait > self.max_wait_seconds:
+            raise OverloadedError(self.name, estimated_wait)
+
+    @contextlib.asynccontextmanager
+    async def slot(self: typing.Self) -> typing.AsyncIterator[None]:
+        """Waits for a free slot without the wait check."""
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            semaphore.release()
+            self._observe(time.perf_counter() - started_at)
+
+    @contextlib.asynccontextmanager
+    async def admit(self: typing.Self) -> typing.AsyncIterator[None]:
+        """Checks the estimated wait and holds a slot for the duration of the call."""
+        self.check()
+        async with self.slot():
+            yield
+
+    def _observe(self: typing.Self, duration: float) -> None:
+        if self.service_seconds == 0.:
+            self.service_seconds = duration
+        else:
+            self.service_seconds += _EWMA_ALPHA * (duration - self.service_seconds)
+
+    def _get_semaphore(self: typing.Self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._semaphore is None:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+
+async def run_to_completion(
+    func: typing.Callable[..., _Result],
+    *args: object,
+) -> _Result:
+    """
+    Runs func in a worker thread and waits for it even if the caller is cancelled.
+
+    A thread cannot be interrupted, so a slot held around the call is released
+    only when the model has actually finished and the gate stays accurate
+    after a client disconnects.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+
+embedding_gate = StageGate(
+    'embedding',
+    max_concurrency=settings.admission.embedding_concurrency,
+    max_wait_seconds=settings.admission.max_wait_seconds,
+)
+generation_gate = StageGate(
+    'generation',
+    max_concurrency=settings.admission.generation_concurrency,
+    max_wait_seconds=settings.admission.max_wait_seconds,
+)
+_gates = (embedding_gate, generation_gate)
+
+services.metrics.registry.register(
+    services.metrics.CallbackGauge(
+        'nextstop_admission_estimated_wait_seconds',
+        'Estimated wait for a free slot of a model stage.',
+        lambda: [({'stage': gate.name}, gate.estimated_wait()) for gate in _gates],
+    ),
+)
+services.metrics.registry.register(
+    services.metrics.CallbackGauge(
+        'nextstop_admission_queued',
+        'Calls waiting for a free slot of a model stage.',
+        lambda: [({'stage': gate.name}, gate.waiting) for gate in _gates],
+    ),
+)
@@ -0,0 +1,229 @@
+"""Memory-mapped catalog of routable places."""
+
+import hashlib
+import os
+import pathlib
+import threading
+import typing
+
+import numpy as np
+
+MAGIC: typing.Final[bytes] = b'NSCATLG\x00'
+FORMAT_VERSION: typing.Final[int] = 1
+NO_ROW: typing.Final[int] = -1
+MAX_MINUTES: typing.Final[int] = np.iinfo(np.uint16).max
+
+_HEADER_DTYPE = np.dtype(
+    [
+        ('magic', 'S8'),
+        ('format_version', '<u4'),
+        ('count', '<u4'),
+        ('index_size', '<u4'),
+        ('reserved', '<u4'),
+        ('data_version', '<u8'),
+    ],
+)
+
+
+class CatalogError(ValueError):
+    """Raised when a catalog file is missing sections or has a wrong format."""
+
+
+def _section_layout(count: int, index_size: int) -> list[tuple[str, np.dtype, tuple]]:
+    return [
+        ('ids', np.dtype('<i8'), (count,)),
+        ('coordinates', np.dtype('<f8'), (count, 2)),
+        ('index', np.dtype('<i4'), (index_size,)),
+        ('visit_minutes', np.dtype('<u2'), (count,)),
+        ('travel_minutes', np.dtype('<u2'), (count, count)),
+    ]
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+class Catalog:
+    """
+    Places known to the route solver, backed by a read-only memory map.
+
+    Rows are dense indices into the arrays; ids are the Qdrant point ids.
+    """
+
+    def __init__(self: typing.Self, path: pathlib.Path) -> None:
+        self.path = path
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if buffer.size < _HEADER_DTYPE.itemsize:
+            raise CatalogError(f'Catalog {path} is too small')
+
+        header = np.frombuffer(buffer, dtype=_HEADER_DTYPE, count=1)[0]
+        if header['magic'] != MAGIC.rstrip(b'\x00'):
+            raise CatalogError(f'{path} is not a place catalog')
+        if header['format_version'] != FORMAT_VERSION:
+            raise CatalogError(
+                f'Catalog format {header["format_version"]} is not supported, '
+                f'expected {FORMAT_VERSION}',
+            )
+
+        self.count = int(header['count'])
+        self.version = int(header['data_version'])
+        offset = _HEADER_DTYPE.itemsize
+        sections: dict[str, np.ndarray] = {}
+        for name, dtype, shape in _section_layout(self.count, int(header['index_size'])):
+            offset = _aligned(offset)
+            size = int(np.prod(shape))
+            if offset + size * dtype.itemsize > buffer.size:
+                raise CatalogError(f'Catalog {path} is truncated at section {name}')
+            sections[name] = np.frombuffer(
+                buffer, dtype=dtype, count=size, offset=offset,
+            ).reshape(shape)
+            offset += size * dtype.itemsize
+
+        self.ids: np.ndarray = sections['ids']
+        self.coordinates: np.ndarray = sections['coordinates']
+        self.index: np.ndarray = sections['index']
+        self.visit_minutes: np.ndarray = sections['visit_minutes']
+        self.travel_minutes: np.ndarray = sections['travel_minutes']
+
+    def __len__(self: typing.Self) -> int:
+        return self.count
+
+    def __contains__(self: typing.Self, place_id: int) -> bool:
+        return self.row(place_id) != NO_ROW
+
+    def row(self: typing.Self, place_id: int) -> int:
+        """Row of the place in the catalog arrays or NO_ROW if it is unknown."""
+        if not 0 <= place_id < self.index.size:
+            return NO_ROW
+        return int(self.index[place_id])
+
+    def rows(self: typing.Self, place_ids: list[int]) -> np.ndarray:
+        """Rows of several known places."""
+        return self.index[np.asarray(place_ids, dtype=np.int64)]
+
+
+def write_catalog(
+    path: pathlib.Path,
+    ids: list[int],
+    coordinates: list[tuple[float, float]],
+    visit_minutes: list[int],
+    travel_seconds: np.ndarray,
+) -> int:
+    """
+    Writes a catalog file that can be loaded with Catalog.
+
+    Args:
+        path (pathlib.Path): output file
+        ids (list[int]): place ids in row order
+        coordinates (list[tuple[float, float]]): latitude and longitude per row
+        visit_minutes (list[int]): average visiting time per row
+        travel_seconds (np.ndarray): walking time between rows in seconds,
+            inf for unreachable pairs
+
+    Returns:
+        int: data version of the written catalog
+    """
+    count = len(ids)
+    travel_seconds = np.asarray(travel_seconds, dtype=np.float64)
+    if travel_seconds.shape != (count, count):
+        raise CatalogError(
+            f'Travel matrix has shape {travel_seconds.shape}, expected {(count, count)}',
+        )
+    if len(coordinates) != count or len(visit_minutes) != count:
+        raise CatalogError('Every place needs coordinates and a visiting time')
+    if min(ids, default=0) < 0 or len(set(ids)) != count:
+        raise CatalogError('Place ids must be unique and non-negative')
+
+    index = np.full(max(ids, default=-1) + 1, NO_ROW, dtype='<i4')
+    index[ids] = np.arange(count)
+    arrays = {
+        'ids': np.asarray(ids, dtype='<i8'),
+        'coordinates': np.asarray(coordinates, dtype='<f8').reshape(count, 2),
+        'index': index,
+        'visit_minutes': np.clip(visit_minutes, 0, MAX_MINUTES).astype('<u2'),
+        'travel_minutes': np.clip(
+            np.minimum(travel_seconds, MAX_MINUTES * 60) // 60, 0, MAX_MINUTES,
+        ).astype('<u2'),
+    }
+
+    payload = bytearray()
+    for name, dtype, shape in _section_layout(count, index.size):
+        offset = _HEADER_DTYPE.itemsize + len(payload)
+        payload += bytes(_aligned(offset) - offset)
+        payload += np.asarray(arrays[name], dtype=dtype).reshape(shape).tobytes()
+
+    data_version = int.from_bytes(
+        hashlib.blake2b(payload, digest_size=8).digest(), 'little',
+    )
+    header = np.zeros(1, dtype=_HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['format_version'] = FORMAT_VERSION
+    header['count'] = count
+    header['index_size'] = index.size
+    header['data_version'] = data_version
+
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    with open(tmp_path, 'wb') as file:
+        file.write(header.tobytes())
+        file.write(payload)
+    os.replace(tmp_path, path)
+    return data_version
+
+
+def load_catalog(path: pathlib.Path) -> Catalog:
+    """Memory-maps a catalog built by build_catalog.py."""
+    return Catalog(path)
+
+
+class CatalogHolder:
+    """
+    Current catalog of the process, swapped atomically on reload.
+
+    Callers take the catalog once with get() and use it for the whole
+    request, so in-flight requests finish on the version they started with.
+    write_catalog replaces the file with os.replace, so the memory map of an
+    old version stays valid until its last user drops it.
+    """
+
+    def __init__(self: typing.Self, path: pathlib.Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._listeners: list[typing.Callable[[Catalog], None]] = []
+        self._signature = self._file_signature()
+        self._catalog = load_catalog(path)
+
+    def get(self: typing.Self) -> Catalog:
+        return self._catalog
+
+    def add_listener(self: typing.Self, listener: typing.Callable[[Catalog], None]) -> None:
+        """Registers a callback called with the new catalog after every swap."""
+        self._listeners.append(listener)
+
+    def reload(self: typing.Self) -> bool:
+        """
+        Loads the catalog file again.
+
+        Returns:
+            bool: whether a catalog with a different data version was swapped in
+        """
+        with self._lock:
+            signature = self._file_signature()
+            catalog = load_catalog(self.path)
+            self._signature = signature
+            if catalog.version == self._catalog.version:
+                return False
+            self._catalog = catalog
+
+        for listener in self._listeners:
+            listener(catalog)
+        return True
+
+    def reload_if_changed(self: typing.Self) -> bool:
+        """Reloads the catalog if the file was replaced since the last load."""
+        if self._file_signature() == self._signature:
+            return False
+        return self.reload()
+
+    def _file_signature(self: typing.Self) -> tuple[int, int, int]:
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,213 @@
+"""Embedding cache shared by all workers through an SQLite file."""
+
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+import typing
+import unicodedata
+
+import numpy as np
+
+from core.config import settings
+
+BACKEND_ROOT = pathlib.Path(__file__).parent.parent.parent
+
+_SPACES = re.compile(r'\s+')
+# Hits only buffer their access time, it is written in one transaction when
+# this many keys are buffered, when the oldest is this old, or before eviction.
+ACCESS_FLUSH_SIZE: typing.Final[int] = 64
+ACCESS_FLUSH_SECONDS: typing.Final[float] = 10.
+# Expired and least recently used entries are evicted every this many puts,
+# once the table holds more than max_entries by the slack share.
+EVICTION_INTERVAL: typing.Final[int] = 64
+EVICTION_SLACK: typing.Final[float] = 0.1
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercases the text, drops punctuation and collapses whitespace."""
+    text = ''.join(
+        ' ' if unicodedata.category(char).startswith('P') else char
+        for char in unicodedata.normalize('NFKC', text).casefold()
+    )
+    return _SPACES.sub(' ', text).strip()
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of query embeddings with LRU and TTL eviction.
+
+    The SQLite file is opened in WAL mode, so several uvicorn workers can
+    read and write it concurrently and the entries survive restarts.
+    Hit and miss counters are kept per process.
+
+    A hit does not write to the file right away: access times are buffered
+    and flushed in batches. Eviction runs every eviction_interval puts and
+    only when the table has outgrown max_entries by EVICTION_SLACK, so the
+    table may briefly hold a few more entries than max_entries.
+    """
+
+    def __init__(
+        self: typing.Self,
+        path: str | pathlib.Path,
+        max_entries: int,
+        ttl_seconds: float,
+        namespace: str = '',
+        eviction_interval: int = EVICTION_INTERVAL,
+    ) -> None:
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.eviction_interval = eviction_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._accessed: dict[str, float] = {}
+        self._accessed_since: float | None = None
+        self._puts = 0
+        self._connection = sqlite3.connect(
+            path,
+            timeout=5,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, '
+            'vector BLOB NOT NULL, '
+            'created_at REAL NOT NULL, '
+            'accessed_at REAL NOT NULL)',
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS embeddings_accessed_at '
+            'ON embeddings (accessed_at)',
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS embeddings_created_at '
+            'ON embeddings (created_at)',
+        )
+
+    @property
+    def hit_ratio(self: typing.Self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def get(self: typing.Self, text: str) -> list[float] | None:
+        """Cached embedding of the text or None."""
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT vector, created_at FROM embeddings WHERE key = ?',
+                (key,),
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._accessed[key] = now
+            if self._accessed_since is None:
+                self._accessed_since = now
+            if (
+                len(self._accessed) >= ACCESS_FLUSH_SIZE
+                or now - self._accessed_since >= ACCESS_FLUSH_SECONDS
+            ):
+                self._flush_accessed()
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def put(self: typing.Self, text: str, vector: list[float]) -> list[float]:
+        """
+        Stores the embedding, every eviction_interval puts also evicts entries.
+
+        Returns:
+            list[float]: the embedding rounded to float32 as later returned by get
+        """
+        stored = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)',
+                (self._key(text), stored.tobytes(), now, now),
+            )
+            self._puts += 1
+            if self._puts >= self.eviction_interval:
+                self._puts = 0
+                self._evict(now)
+        return stored.tolist()
+
+    def _flush_accessed(self: typing.Self) -> None:
+        if self._accessed:
+            self._connection.execute('BEGIN')
+            try:
+                self._connection.executemany(
+                    'UPDATE embeddings SET accessed_at = MAX(accessed_at, ?) WHERE key = ?',
+                    [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+                )
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+        self._accessed.clear()
+        self._accessed_since = None
+
+    def _evict(self: typing.Self, now: float) -> None:
+        self._flush_accessed()
+        self._connection.execute(
+            'DELETE FROM embeddings WHERE created_at < ?',
+            (now - self.ttl_seconds,),
+        )
+        (count,) = self._connection.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+        if count > self.max_entries * (1 + EVICTION_SLACK):
+            self._connection.execute(
+                'DELETE FROM embeddings WHERE key IN ('
+                'SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)',
+                (count - self.max_entries,),
+            )
+
+    def _key(self: typing.Self, text: str) -> str:
+        return f'{self.namespace}|{normalize_prompt(text)}'
+
+    def clear(self: typing.Self) -> None:
+        with self._lock:
+            self._accessed.clear()
+            self._accessed_since = None
+            self._connection.execute('DELETE FROM embeddings')
+
+    def __len__(self: typing.Self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+
+def _model_namespace() -> str:
+    """Identity of the model the cached embeddings are computed with."""
+    from services import ml
+
+    model = f'{settings.embedding.backend}:{ml._EmbeddingModel.name_model}'
+    if settings.embedding.backend == 'onnx':
+        model = f'{model}:{settings.embedding.onnx_path}'
+    return f'{model}:{settings.embedding.max_length}'
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide cache configured in settings.embedding_cache, None if disabled."""
+    global _cache
+    if not settings.embedding_cache.enabled:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                BACKEND_ROOT / settings.embedding_cache.path,
+                max_entries=settings.embedding_cache.max_entries,
+                ttl_seconds=settings.embedding_cache.ttl_seconds,
+                namespace=_model_namespace(),
+            )
+    return _cache
@@ -0,0 +1,181 @@
+"""Pre-generated explanations of places for typical user intents."""
+
+import json
+import pathlib
+import threading
+import typing
+
+import numpy as np
+
+import models.place_payload
+import services.utils
+from core.config import settings
+
+BACKEND_ROOT = pathlib.Path(__file__).parent.parent.parent
+STORE_VERSION: typing.Final[int] = 3
+
+# Fragments are facts about a place and do not address the user, the request
+# specific parts of the explanation are filled in when it is served.
+FRAGMENT_INSTRUCTION: typing.Final[str] = (
+    'Одним коротким предложением назови факт из описания места, '
+    'который связан с темой. Не обращайся к читателю.\n'
+)
+EXPLANATION_TEMPLATE: typing.Final[str] = (
+    'Для Вашего запроса «{prompt}» подойдёт место «{title}». {fragment}'
+)
+
+INTENTS: typing.Final[dict[str, str]] = {
+    'history': 'Хочу узнать больше об истории города, посетить музеи и исторические памятники',
+    'art': 'Хочу посмотреть на искусство: картины, скульптуры, выставки и театры',
+    'nature': 'Хочу погулять на свежем воздухе: парки, скверы, набережные и природа',
+    'architecture': 'Хочу посмотреть на красивую архитектуру, старинные здания и храмы',
+    'views': 'Хочу увидеть красивые виды и сделать хорошие фотографии',
+    'family': 'Хочу провести время с детьми и интересно отдохнуть всей семьёй',
+}
+
+
+class ExplanationStore:
+    """
+    Explanation fragments per (intent, place id) built by precompute_explanations.py.
+
+    A request is served from the store when its prompt embedding is close
+    enough to one of the intents and every place of the route has a fragment
+    for that intent. The fragment is put into EXPLANATION_TEMPLATE together
+    with the prompt and the place title, so two requests of one intent do not
+    get word for word the same text.
+
+    Fragments are keyed by place id, so a store is only served with the
+    catalog version it was built for: get_explanation_store refuses a store
+    of another catalog, and invalidate() drops it when the catalog is swapped.
+    """
+
+    def __init__(self: typing.Self, path: pathlib.Path, similarity_threshold: float) -> None:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != STORE_VERSION:
+            raise ValueError(
+                f'Explanation store version {data.get("version")} is not supported',
+            )
+
+        self.similarity_threshold = similarity_threshold
+        self.catalog_version: int = data['catalog_version']
+        self.intents: list[str] = [intent['name'] for intent in data['intents']]
+        embeddings = np.array(
+            [intent['embedding'] for intent in data['intents']],
+            dtype=np.float32,
+        ).reshape(len(self.intents), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self._embeddings = embeddings / np.where(norms == 0, 1, norms)
+        self._fragments: dict[str, dict[str, str]] = data['fragments']
+        self.hits = 0
+        self.misses = 0
+
+    def closest_intent(self: typing.Self, embedding: list[float]) -> tuple[str, float] | None:
+        """Closest intent to the prompt embedding and its cosine similarity."""
+        if not self.intents:
+            return None
+
+        similarities = self._embeddings @ np.asarray(embedding, dtype=np.float32)
+        best = int(np.argmax(similarities))
+        return self.intents[best], float(similarities[best])
+
+    def match_intent(self: typing.Self, embedding: list[float]) -> str | None:
+        """Closest intent to the prompt embedding or None if none is close enough."""
+        closest = self.closest_intent(embedding)
+        if closest is None or closest[1] < self.similarity_threshold:
+            return None
+        return closest[0]
+
+    def explain(
+        self: typing.Self,
+        prompt: str,
+        embedding: list[float],
+        places: list[models.place_payload.PlacePayload],
+    ) -> list[str] | None:
+        """Explanations for every place of the route or None on a miss."""
+        intent = self.match_intent(embedding)
+        fragments = self._fragments.get(intent, {}) if intent is not None else {}
+        place_fragments = [fragments.get(str(place.id)) for place in places]
+        if intent is None or None in place_fragments:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return [
+            EXPLANATION_TEMPLATE.format(prompt=prompt.strip(), title=place.title, fragment=fragment)
+            for place, fragment in zip(places, place_fragments, strict=True)
+        ]
+
+
+def get_fragment_prompt(intent: str, place: models.place_payload.PlacePayload) -> str:
+    """Text generation prompt of the fragment of a place for an intent."""
+    return (
+        FRAGMENT_INSTRUCTION
+        + f'Тема: {INTENTS[intent]}.\n'
+        + f'Место: {place.title}.\nОписание места: {place.description}.'
+    )
+
+
+def write_store(
+    path: pathlib.Path,
+    intent_embeddings: dict[str, list[float]],
+    fragments: dict[str, dict[int, str]],
+    catalog_version: int,
+) -> None:
+    """Saves a store of the catalog version that can be loaded with ExplanationStore."""
+    data = {
+        'version': STORE_VERSION,
+        'catalog_version': catalog_version,
+        'intents': [
+            {'name': name, 'prompt': INTENTS.get(name), 'embedding': embedding}
+            for name, embedding in intent_embeddings.items()
+        ],
+        'fragments': {
+            intent: {str(place_id): text for place_id, text in texts.items()}
+            for intent, texts in fragments.items()
+        },
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+
+
+_store: ExplanationStore | None = None
+_store_loaded = False
+_store_lock = threading.Lock()
+
+
+def get_explanation_store() -> ExplanationStore | None:
+    """Process-wide store, None if it is disabled, was not built yet or is stale."""
+    global _store, _store_loaded
+    if not settings.explanation_store.enabled:
+        return None
+
+    with _store_lock:
+        if not _store_loaded:
+            _store = _load_store(BACKEND_ROOT / settings.explanation_store.path)
+            _store_loaded = True
+    return _store
+
+
+def invalidate() -> None:
+    """Drops the store, the next get_explanation_store reads it from disk again."""
+    global _store, _store_loaded
+    with _store_lock:
+        _store = None
+        _store_loaded = False
+
+
+def _load_store(path: pathlib.Path) -> ExplanationStore | None:
+    if not path.exists():
+        print(f'Explanation store {path} not found, explanations will be generated')
+        return None
+
+    store = ExplanationStore(path, settings.explanation_store.similarity_threshold)
+    catalog_version = services.utils.catalog_holder.get().version
+    if store.catalog_version != catalog_version:
+        print(
+            f'Explanation store {path} was built for catalog {store.catalog_version:016x}, '
+            f'the current one is {catalog_version:016x}, explanations will be generated',
+        )
+        return None
+    return store
@@ -0,0 +1,337 @@
+"""Prometheus metrics of the request pipeline without external dependencies."""
+
+import abc
+import bisect
+import contextlib
+import math
+import threading
+import time
+import typing
+
+CONTENT_TYPE: typing.Final[str] = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS: typing.Final[tuple[float, ...]] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.,
+)
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: _Labels, extra: _Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    type_name: typing.ClassVar[str]
+
+    def __init__(self: typing.Self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def render(self: typing.Self) -> list[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+            *self._samples(),
+        ]
+
+    @abc.abstractmethod
+    def _samples(self: typing.Self) -> list[str]:
+        """Sample lines of the metric in the text exposition format."""
+
+    @staticmethod
+    def _key(labels: dict[str, str]) -> _Labels:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self: typing.Self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[_Labels, float] = {}
+
+    def inc(self: typing.Self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self: typing.Self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self: typing.Self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f'{self.name}{_format_labels(key)} {_format_value(value)}'
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self: typing.Self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self: typing.Self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextlib.contextmanager
+    def track_inprogress(self: typing.Self, **labels: str) -> typing.Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples are computed by a callback at scrape time."""
+
+    type_name = 'gauge'
+
+    def __init__(
+        self: typing.Self,
+        name: str,
+        documentation: str,
+        callback: typing.Callable[[], list[tuple[dict[str, str], float]]],
+    ) -> None:
+        super().__init__(name, documentation)
+        self._callback = callback
+
+    def _samples(self: typing.Self) -> list[str]:
+        return [
+            f'{self.name}{_format_labels(self._key(labels))} {_format_value(value)}'
+            for labels, value in self._callback()
+        ]
+
+
+class CallbackCounter(CallbackGauge):
+    """Counter whose monotonic samples are computed by a callback at scrape time."""
+
+    type_name = 'counter'
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(
+        self: typing.Self,
+        name: str,
+        documentation: str,
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[_Labels, list[int]] = {}
+        self._sums: dict[_Labels, float] = {}
+
+    def observe(self: typing.Self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.) + value
+
+    def count(self: typing.Self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self: typing.Self) -> list[str]:
+        with self._lock:
+            series = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+
+        lines: list[str] = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                le = (('le', _format_value(bound)),)
+                lines.append(f'{self.name}_bucket{_format_labels(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+
+_M = typing.TypeVar('_M', bound=_Metric)
+
+
+class Registry:
+    def __init__(self: typing.Self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self: typing.Self, metric: _M) -> _M:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self: typing.Self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(
+    Histogram('nextstop_stage_duration_seconds', 'Duration of request pipeline stages.'),
+)
+STAGES_IN_FLIGHT = registry.register(
+    Gauge('nextstop_stage_in_flight', 'Requests currently in a stage.'),
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge('nextstop_requests_in_flight', 'Requests currently being handled.'),
+)
+REQUESTS = registry.register(
+    Counter('nextstop_requests_total', 'Handled requests by endpoint and outcome.'),
+)
+# Counted by the process that runs the text model: with MODEL_SERVER_SOCKET
+# set that is the model server, and the API workers report no tokens.
+GENERATED_TOKENS = registry.register(
+    Counter(
+        'nextstop_generated_tokens_total',
+        'Tokens generated by the text model loaded in this process.',
+    ),
+)
+
+
+_caches: dict[str, typing.Callable[[], typing.Any]] = {}
+_model_stats: dict[str, typing.Callable[[], dict[str, float]]] = {}
+
+
+def register_cache(name: str, cache_getter: typing.Callable[[], typing.Any]) -> None:
+    """
+    Exposes the hits and misses counters of a cache.
+
+    cache_getter is called at scrape time and may return None for a disabled cache.
+    """
+    _caches[name] = cache_getter
+
+
+def register_model_stats(
+    name: str,
+    stats_getter: typing.Callable[[], dict[str, float]],
+) -> None:
+    """
+    Exposes the load-time stats of a model.
+
+    stats_getter is called at scrape time and returns an empty dict until the
+    model is loaded; memory_bytes and tokens_per_second are exported.
+    """
+    _model_stats[name] = stats_getter
+
+
+def _model_stat(stat: str) -> list[tuple[dict[str, str], float]]:
+    samples: list[tuple[dict[str, str], float]] = []
+    for name, stats_getter in _model_stats.items():
+        stats = stats_getter()
+        if stat in stats:
+            samples.append(({'model': name}, stats[stat]))
+    return samples
+
+
+def _cache_counters() -> typing.Iterator[tuple[str, int, int]]:
+    for name, cache_getter in _caches.items():
+        cache = cache_getter()
+        if cache is not None:
+            yield name, cache.hits, cache.misses
+
+
+def _cache_lookups() -> list[tuple[dict[str, str], float]]:
+    samples: list[tuple[dict[str, str], float]] = []
+    for name, hits, misses in _cache_counters():
+        samples.append(({'cache': name, 'result': 'hit'}, hits))
+        samples.append(({'cache': name, 'result': 'miss'}, misses))
+    return samples
+
+
+def _cache_hit_ratios() -> list[tuple[dict[str, str], float]]:
+    return [
+        ({'cache': name}, hits / (hits + misses) if hits + misses else 0.)
+        for name, hits, misses in _cache_counters()
+    ]
+
+
+registry.register(
+    CallbackCounter('nextstop_cache_lookups_total', 'Cache lookups since start.', _cache_lookups),
+)
+registry.register(
+    CallbackGauge('nextstop_cache_hit_ratio', 'Share of cache hits.', _cache_hit_ratios),
+)
+registry.register(
+    CallbackGauge(
+        'nextstop_model_memory_bytes',
+        'Resident memory taken by loading the model.',
+        lambda: _model_stat('memory_bytes'),
+    ),
+)
+registry.register(
+    CallbackGauge(
+        'nextstop_model_tokens_per_second',
+        'Greedy decoding throughput measured at load with GENERATION_REPORT_STATS.',
+        lambda: _model_stat('tokens_per_second'),
+    ),
+)
+
+
+class StageTimer:
+    """
+    Times the stages of one request.
+
+    Every stage is observed in STAGE_SECONDS and counted in STAGES_IN_FLIGHT
+    while it runs; the collected durations form the Server-Timing header.
+    """
+
+    def __init__(self: typing.Self) -> None:
+        self._started_at = time.perf_counter()
+        self.durations: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(self: typing.Self, name: str, observe: bool = True) -> typing.Iterator[None]:
+        """
+        Times one run of a stage.
+
+        A stage that runs in several parts, like the per-place generation of
+        a stream, passes observe=False and calls observe() after the last part,
+        so STAGE_SECONDS gets one sample per request for every stage.
+        """
+        started_at = time.perf_counter()
+        with STAGES_IN_FLIGHT.track_inprogress(stage=name):
+            try:
+                yield
+            finally:
+                duration = time.perf_counter() - started_at
+                self.durations[name] = self.durations.get(name, 0.) + duration
+                if observe:
+                    STAGE_SECONDS.observe(duration, stage=name)
+
+    def observe(self: typing.Self, name: str) -> None:
+        """Observes the total duration of a stage timed with observe=False."""
+        if name in self.durations:
+            STAGE_SECONDS.observe(self.durations[name], stage=name)
+
+    def server_timing(self: typing.Self) -> str:
+        """Server-Timing header value with durations in milliseconds."""
+        total = time.perf_counter() - self._started_at
+        return ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in (*self.durations.items(), ('total', total))
+        )
@@ -1,12 +1,84 @@
+import copy
 import enum
-import functools
+import importlib.util
+import os
+import pathlib
+import resource
+import threading
+import time
 import typing
 
+import numpy as np
 import torch
 import torch.nn.functional as f
 import transformers
 
+from core.config import settings
 from models import place_payload
+from services import embedding_cache, metrics
+
+BACKEND_ROOT = pathlib.Path(__file__).parent.parent.parent
+_THINK_END_TOKEN_ID: typing.Final[int] = 151668
+_CONTENT_SENTINEL: typing.Final[str] = '\x00'
+_PLACE_INSTRUCTION: typing.Final[str] = (
+    'Пиши максимально коротоко. '
+    'Напиши почему выбранное место подходит запросу пользователя, обращаясь к нему на вы. '
+    'В ответе используй факты из описания выбранного места. '
+    'Формат: обращайтесь на «Вы», в тексте используйте фразы "Для Вашего запроса" или'
+    ' "Исходя из Ваших предпочтений".\n'
+)
+
+
+def _get_rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _bf16_supported() -> bool:
+    if torch.cuda.is_available():
+        return torch.cuda.is_bf16_supported()
+    return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def _get_load_dtype(precision: str) -> torch.dtype | str:
+    if precision == 'auto':
+        return 'auto'
+    if precision == 'bf16' and not _bf16_supported():
+        print('bf16 is not supported on this CPU, loading float32 weights')
+        return torch.float32
+    if precision in ('int8', 'int4') and importlib.util.find_spec('torchao') is None:
+        return torch.float32
+    return torch.bfloat16 if _bf16_supported() else torch.float32
+
+
+def _quantize_weights(
+    model: transformers.PreTrainedModel,
+    precision: str,
+) -> transformers.PreTrainedModel:
+    """Replaces linear layer weights with int8 or int4 weight-only quantized ones."""
+    if importlib.util.find_spec('torchao') is None:
+        if precision == 'int4':
+            raise RuntimeError('int4 weights need torchao, install the "lowmem" extra')
+        return torch.ao.quantization.quantize_dynamic(
+            model,
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+        )
+
+    import torchao.quantization
+
+    if precision == 'int8':
+        config = torchao.quantization.Int8WeightOnlyConfig()
+    else:
+        config = torchao.quantization.IntxWeightOnlyConfig(
+            weight_dtype=torch.int4,
+            granularity=torchao.quantization.granularity.PerGroup(32),
+        )
+    torchao.quantization.quantize_(model, config)
+    return model
 
 
 class _TextGenerationModel:
@@ -14,57 +86,221 @@ class _TextGenerationModel:
     name_model: str = 'Qwen/Qwen3-0.6B'
 
     def __init__(self: typing.Self) -> None:
+        precision = settings.generation.precision
+        rss_before = _get_rss_bytes()
         self._tokenizer = transformers.AutoTokenizer.from_pretrained(
             self.name_model,
             dtype='auto',
             device_map='auto',
+            padding_side='left',
         )
         self._model = transformers.AutoModelForCausalLM.from_pretrained(
             self.name_model,
-            dtype='auto',
+            dtype=_get_load_dtype(precision),
             device_map='auto',
         )
+        if precision in ('int8', 'int4'):
+            self._model = _quantize_weights(self._model, precision)
+        self._static_prefix: tuple[torch.Tensor, transformers.DynamicCache] | None = None
+        self._static_prefix_lock = threading.Lock()
+
+        # Exported on /metrics, see metrics.register_model_stats.
+        self.stats: dict[str, float] = {
+            'memory_bytes': max(_get_rss_bytes() - rss_before, 0),
+        }
+        summary = f'{self.stats["memory_bytes"] / 2 ** 20:.0f} MB'
+        if settings.generation.report_stats:
+            self.stats['tokens_per_second'] = self._measure_tokens_per_second()
+            summary += f', {self.stats["tokens_per_second"]:.1f} tokens/sec'
+        print(f'{self.name_model} ({precision}, {self._model.dtype}): {summary}')
+
+    def _measure_tokens_per_second(self: typing.Self, new_tokens: int = 32) -> float:
+        model_inputs = self._tokenizer(
+            [self._apply_chat_template('Расскажи о Нижнем Новгороде.')],
+            return_tensors='pt',
+        ).to(self._model.device)
+        started_at = time.perf_counter()
+        generated_ids = self._model.generate(
+            **model_inputs,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+        )
+        elapsed = time.perf_counter() - started_at
+        return (generated_ids.shape[1] - model_inputs.input_ids.shape[1]) / elapsed
 
     def get_desc_selection(
         self: typing.Self,
         prompt: str,
         places: list[place_payload.PlacePayload],
     ) -> list[str]:
-        ans: list[str] = []
+        if settings.generation.mode == 'prefix_cache':
+            return list(self._iter_with_prefix_cache(prompt, places))
+
+        prompts = [self._get_place_prompt(prompt, place) for place in places]
+        if settings.generation.mode == 'batched':
+            return self.generate_batch(prompts)
+
+        return [self(local_prompt) for local_prompt in prompts]
+
+    def iter_desc_selection(
+        self: typing.Self,
+        prompt: str,
+        places: list[place_payload.PlacePayload],
+    ) -> typing.Iterator[str]:
+        """Yields the explanation of every place as soon as it is generated."""
+        if settings.generation.mode == 'prefix_cache':
+            yield from self._iter_with_prefix_cache(prompt, places)
+            return
+
         for place in places:
-            local_prompt: str = (
-                f'Пиши максимально коротоко. '
-                f'Напиши почему выбранное место ({place.title}) подходит запросу пользователя, обращаясь к нему на вы. '
-                f'Запрос пользователя: {prompt}. '
-                f'В ответе используй факты из описания выбранного места: {place.description}. '
-                'Формат: обращайтесь на «Вы», в тексте используйте фразы "Для Вашего запроса" или'
-                ' "Исходя из Ваших предпочтений".'
-            )
+            yield self(self._get_place_prompt(prompt, place))
+
+    def generate_batch(
+        self: typing.Self,
+        prompts: list[str],
+        max_new_tokens: int | None = None,
+    ) -> list[str]:
+        """
+        Answers several prompts with one generate() call.
+
+        Prompts are left-padded into a single batch. Finished sequences are
+        padded until the longest answer is done, so the latency follows the
+        longest answer instead of the sum of all of them.
 
-            ans.append(self(local_prompt))
+        Args:
+            prompts (list[str]): user messages
+            max_new_tokens (int | None): token cap, taken from settings by default
 
-        return ans
+        Returns:
+            list[str]: answers in the order of prompts
+        """
+        if not prompts:
+            return []
+
+        model_inputs = self._tokenizer(
+            [self._apply_chat_template(prompt) for prompt in prompts],
+            padding=True,
+            return_tensors='pt',
+        ).to(self._model.device)
+        generated_ids = self._model.generate(
+            **model_inputs,
+            max_new_tokens=max_new_tokens or settings.generation.max_new_tokens,
+            pad_token_id=self._tokenizer.pad_token_id,
+        )
+        prompt_length = model_inputs.input_ids.shape[1]
+        return [
+            self._decode(output_ids[prompt_length:].tolist())
+            for output_ids in generated_ids
+        ]
 
     def __call__(self: typing.Self, prompt: str) -> str:
+        text = self._apply_chat_template(prompt)
+        model_inputs = self._tokenizer([text], return_tensors='pt').to(
+            self._model.device,
+        )
+        generated_ids = self._model.generate(
+            **model_inputs,
+            max_new_tokens=settings.generation.max_new_tokens,
+        )
+        output_ids = generated_ids[0][len(model_inputs.input_ids[0]) :].tolist()
+        return self._decode(output_ids)
+
+    def _iter_with_prefix_cache(
+        self: typing.Self,
+        prompt: str,
+        places: list[place_payload.PlacePayload],
+    ) -> typing.Iterator[str]:
+        """
+        Generates explanations reusing the KV cache of the shared prompt prefix.
+
+        The chat template head with the instruction is prefilled once per
+        process and the user request once per call, so every place only
+        prefills its own title, description and the template tail.
+        """
+        chat_head, chat_tail = self._split_chat_template()
+        static_ids, static_cache = self._get_static_prefix(chat_head)
+        request_ids = self._encode(self._get_request_part(prompt))
+        request_cache = self._prefill(request_ids, copy.deepcopy(static_cache))
+        prefix_ids = torch.cat([static_ids, request_ids], dim=1)
+
+        for place in places:
+            input_ids = torch.cat(
+                [prefix_ids, self._encode(self._get_place_part(place) + chat_tail)],
+                dim=1,
+            )
+            generated_ids = self._model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=copy.deepcopy(request_cache),
+                max_new_tokens=settings.generation.max_new_tokens,
+            )
+            yield self._decode(generated_ids[0][input_ids.shape[1] :].tolist())
+
+    def _get_static_prefix(
+        self: typing.Self,
+        chat_head: str,
+    ) -> tuple[torch.Tensor, transformers.DynamicCache]:
+        with self._static_prefix_lock:
+            if self._static_prefix is None:
+                input_ids = self._encode(chat_head + _PLACE_INSTRUCTION)
+                cache = transformers.DynamicCache(config=self._model.config)
+                self._static_prefix = input_ids, self._prefill(input_ids, cache)
+        return self._static_prefix
+
+    def _prefill(
+        self: typing.Self,
+        input_ids: torch.Tensor,
+        cache: transformers.DynamicCache,
+    ) -> transformers.DynamicCache:
+        with torch.no_grad():
+            self._model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+        return cache
+
+    def _encode(self: typing.Self, text: str) -> torch.Tensor:
+        return self._tokenizer(
+            text,
+            add_special_tokens=False,
+            return_tensors='pt',
+        ).input_ids.to(self._model.device)
+
+    def _split_chat_template(self: typing.Self) -> tuple[str, str]:
+        """Chat template text before and after the user message."""
+        head, tail = self._apply_chat_template(_CONTENT_SENTINEL).split(_CONTENT_SENTINEL)
+        return head, tail
+
+    @classmethod
+    def _get_place_prompt(
+        cls: type[typing.Self],
+        prompt: str,
+        place: place_payload.PlacePayload,
+    ) -> str:
+        return _PLACE_INSTRUCTION + cls._get_request_part(prompt) + cls._get_place_part(place)
+
+    @staticmethod
+    def _get_request_part(prompt: str) -> str:
+        return f'Запрос пользователя: {prompt}.\n'
+
+    @staticmethod
+    def _get_place_part(place: place_payload.PlacePayload) -> str:
+        return f'Выбранное место: {place.title}.\nОписание выбранного места: {place.description}.'
+
+    def _apply_chat_template(self: typing.Self, prompt: str) -> str:
         messages = [
             {'role': 'user', 'content': prompt},
         ]
-        text = self._tokenizer.apply_chat_template(
+        return self._tokenizer.apply_chat_template(
             messages,
             tokenize=False,
             add_generation_prompt=True,
             enable_thinking=False,
         )
-        model_inputs = self._tokenizer([text], return_tensors='pt').to(
-            self._model.device,
-        )
-        generated_ids = self._model.generate(
-            **model_inputs,
-            max_new_tokens=32768,
-        )
-        output_ids = generated_ids[0][len(model_inputs.input_ids[0]) :].tolist()
+
+    def _decode(self: typing.Self, output_ids: list[int]) -> str:
+        pad_token_id = self._tokenizer.pad_token_id
+        metrics.GENERATED_TOKENS.inc(sum(token != pad_token_id for token in output_ids))
         try:
-            index = len(output_ids) - output_ids[::-1].index(151668)
+            index = len(output_ids) - output_ids[::-1].index(_THINK_END_TOKEN_ID)
         except ValueError:
             index = 0
 
@@ -74,9 +310,6 @@ class _TextGenerationModel:
         ).strip('\n')
 
 
-text_generation_model = _TextGenerationModel()
-
-
 class _Prefix(enum.Enum):
     SEARCH_QUERY = 'search_query'
     PARAPHRASE = 'paraphrase'
@@ -99,22 +332,158 @@ class _EmbeddingModel:
     def multi_call(self: typing.Self, texts: list[str]) -> list[list[float]]:
         return [self(el) for el in texts]
 
-    @functools.lru_cache
-    def __call__(self: typing.Self, text: str) -> list[float]:
-        texts = [f'{_Prefix.SEARCH_QUERY.value}:{text}']
-        tokenized_inputs = self._tokenizer(
-            texts,
-            max_length=512,
-            padding=True,
+    def encode(
+        self: typing.Self,
+        texts: list[str],
+        batch_size: int | None = None,
+        prefix: _Prefix = _Prefix.SEARCH_QUERY,
+    ) -> np.ndarray:
+        """
+        Embeds many texts with batched forward passes.
+
+        Texts are sorted by token length so that every batch is padded only
+        up to its own longest text, then the rows are put back in input order.
+
+        Args:
+            texts (list[str]): texts to embed
+            batch_size (int | None): texts per forward pass, taken from settings by default
+            prefix (_Prefix): FRIDA task prefix
+
+        Returns:
+            np.ndarray: normalized embeddings with shape (len(texts), EMBEDDING_LENGTH)
+        """
+        batch_size = batch_size or settings.embedding.batch_size
+        embeddings = np.empty((len(texts), EMBEDDING_LENGTH), dtype=np.float32)
+        if not texts:
+            return embeddings
+
+        encoded = self._tokenizer(
+            [f'{prefix.value}:{text}' for text in texts],
+            max_length=settings.embedding.max_length,
             truncation=True,
-            return_tensors='pt',
         )
-        with torch.no_grad():
-            outputs = self._model(**tokenized_inputs)
+        order = sorted(range(len(texts)), key=lambda i: len(encoded['input_ids'][i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            tokenized_inputs = self._tokenizer.pad(
+                {
+                    'input_ids': [encoded['input_ids'][i] for i in batch],
+                    'attention_mask': [encoded['attention_mask'][i] for i in batch],
+                },
+                return_tensors='np',
+            )
+            embeddings[batch] = self._forward(
+                tokenized_inputs['input_ids'],
+                tokenized_inputs['attention_mask'],
+            )
+
+        return embeddings
+
+    def __call__(self: typing.Self, text: str) -> list[float]:
+        cache = embedding_cache.get_embedding_cache()
+        if cache is not None:
+            embedding = cache.get(text)
+            if embedding is None:
+                embedding = cache.put(text, self._embed(text))
+            return embedding
+
+        return self._embed(text)
+
+    def _embed(self: typing.Self, text: str) -> list[float]:
+        return self.encode([text], batch_size=1)[0].tolist()
+
+    def _forward(
+        self: typing.Self,
+        input_ids: np.ndarray,
+        attention_mask: np.ndarray,
+    ) -> np.ndarray:
+        with torch.inference_mode():
+            outputs = self._model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask),
+            )
+
+        embeddings = f.normalize(outputs.last_hidden_state[:, 0], p=2, dim=1)
+        return embeddings.float().numpy()
+
+
+def _create_text_generation_model() -> _TextGenerationModel:
+    if settings.models.server_socket is not None:
+        from services import model_server
+
+        return model_server.RemoteTextGenerationModel(settings.models.server_socket)
+
+    return _TextGenerationModel()
+
+
+def _create_embedding_model() -> _EmbeddingModel:
+    if settings.models.server_socket is not None:
+        from services import model_server
+
+        return model_server.RemoteEmbeddingModel(settings.models.server_socket)
+
+    if settings.embedding.backend == 'onnx':
+        from services import onnx_embedding
+
+        return onnx_embedding.OnnxEmbeddingModel(BACKEND_ROOT / settings.embedding.onnx_path)
+
+    return _EmbeddingModel()
+
+
+_Model = typing.TypeVar('_Model')
+_models: dict[str, object] = {}
+_models_lock = threading.Lock()
+
+
+def _get_model(name: str, factory: typing.Callable[[], _Model]) -> _Model:
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = factory()
+    return model
+
+
+def get_text_generation_model() -> _TextGenerationModel:
+    """
+    Text generation model, loaded on the first call.
+
+    With MODEL_SERVER_SOCKET set it is a client of the shared model server.
+    """
+    return _get_model('text_generation_model', _create_text_generation_model)
+
+
+def get_embedding_model() -> _EmbeddingModel:
+    """
+    Embedding model, loaded on the first call.
+
+    With MODEL_SERVER_SOCKET set it is a client of the shared model server.
+    """
+    return _get_model('embedding_model', _create_embedding_model)
+
+
+def _get_text_generation_stats() -> dict[str, float]:
+    # Remote models keep their stats in the model server process.
+    return getattr(_models.get('text_generation_model'), 'stats', {})
+
+
+metrics.register_model_stats('text_generation', _get_text_generation_stats)
+
+
+def models_loaded() -> bool:
+    return {'text_generation_model', 'embedding_model'} <= _models.keys()
+
 
-        embeddings = outputs.last_hidden_state[:, 0]
-        embeddings = f.normalize(embeddings, p=2, dim=1)
-        return embeddings.tolist()[0]
+def warmup() -> None:
+    """Loads both models and runs one small forward pass through each."""
+    get_embedding_model().encode(['прогрев'])
+    get_text_generation_model().generate_batch(['Привет!'], max_new_tokens=1)
 
 
-embedding_model = _EmbeddingModel()
+def __getattr__(name: str) -> _TextGenerationModel | _EmbeddingModel:
+    if name == 'text_generation_model':
+        return get_text_generation_model()
+    if name == 'embedding_model':
+        return get_embedding_model()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,384 @@
+"""
+Model-serving process shared by all API workers.
+
+The process owns the embedding and text generation models and listens on a
+Unix socket. Requests of all connected workers are merged into batched
+model calls by MicroBatcher, so memory of the models does not grow with the
+number of uvicorn workers. Metrics of the models, such as the generated
+tokens, are counted in this process and not in the workers.
+
+Messages are JSON objects prefixed with their length as a 4-byte big-endian
+integer; a request is answered with one {"result": ...} or {"error": ...}
+message, a streaming request with a sequence of {"item": ...} messages
+closed by {"done": true}.
+
+Run from backend/application:
+    python -m services.model_server --socket /tmp/nextstop-models.sock
+and start the API workers with MODEL_SERVER_SOCKET set to the same path.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import socket
+import struct
+import threading
+import typing
+
+import numpy as np
+
+import services.ml
+import services.scheduler
+from core.config import settings
+from models import place_payload
+
+_HEADER: typing.Final[struct.Struct] = struct.Struct('>I')
+
+_Json = str | int | float | bool | list | dict | None
+
+_Item = typing.TypeVar('_Item')
+_Key = typing.TypeVar('_Key')
+_Result = typing.TypeVar('_Result')
+
+
+class ModelServerError(RuntimeError):
+    """Raised by the remote models when the server fails to answer a request."""
+
+
+def _encode_message(message: dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    return _HEADER.pack(len(body)) + body
+
+
+async def _read_message(reader: asyncio.StreamReader) -> dict | None:
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _run_grouped(
+    items: list[tuple[_Item, _Key]],
+    fn: typing.Callable[[list[_Item], _Key], typing.Sequence[_Result]],
+) -> list[_Result]:
+    """Calls fn once per distinct key and returns the results in input order."""
+    results: list[_Result | None] = [None] * len(items)
+    for key in dict.fromkeys(key for _, key in items):
+        indices = [i for i, (_, item_key) in enumerate(items) if item_key == key]
+        for i, result in zip(indices, fn([items[i][0] for i in indices], key), strict=True):
+            results[i] = result
+    return typing.cast(list[_Result], results)
+
+
+def _encode_batch(items: list[tuple[str, str]]) -> list[list[float]]:
+    model = services.ml.get_embedding_model()
+    return _run_grouped(
+        items,
+        lambda texts, prefix: model.encode(texts, prefix=services.ml._Prefix(prefix)).tolist(),
+    )
+
+
+def _generate_batch(items: list[tuple[str, int | None]]) -> list[str]:
+    model = services.ml.get_text_generation_model()
+    return _run_grouped(
+        items,
+        lambda prompts, max_new_tokens: model.generate_batch(prompts, max_new_tokens),
+    )
+
+
+class ModelServer:
+    """Answers requests of the remote models with the local ones."""
+
+    def __init__(self: typing.Self) -> None:
+        # All text generation runs on one thread, batched or not.
+        self._generation_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='generation',
+        )
+        self._embedding_batcher = services.scheduler.MicroBatcher(
+            _encode_batch,
+            max_batch_size=settings.embedding.batch_size,
+            max_wait_ms=settings.models.server_batch_wait_ms,
+        )
+        self._generation_batcher = services.scheduler.MicroBatcher(
+            _generate_batch,
+            max_batch_size=settings.models.server_generation_batch_size,
+            max_wait_ms=settings.models.server_batch_wait_ms,
+            executor=self._generation_executor,
+        )
+
+    async def serve(self: typing.Self, path: str) -> None:
+        """Loads the models and serves connections until cancelled."""
+        await asyncio.get_running_loop().run_in_executor(
+            self._generation_executor,
+            services.ml.warmup,
+        )
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        print(f'Model server is listening on {path}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self._embedding_batcher.close()
+            await self._generation_batcher.close()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def _handle_connection(
+        self: typing.Self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while (request := await _read_message(reader)) is not None:
+                try:
+                    if request['method'] == 'iter_desc_selection':
+                        async for text in self._iter_desc_selection(request):
+                            writer.write(_encode_message({'item': text}))
+                            await writer.drain()
+                        writer.write(_encode_message({'done': True}))
+                    else:
+                        result = await self._call(request)
+                        writer.write(_encode_message({'result': result}))
+                except Exception as e:
+                    writer.write(_encode_message({'error': f'{type(e).__name__}: {e}'}))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _call(self: typing.Self, request: dict) -> _Json:
+        method = request['method']
+        if method == 'encode':
+            return await asyncio.gather(
+                *(
+                    self._embedding_batcher.submit((text, request['prefix']))
+                    for text in request['texts']
+                ),
+            )
+        if method == 'generate_batch':
+            return await asyncio.gather(
+                *(
+                    self._generation_batcher.submit((prompt, request['max_new_tokens']))
+                    for prompt in request['prompts']
+                ),
+            )
+        if method == 'get_desc_selection':
+            prompt, places = self._parse_desc_request(request)
+            if settings.generation.mode != 'batched':
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._generation_executor,
+                    services.ml.get_text_generation_model().get_desc_selection,
+                    prompt,
+                    places,
+                )
+            # Place prompts of concurrent requests share one generate() call.
+            return await asyncio.gather(
+                *(
+                    self._generation_batcher.submit(
+                        (services.ml._TextGenerationModel._get_place_prompt(prompt, place), None),
+                    )
+                    for place in places
+                ),
+            )
+        raise ValueError(f'Unknown method {method!r}')
+
+    async def _iter_desc_selection(
+        self: typing.Self,
+        request: dict,
+    ) -> typing.AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        prompt, places = self._parse_desc_request(request)
+        explanations = services.ml.get_text_generation_model().iter_desc_selection(prompt, places)
+        for _ in places:
+            yield await loop.run_in_executor(self._generation_executor, next, explanations)
+
+    @staticmethod
+    def _parse_desc_request(request: dict) -> tuple[str, list[place_payload.PlacePayload]]:
+        places = [place_payload.PlacePayload(**place) for place in request['places']]
+        return request['prompt'], places
+
+
+class _Connection:
+    """
+    Blocking connections to the model server.
+
+    Every request checks out a socket of its own and returns it only after
+    the whole answer has been read, so a stream that is consumed from
+    different threads never shares its socket with another request.
+    """
+
+    def __init__(self: typing.Self, path: str) -> None:
+        self._path = path
+        self._idle: list[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def call(self: typing.Self, method: str, **params: _Json) -> _Json:
+        sock = self._send({'method': method, **params})
+        try:
+            result = self._field(self._receive(sock), 'result')
+        except BaseException:
+            sock.close()
+            raise
+        self._release(sock)
+        return result
+
+    def iterate(self: typing.Self, method: str, **params: _Json) -> typing.Iterator[_Json]:
+        sock = self._send({'method': method, **params})
+        try:
+            while 'done' not in (message := self._receive(sock)):
+                yield self._field(message, 'item')
+        except BaseException:
+            # The rest of the stream was not read, the socket is unusable.
+            sock.close()
+            raise
+        self._release(sock)
+
+    def _acquire(self: typing.Self) -> socket.socket:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(settings.models.server_timeout_seconds)
+        try:
+            sock.connect(self._path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _release(self: typing.Self, sock: socket.socket) -> None:
+        with self._lock:
+            self._idle.append(sock)
+
+    def _send(self: typing.Self, request: dict) -> socket.socket:
+        sock = None
+        try:
+            sock = self._acquire()
+            sock.sendall(_encode_message(request))
+        except OSError as e:
+            if sock is not None:
+                sock.close()
+            raise ModelServerError(f'Model server {self._path} is not available: {e}') from e
+        return sock
+
+    def _receive(self: typing.Self, sock: socket.socket) -> dict:
+        try:
+            (length,) = _HEADER.unpack(self._receive_exactly(sock, _HEADER.size))
+            message = json.loads(self._receive_exactly(sock, length))
+        except OSError as e:
+            raise ModelServerError(f'Model server {self._path} is not available: {e}') from e
+        if 'error' in message:
+            raise ModelServerError(message['error'])
+        return message
+
+    @staticmethod
+    def _field(message: dict, name: str) -> _Json:
+        if name not in message:
+            raise ModelServerError(f'Unexpected model server message without {name!r}')
+        return message[name]
+
+    def _receive_exactly(self: typing.Self, sock: socket.socket, size: int) -> bytes:
+        chunks: list[bytes] = []
+        while size > 0:
+            chunk = sock.recv(size)
+            if not chunk:
+                raise ConnectionResetError('Model server closed the connection')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+class RemoteEmbeddingModel:
+    """_EmbeddingModel interface served by the model server."""
+
+    def __init__(self: typing.Self, path: str) -> None:
+        self._connection = _Connection(path)
+
+    def multi_call(self: typing.Self, texts: list[str]) -> list[list[float]]:
+        return self.encode(texts).tolist()
+
+    def encode(
+        self: typing.Self,
+        texts: list[str],
+        batch_size: int | None = None,
+        prefix: services.ml._Prefix = services.ml._Prefix.SEARCH_QUERY,
+    ) -> np.ndarray:
+        """Embeds texts, batch_size is chosen by the server."""
+        vectors = self._connection.call('encode', texts=texts, prefix=prefix.value)
+        return np.array(vectors, dtype=np.float32).reshape(len(texts), services.ml.EMBEDDING_LENGTH)
+
+    def __call__(self: typing.Self, text: str) -> list[float]:
+        return self.encode([text])[0].tolist()
+
+
+class RemoteTextGenerationModel:
+    """_TextGenerationModel interface served by the model server."""
+
+    def __init__(self: typing.Self, path: str) -> None:
+        self._connection = _Connection(path)
+
+    def get_desc_selection(
+        self: typing.Self,
+        prompt: str,
+        places: list[place_payload.PlacePayload],
+    ) -> list[str]:
+        return self._connection.call(
+            'get_desc_selection',
+            prompt=prompt,
+            places=[place.model_dump() for place in places],
+        )
+
+    def iter_desc_selection(
+        self: typing.Self,
+        prompt: str,
+        places: list[place_payload.PlacePayload],
+    ) -> typing.Iterator[str]:
+        """Yields the explanation of every place as soon as it is generated."""
+        yield from self._connection.iterate(
+            'iter_desc_selection',
+            prompt=prompt,
+            places=[place.model_dump() for place in places],
+        )
+
+    def generate_batch(
+        self: typing.Self,
+        prompts: list[str],
+        max_new_tokens: int | None = None,
+    ) -> list[str]:
+        return self._connection.call(
+            'generate_batch',
+            prompts=prompts,
+            max_new_tokens=max_new_tokens,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--socket',
+        default=settings.models.server_socket or 'model_server.sock',
+        help='path of the Unix socket',
+    )
+    args = parser.parse_args()
+
+    # This process owns the models, so it must not forward calls to itself.
+    settings.models.server_socket = None
+    try:
+        asyncio.run(ModelServer().serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""ONNX Runtime CPU backend of the FRIDA encoder with int8 dynamic quantization."""
+
+import pathlib
+import typing
+
+import numpy as np
+import torch
+import torch.nn.functional as f
+import transformers
+
+from core.config import settings
+from services import ml
+
+SEQUENCE_BUCKETS: typing.Final[tuple[int, ...]] = (16, 32, 64, 128, 256, 512)
+
+
+class _ClsEncoder(torch.nn.Module):
+    """Encoder followed by the CLS pooling and normalization of _EmbeddingModel."""
+
+    def __init__(self: typing.Self, model: transformers.T5EncoderModel) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(
+        self: typing.Self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+    ) -> torch.Tensor:
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+        return f.normalize(outputs.last_hidden_state[:, 0], p=2, dim=1)
+
+
+def export_onnx(output_dir: pathlib.Path, quantize: bool = True) -> pathlib.Path:
+    """
+    Exports FRIDA with its tokenizer to ONNX.
+
+    Args:
+        output_dir (pathlib.Path): directory for the model and tokenizer files
+        quantize (bool): also write a copy with dynamic int8 weights
+
+    Returns:
+        pathlib.Path: path of the model to serve
+    """
+    import onnxruntime.quantization
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(ml._EmbeddingModel.name_model)
+    model = transformers.T5EncoderModel.from_pretrained(ml._EmbeddingModel.name_model)
+    model.eval()
+
+    sample = tokenizer(
+        ['search_query:пример запроса', 'search_query:второй, чуть более длинный пример'],
+        padding=True,
+        return_tensors='pt',
+    )
+    model_path = output_dir / 'model.onnx'
+    with torch.inference_mode():
+        torch.onnx.export(
+            _ClsEncoder(model),
+            (sample['input_ids'], sample['attention_mask']),
+            model_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['embedding'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'embedding': {0: 'batch'},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if not quantize:
+        return model_path
+
+    quantized_path = output_dir / 'model_int8.onnx'
+    onnxruntime.quantization.quantize_dynamic(
+        model_path,
+        quantized_path,
+        weight_type=onnxruntime.quantization.QuantType.QInt8,
+        per_channel=True,
+    )
+    return quantized_path
+
+
+class OnnxEmbeddingModel(ml._EmbeddingModel):
+    """
+    Drop-in replacement of _EmbeddingModel running an exported model on ONNX Runtime.
+
+    Batches are padded up to the next length from SEQUENCE_BUCKETS, so the
+    runtime sees only a handful of input shapes and reuses its buffers.
+    """
+
+    def __init__(self: typing.Self, model_path: pathlib.Path) -> None:
+        import onnxruntime
+
+        self._tokenizer = transformers.AutoTokenizer.from_pretrained(model_path.parent)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if settings.embedding.onnx_threads > 0:
+            options.intra_op_num_threads = settings.embedding.onnx_threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_path),
+            options,
+            providers=['CPUExecutionProvider'],
+        )
+
+    def _forward(
+        self: typing.Self,
+        input_ids: np.ndarray,
+        attention_mask: np.ndarray,
+    ) -> np.ndarray:
+        length = input_ids.shape[1]
+        bucket = next((size for size in SEQUENCE_BUCKETS if size >= length), length)
+        if bucket > length:
+            padding = ((0, 0), (0, bucket - length))
+            input_ids = np.pad(
+                input_ids,
+                padding,
+                constant_values=self._tokenizer.pad_token_id,
+            )
+            attention_mask = np.pad(attention_mask, padding, constant_values=0)
+
+        (embeddings,) = self._session.run(
+            ['embedding'],
+            {
+                'input_ids': input_ids.astype(np.int64),
+                'attention_mask': attention_mask.astype(np.int64),
+            },
+        )
+        return embeddings
+
+
+def check_parity(
+    reference: ml._EmbeddingModel,
+    candidate: ml._EmbeddingModel,
+    texts: list[str],
+) -> float:
+    """
+    Compares two embedding backends on the same texts.
+
+    Returns:
+        float: the smallest cosine similarity between paired embeddings
+    """
+    expected = reference.encode(texts)
+    actual = candidate.encode(texts)
+    return float(np.min(np.sum(expected * actual, axis=1)))
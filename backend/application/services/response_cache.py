@@ -0,0 +1,164 @@
+"""Semantic cache of /handle responses."""
+
+import collections
+import dataclasses
+import threading
+import time
+import typing
+
+import numpy as np
+
+import schemas.user_io
+from core.config import settings
+
+_GEOHASH_ALPHABET: typing.Final[str] = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Standard base32 geohash of the point."""
+    lat_range = [-90., 90.]
+    lon_range = [-180., 180.]
+    code: list[str] = []
+    bits = 0
+    bit_count = 0
+    use_lon = True
+    while len(code) < precision:
+        value, value_range = (lon, lon_range) if use_lon else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        use_lon = not use_lon
+        bit_count += 1
+        if bit_count == 5:
+            code.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(code)
+
+
+@dataclasses.dataclass
+class _Entry:
+    bucket: tuple[str, int]
+    embedding: np.ndarray
+    response: schemas.user_io.UserOutput
+    created_at: float
+
+
+class ResponseCache:
+    """
+    Stores responses of /handle and serves them for similar requests.
+
+    A request hits an entry when it falls into the same geohash cell, has the
+    same time budget and its prompt embedding has cosine similarity of at
+    least similarity_threshold with the cached one.
+    """
+
+    def __init__(
+        self: typing.Self,
+        similarity_threshold: float,
+        max_entries: int,
+        ttl_seconds: float,
+        geohash_precision: int,
+    ) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.geohash_precision = geohash_precision
+        self.hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict[int, _Entry] = collections.OrderedDict()
+        self._buckets: dict[tuple[str, int], set[int]] = collections.defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self: typing.Self) -> int:
+        return len(self._entries)
+
+    def get(
+        self: typing.Self,
+        embedding: list[float],
+        latitude: float,
+        longitude: float,
+        time_for_walk: int,
+    ) -> schemas.user_io.UserOutput | None:
+        """Cached response for a similar request or None."""
+        bucket = self._bucket(latitude, longitude, time_for_walk)
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            best_id: int | None = None
+            best_similarity = self.similarity_threshold
+            for entry_id in list(self._buckets.get(bucket, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(entry.embedding @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id].response
+
+    def put(
+        self: typing.Self,
+        embedding: list[float],
+        latitude: float,
+        longitude: float,
+        time_for_walk: int,
+        response: schemas.user_io.UserOutput,
+    ) -> None:
+        """Stores the response, evicting the least recently used entries."""
+        bucket = self._bucket(latitude, longitude, time_for_walk)
+        entry = _Entry(bucket, self._normalize(embedding), response, time.time())
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._buckets[bucket].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self: typing.Self) -> None:
+        """Drops every entry, e.g. after the place catalog has changed."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def _bucket(
+        self: typing.Self,
+        latitude: float,
+        longitude: float,
+        time_for_walk: int,
+    ) -> tuple[str, int]:
+        return geohash(latitude, longitude, self.geohash_precision), time_for_walk
+
+    def _remove(self: typing.Self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets[entry.bucket]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._buckets[entry.bucket]
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+response_cache = ResponseCache(
+    similarity_threshold=settings.response_cache.similarity_threshold,
+    max_entries=settings.response_cache.max_entries,
+    ttl_seconds=settings.response_cache.ttl_seconds,
+    geohash_precision=settings.response_cache.geohash_precision,
+)
@@ -0,0 +1,262 @@
+"""Anytime route search over a small set of candidate places."""
+
+import dataclasses
+import itertools
+import math
+import time as time_module
+import typing
+
+SCORE_EPS: typing.Final[float] = 1e-9
+DEADLINE_CHECK_INTERVAL: typing.Final[int] = 64
+
+
+@dataclasses.dataclass
+class RouteSolution:
+    """Best route found, optimal is False when the search was cut by the deadline."""
+
+    route: list[int]
+    time: float
+    optimal: bool
+
+
+class _DeadlineExceededError(Exception):
+    pass
+
+
+class _RouteProblem:
+    """Route evaluation shared by the heuristic and the exact search."""
+
+    def __init__(
+        self: typing.Self,
+        scores: list[float],
+        start_times: list[float],
+        edge_times: list[list[float]],
+        time_limit: float,
+        max_len: int,
+        min_len: int,
+        deadline: float | None,
+    ) -> None:
+        self.scores = scores
+        self.start_times = start_times
+        self.edge_times = edge_times
+        self.time_limit = time_limit
+        self.max_len = max_len
+        self.min_len = min_len
+        self.deadline = deadline
+
+    def check_deadline(self: typing.Self) -> None:
+        if self.deadline is not None and time_module.perf_counter() > self.deadline:
+            raise _DeadlineExceededError
+
+    def route_time(self: typing.Self, route: list[int]) -> float:
+        total = self.start_times[route[0]]
+        for a, b in itertools.pairwise(route):
+            total += self.edge_times[a][b]
+        return total
+
+    def key(self: typing.Self, route: list[int]) -> tuple[bool, float, float] | None:
+        """Sort key of a route within the time limit, higher is better."""
+        if not route:
+            return None
+        route_time = self.route_time(route)
+        if route_time > self.time_limit:
+            return None
+        return len(route) >= self.min_len, sum(self.scores[i] for i in route), -route_time
+
+    @staticmethod
+    def is_better(
+        candidate: tuple[bool, float, float],
+        incumbent: tuple[bool, float, float] | None,
+    ) -> bool:
+        if incumbent is None or candidate[0] != incumbent[0]:
+            return incumbent is None or candidate[0]
+        if abs(candidate[1] - incumbent[1]) > SCORE_EPS:
+            return candidate[1] > incumbent[1]
+        return candidate[2] > incumbent[2]
+
+
+def _greedy_route(problem: _RouteProblem) -> list[int]:
+    """Inserts candidates by descending score at their cheapest feasible position."""
+    route: list[int] = []
+    for j in sorted(range(len(problem.scores)), key=lambda i: -problem.scores[i]):
+        if len(route) == problem.max_len:
+            break
+        best: tuple[float, list[int]] | None = None
+        for position in range(len(route) + 1):
+            candidate = route[:position] + [j] + route[position:]
+            candidate_time = problem.route_time(candidate)
+            if candidate_time <= problem.time_limit and (best is None or candidate_time < best[0]):
+                best = candidate_time, candidate
+        if best is not None:
+            route = best[1]
+    return route
+
+
+def _neighbours(problem: _RouteProblem, route: list[int]) -> typing.Iterator[list[int]]:
+    unused = [j for j in range(len(problem.scores)) if j not in route]
+    if len(route) < problem.max_len:
+        for j in unused:
+            for position in range(len(route) + 1):
+                yield route[:position] + [j] + route[position:]
+    for position in range(len(route)):
+        for j in unused:
+            yield route[:position] + [j] + route[position + 1:]
+    for start in range(len(route) - 1):
+        for end in range(start + 2, len(route) + 1):
+            yield route[:start] + route[start:end][::-1] + route[end:]
+    for source in range(len(route)):
+        rest = route[:source] + route[source + 1:]
+        for target in range(len(route)):
+            if target != source:
+                yield rest[:target] + [route[source]] + rest[target:]
+
+
+def _local_search(problem: _RouteProblem, route: list[int]) -> list[int]:
+    """
+    Improves the route until no move helps or the deadline passes.
+
+    Moves are insertion and swap of a candidate, 2-opt reversal of a segment
+    and relocation of a place; the first improving move is applied.
+    """
+    route_key = problem.key(route)
+    improved = True
+    try:
+        while improved:
+            improved = False
+            problem.check_deadline()
+            for candidate in _neighbours(problem, route):
+                candidate_key = problem.key(candidate)
+                if candidate_key is not None and problem.is_better(candidate_key, route_key):
+                    route, route_key = candidate, candidate_key
+                    improved = True
+                    break
+    except _DeadlineExceededError:
+        pass
+    return route
+
+
+def solve_route(
+    scores: list[float],
+    start_times: list[float],
+    edge_times: list[list[float]],
+    time_limit: float,
+    max_len: int,
+    min_len: int = 1,
+    deadline: float | None = None,
+) -> RouteSolution | None:
+    """
+    Finds the route with the highest total score and, among those, the shortest time.
+
+    A greedy insertion route improved by local search seeds the incumbent of
+    a depth-first branch-and-bound over partial routes. A branch is cut when
+    it runs out of time, when even the best remaining candidates cannot beat
+    the incumbent score, or when the same set of places has already been
+    reached at the same last place in less time (Held-Karp dominance).
+    When the deadline passes, the best route found so far is returned; if
+    none of min_len places has been found yet, the search goes on until the
+    first one is.
+
+    Args:
+        scores (list[float]): score of every candidate
+        start_times (list[float]): time to reach and visit candidate i first
+        edge_times (list[list[float]]): time to go from i to j and visit j
+        time_limit (float): maximal total time of a route
+        max_len (int): maximal number of places in a route
+        min_len (int): minimal number of places in a route
+        deadline (float | None): time.perf_counter() value to stop the search at
+
+    Returns:
+        RouteSolution | None: candidate indices in visiting order, total time
+        and whether the route is proven optimal, or None if no route fits the limit
+    """
+    count = len(scores)
+    max_len = min(max_len, count)
+    min_len = max(min_len, 1)
+    if max_len < min_len:
+        return None
+
+    problem = _RouteProblem(
+        scores, start_times, edge_times, time_limit, max_len, min_len, deadline,
+    )
+    seed = _local_search(problem, _greedy_route(problem))
+    seed_key = problem.key(seed)
+
+    order = sorted(range(count), key=lambda i: -scores[i])
+    cheapest_entry = [
+        min((edge_times[i][j] for i in range(count) if i != j), default=math.inf)
+        for j in range(count)
+    ]
+    best_score = 0.0
+    best_time = math.inf
+    best_route: list[int] = []
+    if seed_key is not None and seed_key[0]:
+        best_score, best_time, best_route = seed_key[1], -seed_key[2], seed
+    reached: dict[tuple[int, int], float] = {}
+    route: list[int] = []
+    visited = 0
+
+    def upper_bound(mask: int, time: float, slots: int) -> float:
+        bound = 0.0
+        for j in order:
+            if slots == 0 or scores[j] <= 0:
+                break
+            if mask >> j & 1 or time + cheapest_entry[j] > time_limit:
+                continue
+            bound += scores[j]
+            slots -= 1
+        return bound
+
+    def visit(mask: int, last: int, score: float, time: float) -> None:
+        nonlocal best_score, best_time, best_route, visited
+        visited += 1
+        # Without a route of min_len places there is nothing to return yet.
+        if visited % DEADLINE_CHECK_INTERVAL == 0 and best_route:
+            problem.check_deadline()
+        depth = len(route)
+        if depth >= min_len and (
+            score > best_score + SCORE_EPS
+            or (score >= best_score - SCORE_EPS and time < best_time)
+        ):
+            best_score, best_time, best_route = score, time, route.copy()
+        if depth == max_len:
+            return
+
+        bound = score + upper_bound(mask, time, max_len - depth)
+        if bound < best_score - SCORE_EPS:
+            return
+        if bound <= best_score + SCORE_EPS and time >= best_time:
+            return
+
+        for j in order:
+            if mask >> j & 1:
+                continue
+            next_time = time + edge_times[last][j]
+            if next_time > time_limit:
+                continue
+            next_mask = mask | 1 << j
+            key = (next_mask, j)
+            if reached.get(key, math.inf) <= next_time:
+                continue
+            reached[key] = next_time
+            route.append(j)
+            visit(next_mask, j, score + scores[j], next_time)
+            route.pop()
+
+    optimal = True
+    try:
+        for i in order:
+            if start_times[i] > time_limit:
+                continue
+            key = (1 << i, i)
+            if reached.get(key, math.inf) <= start_times[i]:
+                continue
+            reached[key] = start_times[i]
+            route.append(i)
+            visit(1 << i, i, scores[i], start_times[i])
+            route.pop()
+    except _DeadlineExceededError:
+        optimal = False
+
+    if not best_route:
+        return None
+    return RouteSolution(best_route, best_time, optimal)
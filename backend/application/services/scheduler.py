@@ -0,0 +1,134 @@
+"""Micro-batching of model calls coming from concurrent requests."""
+
+import asyncio
+import concurrent.futures
+import typing
+
+import services.admission
+import services.embedding_cache
+import services.ml
+from core.config import settings
+
+_Item = typing.TypeVar('_Item')
+_Result = typing.TypeVar('_Result')
+
+
+class MicroBatcher(typing.Generic[_Item, _Result]):
+    """
+    Collects items submitted by concurrent callers into batched calls.
+
+    The first item of a batch waits at most max_wait_ms for companions, then
+    the whole batch is passed to batch_fn on a single worker thread, so model
+    calls never run in parallel with each other and do not fight over the
+    torch intra-op threads. A single-thread executor can be shared with
+    other calls of the same model.
+    """
+
+    def __init__(
+        self: typing.Self,
+        batch_fn: typing.Callable[[list[_Item]], typing.Sequence[_Result]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: concurrent.futures.ThreadPoolExecutor | None = None,
+    ) -> None:
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='micro-batcher',
+        )
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[tuple[_Item, asyncio.Future[_Result]]] | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def submit(self: typing.Self, item: _Item) -> _Result:
+        """Schedules one item and waits for its result."""
+        queue = self._ensure_worker()
+        future: asyncio.Future[_Result] = asyncio.get_running_loop().create_future()
+        await queue.put((item, future))
+        return await future
+
+    async def close(self: typing.Self) -> None:
+        """Stops the worker task of the current event loop."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._loop = self._queue = self._worker = None
+
+    def _ensure_worker(
+        self: typing.Self,
+    ) -> asyncio.Queue[tuple[_Item, asyncio.Future[_Result]]]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def _run(
+        self: typing.Self,
+        queue: asyncio.Queue[tuple[_Item, asyncio.Future[_Result]]],
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    self._batch_fn,
+                    [item for item, _ in batch],
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results, strict=True):
+                if not future.done():
+                    future.set_result(result)
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    return services.ml.get_embedding_model().encode(texts).tolist()
+
+
+embedding_batcher: MicroBatcher[str, list[float]] = MicroBatcher(
+    _embed_batch,
+    max_batch_size=settings.embedding.batch_size,
+    max_wait_ms=settings.embedding.batch_wait_ms,
+)
+
+
+async def embed(text: str) -> list[float]:
+    """Embeds a search query together with queries of concurrent requests."""
+    cache = services.embedding_cache.get_embedding_cache()
+    if cache is None:
+        async with services.admission.embedding_gate.admit():
+            return await embedding_batcher.submit(text)
+
+    # SQLite may wait for a lock of another worker, so it stays off the event loop.
+    embedding = await asyncio.to_thread(cache.get, text)
+    if embedding is None:
+        async with services.admission.embedding_gate.admit():
+            embedding = await embedding_batcher.submit(text)
+        embedding = await asyncio.to_thread(cache.put, text, embedding)
+    return embedding
@@ -1,46 +1,19 @@
-import itertools
 import math
 import pathlib
-import pickle
-
-import pandas as pd
+import time
 
 import models.place_payload
+import services.catalog
+import services.route_solver
+from core.config import settings
 
 MAX_PLACES_COUNT = 5
 MAX_SHIFT = 4
-COUNT_PLACES = 258
-REACHABILITY_MATRIX: list[list[float]] = [
-    [0.] * COUNT_PLACES for _ in range(COUNT_PLACES)
-]
-VISITING_TIMINGS = [0] * COUNT_PLACES
-BACKEND_ROOT = pathlib.Path(
-        __file__,
-    ).parent.parent.parent
-
-try:
-    reachability_path = BACKEND_ROOT / 'open_street_map.pkl'
-    with open(reachability_path, 'rb') as f:
-        REACHABILITY_MATRIX = pickle.load(f)
-    for row in range(len(REACHABILITY_MATRIX)):
-        for col in range(len(REACHABILITY_MATRIX[0])):
-            REACHABILITY_MATRIX[row][col] //= 60
-except FileNotFoundError:
-    print('File not found')
-except pickle.UnpicklingError:
-    print('Error while attempting to load pkl file')
-
+METERS_PER_MINUTE = 100
 BACKEND_ROOT = pathlib.Path(__file__).parent.parent.parent
-try:
-    visiting_timings_path = BACKEND_ROOT / 'visiting_time.csv'
-    
-    df = pd.read_csv(visiting_timings_path, header=None, names=['data'], sep=';')
-    last_values = df['data'].apply(lambda x: x.split(',')[-1] if isinstance(x, str) else x)
-    VISITING_TIMINGS = [[int(value)] for value in last_values[1:]]
+CATALOG_PATH = BACKEND_ROOT / settings.catalog.path
 
-    
-except FileNotFoundError:
-    print('File not found')
+catalog_holder = services.catalog.CatalogHolder(CATALOG_PATH)
 
 
 def simple_manhattan_distance(
@@ -53,7 +26,45 @@ def simple_manhattan_distance(
     lat_km = abs(lat2 - lat1) * 111
     lon_km = abs(lon2 - lon1) * 111 * math.cos(math.radians((lat1 + lat2) / 2))
     
-    return (lat_km + lon_km) * 1000 // 100
+    return (lat_km + lon_km) * 1000 // METERS_PER_MINUTE
+
+
+def get_time_limit(time_for_walk: int) -> int:
+    """Time budget of the route in minutes."""
+    return time_for_walk * 60 + 60
+
+
+def get_search_radius(time_for_walk: int) -> float:
+    """
+    Distance in meters beyond which a place cannot be reached within the budget.
+
+    The straight-line distance never exceeds the manhattan one used by
+    get_best_route, so no reachable place is left outside the radius.
+    """
+    return get_time_limit(time_for_walk) * METERS_PER_MINUTE
+
+
+def count_reachable(
+    places: list[models.place_payload.PlacePayload],
+    time_for_walk: int,
+    lat: float,
+    lon: float,
+    catalog: services.catalog.Catalog | None = None,
+) -> int:
+    """Number of places that can be visited first within the budget."""
+    if catalog is None:
+        catalog = catalog_holder.get()
+    places = [place for place in places if place.id in catalog]
+    if not places:
+        return 0
+
+    time_limit = get_time_limit(time_for_walk)
+    visit_minutes = catalog.visit_minutes[catalog.rows([place.id for place in places])]
+    return sum(
+        simple_manhattan_distance(lat, lon, place.latitude, place.longitude)
+        + int(visit) <= time_limit
+        for place, visit in zip(places, visit_minutes, strict=True)
+    )
 
 
 def get_best_route(
@@ -61,50 +72,50 @@ def get_best_route(
     time_for_walk: int,
     lat: float,
     lon: float,
-) -> list[models.place_payload.PlacePayload] | None:
-    """Get best route for user."""
+    catalog: services.catalog.Catalog | None = None,
+) -> tuple[list[models.place_payload.PlacePayload], int, bool] | None:
+    """
+    Get best route for user on the given or the current catalog.
+
+    The search stops after settings.route.deadline_ms (0 for no limit), the
+    last item of the result tells whether the route is proven optimal.
+    """
+    deadline_ms = settings.route.deadline_ms
+    deadline = time.perf_counter() + deadline_ms / 1000 if deadline_ms > 0 else None
+    if catalog is None:
+        catalog = catalog_holder.get()
+    places = [place for place in places if place.id in catalog]
     if not places:
         return None
-    
-    time_for_walk *= 60
-    len_perm = min(MAX_PLACES_COUNT, len(places))
-    shift: int = 0
-    best_score: int = 0
-    best_time: int = 10 ** 15
-    best_permutation: list[models.place_payload.PlacePayload] = []
-    while shift <= MAX_SHIFT and len_perm - shift >= 0:
-        permutations: itertools.permutations[models.place_payload.PlacePayload] = (
-            itertools.permutations(places, len_perm - shift)
-            )
-
-        for perm in permutations:
-            time_to_pass: int = 0
-            perm_score: float = 0
-            for i, place in enumerate(perm):
-                perm_score += place.score
-                time_to_pass += VISITING_TIMINGS[place.id][0]
-                if i == 0:
-                    time_to_reach_first_place = simple_manhattan_distance(
-                        lat, 
-                        lon, 
-                        place.latitude, 
-                        place.longitude,
-                        )
-                    time_to_pass += time_to_reach_first_place
-                    continue
-                time_to_pass += REACHABILITY_MATRIX[perm[i - 1].id][place.id]
-            if time_to_pass - 60 > time_for_walk:
-                continue
-
-            if perm_score > best_score:
-                best_permutation = list(perm)
-                best_score = perm_score
-                best_time = time_to_pass
-            elif perm_score == best_score:
-                if time_to_pass < best_time:
-                    best_permutation = list(perm)
-                    best_time = time_to_pass
-        shift += 1
-    
 
-    return (best_permutation, best_time // 60) if best_permutation else None
+    time_limit = get_time_limit(time_for_walk)
+    max_len = min(MAX_PLACES_COUNT, len(places))
+    rows = catalog.rows([place.id for place in places])
+    visit_minutes = catalog.visit_minutes[rows].astype(int)
+    scores: list[float] = [place.score or 0. for place in places]
+    start_times: list[float] = [
+        simple_manhattan_distance(lat, lon, place.latitude, place.longitude)
+        + int(visit)
+        for place, visit in zip(places, visit_minutes, strict=True)
+    ]
+    edge_times: list[list[int]] = (
+        catalog.travel_minutes[rows][:, rows] + visit_minutes
+    ).tolist()
+
+    solution = services.route_solver.solve_route(
+        scores,
+        start_times,
+        edge_times,
+        time_limit,
+        max_len,
+        max_len - MAX_SHIFT,
+        deadline,
+    )
+    if solution is None:
+        return None
+
+    return (
+        [places[i] for i in solution.route],
+        int(solution.time // 60),
+        solution.optimal,
+    )
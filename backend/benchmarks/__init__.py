@@ -0,0 +1,6 @@
+"""Latency benchmarks of the route solver, embedding, search and /handle."""
+
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent / 'application'))
@@ -0,0 +1,88 @@
+"""
+Full /handle calls with stubbed models.
+
+Embeddings are seeded random vectors and explanations are fixed strings, so
+the case measures the request path around the models: validation, search
+on the numpy backend, route solving and serialization.
+"""
+
+import hashlib
+import pathlib
+import tempfile
+import typing
+import unittest.mock as mock
+
+import fastapi.testclient
+import main
+import numpy as np
+
+import db.numpy_repo
+import models.place_payload
+import services.limiter
+import services.ml
+import services.scheduler
+from benchmarks import bench_search, common
+from core.config import settings
+
+TIME_BUDGETS = (1, 2, 4)
+
+
+async def _stub_embed(text: str) -> list[float]:
+    seed = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest())
+    vector = np.random.default_rng(seed).normal(size=settings.qdrant.vector_size)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _StubTextGenerationModel:
+    def get_desc_selection(
+        self: typing.Self,
+        prompt: str,
+        places: list[models.place_payload.PlacePayload],
+    ) -> list[str]:
+        return [f'{place.title} подходит Вашему запросу.' for place in places]
+
+
+def run(iterations: int) -> dict[str, common.Result]:
+    rng = np.random.default_rng(common.SEED)
+    places = common.load_places()
+
+    results: dict[str, common.Result] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vectors_path = pathlib.Path(tmp_dir) / 'vectors.npz'
+        bench_search.write_seeded_vectors(vectors_path)
+        repository = db.numpy_repo.NumpyRepository(vectors_path)
+
+        with (
+            mock.patch.object(settings.search, 'backend', 'numpy'),
+            mock.patch.object(settings.response_cache, 'enabled', False),
+            mock.patch.object(settings.explanation_store, 'enabled', False),
+            mock.patch.object(services.limiter.limiter, 'enabled', False),
+            mock.patch.object(db.numpy_repo, '_repository', repository),
+            mock.patch.object(services.scheduler, 'embed', _stub_embed),
+            mock.patch.object(
+                services.ml,
+                'get_text_generation_model',
+                _StubTextGenerationModel,
+            ),
+        ):
+            client = fastapi.testclient.TestClient(main.app)
+            for budget in TIME_BUDGETS:
+                requests = []
+                for _ in range(iterations):
+                    lat, lon = common.random_origin(rng, places)
+                    place = places[rng.integers(len(places))]
+                    requests.append(
+                        {
+                            'prompt': place.title[:200],
+                            'time_for_walk': budget,
+                            'latitude': lat,
+                            'longitude': lon,
+                        },
+                    )
+                results[f'e2e/handle/hours={budget}'] = common.measure(
+                    [
+                        lambda data=data: client.post('/handle', json=data).raise_for_status()
+                        for data in requests
+                    ],
+                )
+    return results
@@ -0,0 +1,25 @@
+"""Embedding model encode() per batch size, needs the real model weights."""
+
+import numpy as np
+
+import services.ml
+from benchmarks import common
+
+BATCH_SIZES = (1, 8, 32)
+
+
+def run(iterations: int) -> dict[str, common.Result]:
+    rng = np.random.default_rng(common.SEED)
+    texts = [f'{place.title} {place.description}' for place in common.load_places()]
+    model = services.ml.get_embedding_model()
+
+    results: dict[str, common.Result] = {}
+    for batch_size in BATCH_SIZES:
+        batches = [
+            [texts[i] for i in rng.choice(len(texts), size=batch_size, replace=False)]
+            for _ in range(iterations)
+        ]
+        results[f'embedding/batch={batch_size}'] = common.measure(
+            [lambda batch=batch: model.encode(batch, batch_size) for batch in batches],
+        )
+    return results
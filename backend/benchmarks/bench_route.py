@@ -0,0 +1,52 @@
+"""
+get_best_route over candidate counts and time budgets.
+
+The solver deadline is turned off, so the cases time the whole search and
+stay comparable with the baseline instead of being capped at deadline_ms.
+"""
+
+import functools
+import unittest.mock as mock
+
+import numpy as np
+
+import services.utils
+from benchmarks import common
+from core.config import settings
+
+CANDIDATE_COUNTS = (5, 10, 20, 40)
+TIME_BUDGETS = (1, 2, 4)
+NEAREST_POOL = 80
+
+
+def run(iterations: int) -> dict[str, common.Result]:
+    rng = np.random.default_rng(common.SEED)
+    places = common.load_places()
+    coordinates = np.array([(place.latitude, place.longitude) for place in places])
+
+    results: dict[str, common.Result] = {}
+    for count in CANDIDATE_COUNTS:
+        for budget in TIME_BUDGETS:
+            calls = []
+            for _ in range(iterations):
+                lat, lon = common.random_origin(rng, places)
+                nearest = np.argsort(
+                    np.abs(coordinates[:, 0] - lat) + np.abs(coordinates[:, 1] - lon),
+                )[:NEAREST_POOL]
+                candidates = [
+                    places[i].model_copy(update={'score': float(rng.uniform(0.3, 0.9))})
+                    for i in rng.choice(nearest, size=count, replace=False)
+                ]
+                candidates.sort(key=lambda place: place.score, reverse=True)
+                calls.append(
+                    functools.partial(
+                        services.utils.get_best_route,
+                        candidates,
+                        budget,
+                        lat,
+                        lon,
+                    ),
+                )
+            with mock.patch.object(settings.route, 'deadline_ms', 0):
+                results[f'route/candidates={count}/hours={budget}'] = common.measure(calls)
+    return results
@@ -0,0 +1,78 @@
+"""Vector search of the numpy backend and, optionally, of a running Qdrant."""
+
+import pathlib
+import tempfile
+
+import numpy as np
+
+import db.numpy_repo
+import db.qdrant_repo
+import services.utils
+from benchmarks import common
+from core.config import settings
+
+TOP_KS = (10, 80)
+
+
+def write_seeded_vectors(path: pathlib.Path) -> None:
+    """Random unit vectors for the places of data_cleaned.csv."""
+    rng = np.random.default_rng(common.SEED)
+    places = common.load_places()
+    db.numpy_repo.write_vectors(
+        path,
+        rng.normal(size=(len(places), settings.qdrant.vector_size)),
+        [
+            {
+                'id': place.id,
+                'title': place.title,
+                'desc': place.description,
+                'location': {'lat': place.latitude, 'lon': place.longitude},
+            }
+            for place in places
+        ],
+    )
+
+
+def _queries(iterations: int) -> list[list[float]]:
+    rng = np.random.default_rng(common.SEED)
+    return rng.normal(size=(iterations, settings.qdrant.vector_size)).tolist()
+
+
+def _cases(
+    repository: db.numpy_repo.NumpyRepository | db.qdrant_repo.QdrantRepository,
+    name: str,
+    iterations: int,
+) -> dict[str, common.Result]:
+    rng = np.random.default_rng(common.SEED)
+    places = common.load_places()
+    queries = _queries(iterations)
+    origins = [common.random_origin(rng, places) for _ in range(iterations)]
+    radius = services.utils.get_search_radius(1)
+
+    results: dict[str, common.Result] = {}
+    for top_k in TOP_KS:
+        results[f'search/{name}/top_k={top_k}'] = common.measure(
+            [lambda query=query: repository.search(query, top_k) for query in queries],
+        )
+        results[f'search/{name}/top_k={top_k}/geo'] = common.measure(
+            [
+                lambda query=query, origin=origin: repository.search(
+                    query, top_k, origin, radius,
+                )
+                for query, origin in zip(queries, origins, strict=True)
+            ],
+        )
+    return results
+
+
+def run(iterations: int, qdrant: bool = False) -> dict[str, common.Result]:
+    path = common.BACKEND_ROOT / settings.search.vectors_path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not path.exists():
+            path = pathlib.Path(tmp_dir) / 'vectors.npz'
+            write_seeded_vectors(path)
+        results = _cases(db.numpy_repo.NumpyRepository(path), 'numpy', iterations)
+
+    if qdrant:
+        results.update(_cases(db.qdrant_repo.QdrantRepository(), 'qdrant', iterations))
+    return results
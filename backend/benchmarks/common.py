@@ -0,0 +1,117 @@
+"""Timing, seeded workloads and result comparison shared by the benchmarks."""
+
+import csv
+import dataclasses
+import pathlib
+import time
+import typing
+
+import numpy as np
+
+import models.place_payload
+import services.utils
+
+BACKEND_ROOT = pathlib.Path(__file__).parent.parent
+PLACES_PATH = BACKEND_ROOT / 'data_cleaned.csv'
+SEED = 20251018
+
+
+@dataclasses.dataclass
+class Result:
+    """Latency percentiles in milliseconds and calls per second of one case."""
+
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    throughput_per_s: float
+
+
+def measure(
+    calls: typing.Sequence[typing.Callable[[], object]],
+    warmup: int = 3,
+) -> Result:
+    """Runs every call once after a few warm-up calls and times each of them."""
+    for call in calls[:warmup]:
+        call()
+
+    timings = np.empty(len(calls))
+    started_at = time.perf_counter()
+    for i, call in enumerate(calls):
+        call_started_at = time.perf_counter()
+        call()
+        timings[i] = time.perf_counter() - call_started_at
+    elapsed = time.perf_counter() - started_at
+
+    p50, p95, p99 = np.percentile(timings * 1000, [50, 95, 99])
+    return Result(
+        iterations=len(calls),
+        p50_ms=float(p50),
+        p95_ms=float(p95),
+        p99_ms=float(p99),
+        mean_ms=float(timings.mean() * 1000),
+        throughput_per_s=len(calls) / elapsed,
+    )
+
+
+def load_places() -> list[models.place_payload.PlacePayload]:
+    """Places of data_cleaned.csv known to the current catalog."""
+    catalog = services.utils.catalog_holder.get()
+    with open(PLACES_PATH, encoding='utf-8', newline='') as file:
+        rows = list(csv.DictReader(file, delimiter=';'))
+    return [
+        models.place_payload.PlacePayload(
+            id=int(row['id']),
+            title=row['title'],
+            description=row['description'],
+            score=None,
+            latitude=float(row['latitude']),
+            longitude=float(row['longitude']),
+        )
+        for row in rows
+        if int(row['id']) in catalog
+    ]
+
+
+def random_origin(
+    rng: np.random.Generator,
+    places: list[models.place_payload.PlacePayload],
+) -> tuple[float, float]:
+    """A point a few hundred meters away from a random place."""
+    place = places[rng.integers(len(places))]
+    return (
+        place.latitude + rng.normal(0, 0.003),
+        place.longitude + rng.normal(0, 0.005),
+    )
+
+
+def compare(
+    results: dict[str, Result],
+    baseline: dict[str, dict],
+    tolerance: float,
+    min_delta_ms: float = 0.,
+) -> list[str]:
+    """
+    Compares p95 latencies with a stored baseline.
+
+    A case regresses when its p95 grows by more than tolerance relative to
+    the baseline and by more than min_delta_ms in absolute terms, so timer
+    noise of sub-millisecond cases is not reported.
+
+    Returns:
+        list[str]: descriptions of the cases slower than baseline by more than tolerance
+    """
+    regressions: list[str] = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]['p95_ms']
+        if (
+            result.p95_ms > expected * (1 + tolerance)
+            and result.p95_ms - expected > min_delta_ms
+        ):
+            regressions.append(
+                f'{name}: p95 {result.p95_ms:.2f} ms, baseline {expected:.2f} ms',
+            )
+    return regressions
@@ -0,0 +1,97 @@
+"""
+Runs the benchmarks and compares them with a stored baseline.
+
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+The embedding suite loads the real model and the qdrant search cases need a
+running Qdrant, so both are opt-in. Exits with code 1 when a case is slower
+than the baseline p95 by more than --tolerance.
+"""
+
+import argparse
+import dataclasses
+import datetime
+import json
+import pathlib
+import platform
+import sys
+
+from benchmarks import bench_e2e, bench_embedding, bench_route, bench_search, common
+
+SUITES = ('route', 'search', 'e2e', 'embedding')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--suites',
+        default='route,search,e2e',
+        help=f'comma-separated subset of {", ".join(SUITES)}',
+    )
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--qdrant', action='store_true', help='also benchmark Qdrant search')
+    parser.add_argument(
+        '--output',
+        type=pathlib.Path,
+        default=common.BACKEND_ROOT / 'benchmarks' / 'results.json',
+    )
+    parser.add_argument('--baseline', type=pathlib.Path)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--min-delta-ms', type=float, default=1.)
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='write the results to --baseline instead of comparing',
+    )
+    args = parser.parse_args()
+
+    suites = args.suites.split(',')
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f'Unknown suites: {", ".join(sorted(unknown))}')
+
+    results: dict[str, common.Result] = {}
+    if 'route' in suites:
+        results.update(bench_route.run(args.iterations))
+    if 'search' in suites:
+        results.update(bench_search.run(args.iterations, qdrant=args.qdrant))
+    if 'e2e' in suites:
+        results.update(bench_e2e.run(args.iterations))
+    if 'embedding' in suites:
+        results.update(bench_embedding.run(args.iterations))
+
+    print(f'{"case":<40} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"calls/s":>9}')
+    for name, result in results.items():
+        print(
+            f'{name:<40} {result.p50_ms:>9.2f} {result.p95_ms:>9.2f} '
+            f'{result.p99_ms:>9.2f} {result.throughput_per_s:>9.1f}',
+        )
+
+    report = {
+        'created_at': datetime.datetime.now(datetime.UTC).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'iterations': args.iterations,
+        'results': {name: dataclasses.asdict(result) for name, result in results.items()},
+    }
+    output = args.baseline if args.save_baseline and args.baseline else args.output
+    output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+    print(f'Results written to {output}')
+
+    if args.baseline is None or args.save_baseline:
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))['results']
+    regressions = common.compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Builds place_catalog.bin used by the route solver."""
+
+import argparse
+import csv
+import pathlib
+import pickle
+
+import numpy as np
+
+from application.services.catalog import write_catalog
+
+BACKEND_ROOT = pathlib.Path(__file__).parent
+
+
+def read_places(path: pathlib.Path) -> list[tuple[int, float, float]]:
+    with open(path, encoding='utf-8', newline='') as file:
+        return [
+            (int(row['id']), float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(file, delimiter=';')
+        ]
+
+
+def read_visiting_timings(path: pathlib.Path) -> dict[int, int]:
+    with open(path, encoding='utf-8', newline='') as file:
+        rows = list(csv.reader(file))
+    return {int(row[0]): int(row[-1]) for row in rows[1:] if row}
+
+
+def read_travel_seconds(path: pathlib.Path) -> np.ndarray:
+    if path.suffix == '.npy':
+        return np.load(path)
+    with open(path, 'rb') as file:
+        return np.asarray(pickle.load(file), dtype=np.float64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--places', type=pathlib.Path, default=BACKEND_ROOT / 'data_cleaned.csv')
+    parser.add_argument('--visiting', type=pathlib.Path, default=BACKEND_ROOT / 'visiting_time.csv')
+    parser.add_argument('--matrix', type=pathlib.Path, default=BACKEND_ROOT / 'open_street_map.pkl')
+    parser.add_argument('--output', type=pathlib.Path, default=BACKEND_ROOT / 'place_catalog.bin')
+    args = parser.parse_args()
+
+    places = read_places(args.places)
+    visiting = read_visiting_timings(args.visiting)
+    travel_seconds = read_travel_seconds(args.matrix)
+
+    if len(places) > len(travel_seconds):
+        skipped = [place_id for place_id, _, _ in places[len(travel_seconds):]]
+        print(f'Travel matrix has no rows for places {skipped}, they are not routable')
+        places = places[:len(travel_seconds)]
+
+    missing = [place_id for place_id, _, _ in places if place_id not in visiting]
+    if missing:
+        raise ValueError(f'No visiting time for places {missing}')
+
+    version = write_catalog(
+        args.output,
+        ids=[place_id for place_id, _, _ in places],
+        coordinates=[(lat, lon) for _, lat, lon in places],
+        visit_minutes=[visiting[place_id] for place_id, _, _ in places],
+        travel_seconds=travel_seconds[:len(places), :len(places)],
+    )
+    print(f'Catalog with {len(places)} places written to {args.output} (version {version:016x})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""
+Builds the walking time matrix between places from a local OpenStreetMap extract.
+
+Places are snapped to the nearest node of the pedestrian graph and a
+single-source Dijkstra is run from every place in a process pool. The result
+is a .npy matrix of seconds in the row order of the places file, ready for
+build_catalog.py --matrix.
+
+Next to the matrix a small state file keeps the ids and coordinates of the
+places it was built for. On the next run only the rows and columns of new
+or moved places are recomputed, unless the extract or the walking speed
+has changed.
+"""
+
+import argparse
+import array
+import concurrent.futures
+import csv
+import math
+import os
+import pathlib
+import typing
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.spatial
+
+if typing.TYPE_CHECKING:
+    import osmium
+
+BACKEND_ROOT = pathlib.Path(__file__).parent
+EARTH_RADIUS_METERS = 6_371_000
+MOVED_DEGREES = 1e-6
+FAR_SNAP_METERS = 300
+
+WALKABLE_HIGHWAYS = frozenset(
+    {
+        'footway', 'pedestrian', 'path', 'steps', 'living_street', 'residential',
+        'service', 'unclassified', 'tertiary', 'tertiary_link', 'secondary',
+        'secondary_link', 'primary', 'primary_link', 'track', 'corridor', 'bridleway',
+        'cycleway', 'road',
+    },
+)
+FORBIDDEN_ACCESS = frozenset({'no', 'private'})
+
+
+class _WalkGraphHandler:
+    """Collects the segments of ways a pedestrian may use."""
+
+    def __init__(self) -> None:
+        self.sources = array.array('q')
+        self.targets = array.array('q')
+        self.lengths = array.array('d')
+        self.locations: dict[int, tuple[float, float]] = {}
+
+    def way(self, way: 'osmium.osm.Way') -> None:
+        tags = way.tags
+        foot = tags.get('foot')
+        if foot in FORBIDDEN_ACCESS or (
+            tags.get('access') in FORBIDDEN_ACCESS and foot not in ('yes', 'designated')
+        ):
+            return
+        if tags.get('highway') not in WALKABLE_HIGHWAYS and foot not in ('yes', 'designated'):
+            return
+
+        previous: tuple[int, float, float] | None = None
+        for node in way.nodes:
+            if not node.location.valid():
+                previous = None
+                continue
+            current = (node.ref, node.location.lat, node.location.lon)
+            self.locations[node.ref] = current[1:]
+            if previous is not None:
+                self.sources.append(previous[0])
+                self.targets.append(current[0])
+                self.lengths.append(
+                    _haversine_meters(previous[1], previous[2], current[1], current[2]),
+                )
+            previous = current
+
+
+def _haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.)))
+
+
+def _shortest_edges(
+    sources: np.ndarray,
+    targets: np.ndarray,
+    seconds: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Keeps the shortest of the segments between every pair of nodes.
+
+    Ways often share a pair of nodes, e.g. a street and its sidewalk, and
+    the sparse matrix would add the weights of such duplicates up. Segments
+    are undirected, so a pair is keyed by its lower node first; segments
+    from a node to itself are dropped.
+    """
+    low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+    order = np.lexsort((seconds, high, low))
+    low, high, seconds = low[order], high[order], seconds[order]
+    first = np.ones(len(low), dtype=bool)
+    first[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    keep = first & (low != high)
+    return low[keep], high[keep], seconds[keep]
+
+
+def build_walk_graph(
+    osm_path: pathlib.Path,
+    speed: float,
+) -> tuple[scipy.sparse.csr_matrix, np.ndarray]:
+    """
+    Reads the pedestrian graph of the extract.
+
+    Only the largest connected component is kept, so every place snaps to a
+    node it can actually walk from.
+
+    Args:
+        osm_path (pathlib.Path): .osm.pbf (or .osm) extract
+        speed (float): walking speed in meters per second
+
+    Returns:
+        tuple[scipy.sparse.csr_matrix, np.ndarray]: undirected graph with edge
+        weights in seconds and [lat, lon] of its nodes
+    """
+    import osmium  # only needed to read the extract
+
+    handler = _WalkGraphHandler()
+    ways = osmium.FileProcessor(str(osm_path), osmium.osm.NODE | osmium.osm.WAY)
+    for way in ways.with_locations().with_filter(osmium.filter.EntityFilter(osmium.osm.WAY)):
+        handler.way(way)
+    if not handler.lengths:
+        raise ValueError(f'No walkable ways found in {osm_path}')
+
+    endpoints = np.concatenate(
+        [
+            np.frombuffer(handler.sources, dtype=np.int64),
+            np.frombuffer(handler.targets, dtype=np.int64),
+        ],
+    )
+    osm_ids, edges = np.unique(endpoints, return_inverse=True)
+    sources, targets, seconds = _shortest_edges(
+        *np.split(edges, 2),
+        np.frombuffer(handler.lengths, dtype=np.float64) / speed,
+    )
+    graph = scipy.sparse.coo_matrix(
+        (seconds, (sources, targets)),
+        shape=(len(osm_ids), len(osm_ids)),
+    ).tocsr()
+
+    _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    keep = np.flatnonzero(labels == np.bincount(labels).argmax())
+    graph = graph[keep][:, keep]
+    coordinates = np.array([handler.locations[osm_id] for osm_id in osm_ids[keep]])
+    print(f'Pedestrian graph: {len(keep)} nodes, {graph.nnz} edges')
+    return graph, coordinates
+
+
+def _project(coordinates: np.ndarray, origin_lat: float) -> np.ndarray:
+    scale = math.radians(1) * EARTH_RADIUS_METERS
+    return np.column_stack(
+        [
+            coordinates[:, 0] * scale,
+            coordinates[:, 1] * scale * math.cos(math.radians(origin_lat)),
+        ],
+    )
+
+
+def snap_places(
+    place_coordinates: np.ndarray,
+    node_coordinates: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Nearest graph node of every place and the distance to it in meters."""
+    origin_lat = float(np.mean(node_coordinates[:, 0]))
+    tree = scipy.spatial.cKDTree(_project(node_coordinates, origin_lat))
+    distances, nodes = tree.query(_project(place_coordinates, origin_lat))
+    return nodes, distances
+
+
+_graph: scipy.sparse.csr_matrix | None = None
+_targets: np.ndarray | None = None
+
+
+def _init_worker(graph: scipy.sparse.csr_matrix, targets: np.ndarray) -> None:
+    global _graph, _targets
+    _graph, _targets = graph, targets
+
+
+def _shortest_seconds(sources: np.ndarray) -> np.ndarray:
+    distances = scipy.sparse.csgraph.dijkstra(_graph, directed=False, indices=sources)
+    return distances[:, _targets]
+
+
+def compute_rows(
+    graph: scipy.sparse.csr_matrix,
+    place_nodes: np.ndarray,
+    rows: np.ndarray,
+    workers: int,
+) -> np.ndarray:
+    """
+    Walking seconds between graph nodes of the given places and of all places.
+
+    Args:
+        graph (scipy.sparse.csr_matrix): pedestrian graph from build_walk_graph
+        place_nodes (np.ndarray): snapped node of every place
+        rows (np.ndarray): places to run Dijkstra from
+        workers (int): size of the process pool
+
+    Returns:
+        np.ndarray: matrix of shape (len(rows), len(place_nodes))
+    """
+    if len(rows) == 0:
+        return np.empty((0, len(place_nodes)))
+
+    chunks = np.array_split(place_nodes[rows], min(len(rows), workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(graph, place_nodes),
+    ) as executor:
+        return np.vstack(list(executor.map(_shortest_seconds, chunks)))
+
+
+def read_places(path: pathlib.Path) -> tuple[np.ndarray, np.ndarray]:
+    with open(path, encoding='utf-8', newline='') as file:
+        rows = list(csv.DictReader(file, delimiter=';'))
+    ids = np.array([int(row['id']) for row in rows], dtype=np.int64)
+    coordinates = np.array(
+        [(float(row['latitude']), float(row['longitude'])) for row in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), 2)
+    return ids, coordinates
+
+
+def _extract_signature(osm_path: pathlib.Path) -> np.ndarray:
+    stat = osm_path.stat()
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def _state_path(output: pathlib.Path) -> pathlib.Path:
+    return output.with_suffix('.state.npz')
+
+
+def load_previous(
+    output: pathlib.Path,
+    signature: np.ndarray,
+    speed: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    """Ids, coordinates and matrix of the previous build if it can be reused."""
+    state_path = _state_path(output)
+    if not (output.exists() and state_path.exists()):
+        return None
+
+    with np.load(state_path) as state:
+        if not np.array_equal(state['extract'], signature):
+            print('OSM extract has changed, rebuilding the whole matrix')
+            return None
+        # Every cell is in seconds, so a new speed changes all of them.
+        if 'speed' not in state or float(state['speed']) != speed:
+            print('Walking speed has changed, rebuilding the whole matrix')
+            return None
+        return state['ids'], state['coordinates'], np.load(output)
+
+
+def save_matrix(
+    output: pathlib.Path,
+    matrix: np.ndarray,
+    ids: np.ndarray,
+    coordinates: np.ndarray,
+    signature: np.ndarray,
+    speed: float,
+) -> None:
+    """Saves the matrix and the state load_previous needs on the next run."""
+    np.save(output, matrix)
+    np.savez(
+        _state_path(output),
+        ids=ids,
+        coordinates=coordinates,
+        extract=signature,
+        speed=speed,
+    )
+
+
+def reuse_previous(
+    ids: np.ndarray,
+    coordinates: np.ndarray,
+    previous: tuple[np.ndarray, np.ndarray, np.ndarray] | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Copies the cells between places that are unchanged since the previous build.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: matrix with the reused cells filled and
+        the rest set to inf, and the mask of places whose rows must be computed
+    """
+    matrix = np.full((len(ids), len(ids)), np.inf)
+    if previous is None:
+        return matrix, np.ones(len(ids), dtype=bool)
+
+    previous_ids, previous_coordinates, previous_matrix = previous
+    previous_rows = {int(place_id): row for row, place_id in enumerate(previous_ids)}
+    rows = np.array([previous_rows.get(int(place_id), -1) for place_id in ids], dtype=np.int64)
+    known = rows >= 0
+    known[known] = np.all(
+        np.abs(previous_coordinates[rows[known]] - coordinates[known]) <= MOVED_DEGREES,
+        axis=1,
+    )
+    matrix[np.ix_(known, known)] = previous_matrix[np.ix_(rows[known], rows[known])]
+    return matrix, ~known
+
+
+def fill_stale_rows(
+    matrix: np.ndarray,
+    stale: np.ndarray,
+    graph: scipy.sparse.csr_matrix,
+    place_nodes: np.ndarray,
+    snap_seconds: np.ndarray,
+    workers: int,
+) -> None:
+    """Computes the rows and columns of the stale places in place."""
+    stale_rows = np.flatnonzero(stale)
+    print(f'Computing {len(stale_rows)} of {len(matrix)} rows')
+    seconds = (
+        compute_rows(graph, place_nodes, stale_rows, workers)
+        + snap_seconds[stale_rows, None]
+        + snap_seconds[None, :]
+    )
+    # The graph is undirected, so a row also gives the column.
+    matrix[stale_rows] = seconds
+    matrix[:, stale_rows] = seconds.T
+    np.fill_diagonal(matrix, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--osm', type=pathlib.Path, required=True, help='.osm.pbf extract')
+    parser.add_argument('--places', type=pathlib.Path, default=BACKEND_ROOT / 'data_cleaned.csv')
+    parser.add_argument('--output', type=pathlib.Path, default=BACKEND_ROOT / 'walking_matrix.npy')
+    parser.add_argument('--speed', type=float, default=5., help='walking speed, km/h')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--full', action='store_true', help='ignore the previous matrix')
+    args = parser.parse_args()
+
+    ids, coordinates = read_places(args.places)
+    speed = args.speed * 1000 / 3600
+    signature = _extract_signature(args.osm)
+    previous = None if args.full else load_previous(args.output, signature, speed)
+
+    graph, node_coordinates = build_walk_graph(args.osm, speed)
+    place_nodes, snap_meters = snap_places(coordinates, node_coordinates)
+    for place_id, meters in zip(ids, snap_meters, strict=True):
+        if meters > FAR_SNAP_METERS:
+            print(f'Place {place_id} is {meters:.0f} m away from the nearest walkable way')
+
+    matrix, stale = reuse_previous(ids, coordinates, previous)
+    fill_stale_rows(matrix, stale, graph, place_nodes, snap_meters / speed, args.workers)
+
+    save_matrix(args.output, matrix, ids, coordinates, signature, speed)
+    unreachable = int(np.isinf(matrix).sum())
+    print(f'Matrix {matrix.shape} written to {args.output}, {unreachable} unreachable pairs')
+
+
+if __name__ == '__main__':
+    main()
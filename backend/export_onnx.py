@@ -0,0 +1,104 @@
+"""
+Exports FRIDA to ONNX with int8 weights and checks it against the PyTorch model.
+
+The export is written to a staging directory next to --output-dir, and its
+files are moved into place only after the parity check passes, so a model
+that failed the check never appears at the serving path.
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.append(str(pathlib.Path(__file__).parent / 'application'))
+
+from application.services.ml import _EmbeddingModel
+from application.services.onnx_embedding import (
+    OnnxEmbeddingModel,
+    check_parity,
+    export_onnx,
+)
+
+BACKEND_ROOT = pathlib.Path(__file__).parent
+PARITY_QUERIES = [
+    'музей',
+    'Хочу прогуляться рядом с военной техникой',
+    'Где выпить кофе с видом на Волгу?',
+    'Красивые старинные здания и храмы',
+]
+
+
+class ParityError(ValueError):
+    pass
+
+
+def export_checked(
+    output_dir: pathlib.Path,
+    texts: list[str],
+    quantize: bool = True,
+    min_cosine: float = 0.99,
+) -> tuple[pathlib.Path, float]:
+    """
+    Exports the model and publishes it to output_dir if it matches the PyTorch model.
+
+    Args:
+        output_dir (pathlib.Path): directory for the model and tokenizer files
+        texts (list[str]): texts to compare the embeddings on
+        quantize (bool): serve a copy with dynamic int8 weights
+        min_cosine (float): minimal allowed cosine similarity
+
+    Returns:
+        tuple[pathlib.Path, float]: path of the model to serve and the minimal similarity
+
+    Raises:
+        ParityError: the exported model is too far from the PyTorch one
+    """
+    output_dir.parent.mkdir(parents=True, exist_ok=True)
+    # The staging directory is on the same file system, so os.replace is atomic.
+    with tempfile.TemporaryDirectory(dir=output_dir.parent, prefix=f'.{output_dir.name}-') as tmp:
+        staged_path = export_onnx(pathlib.Path(tmp), quantize=quantize)
+        similarity = check_parity(_EmbeddingModel(), OnnxEmbeddingModel(staged_path), texts)
+        if similarity < min_cosine:
+            raise ParityError(
+                f'Parity check failed: {similarity:.5f} < {min_cosine}, try --no-quantize',
+            )
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        # The served model goes last, after the tokenizer it is loaded with.
+        for path in sorted(pathlib.Path(tmp).iterdir(), key=lambda path: path == staged_path):
+            os.replace(path, output_dir / path.name)
+    return output_dir / staged_path.name, similarity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output-dir', type=pathlib.Path, default=BACKEND_ROOT / 'frida_onnx')
+    parser.add_argument('--no-quantize', action='store_true')
+    parser.add_argument('--min-cosine', type=float, default=0.99)
+    parser.add_argument('--parity-samples', type=int, default=64)
+    args = parser.parse_args()
+
+    df = pd.read_csv(BACKEND_ROOT / 'data_cleaned.csv', sep=';')
+    texts = PARITY_QUERIES + [
+        f'{row["title"]} {row["description"]}'
+        for _, row in df.head(args.parity_samples).iterrows()
+    ]
+    try:
+        model_path, similarity = export_checked(
+            args.output_dir,
+            texts,
+            quantize=not args.no_quantize,
+            min_cosine=args.min_cosine,
+        )
+    except ParityError as e:
+        sys.exit(str(e))
+    print(f'Minimal cosine similarity with the PyTorch model: {similarity:.5f}')
+    print(f'Model exported to {model_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Exports the Qdrant collection into place_vectors.npz for the numpy search backend."""
+
+import pathlib
+import sys
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).parent / 'application'))
+
+from application.core.config import settings
+from application.db.numpy_repo import write_vectors
+from application.db.qdrant_repo import QdrantRepository
+
+BACKEND_ROOT = pathlib.Path(__file__).parent
+
+
+def export_vectors(repo: QdrantRepository, path: str | pathlib.Path) -> int:
+    """Writes every point of the collection to path and returns their number."""
+    payloads: list[dict] = []
+    vectors: list[list[float]] = []
+
+    offset = None
+    while True:
+        points, offset = repo.client.scroll(
+            collection_name=repo.collection_name,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            payloads.append(point.payload)
+            vectors.append(point.vector)
+        if offset is None:
+            break
+
+    write_vectors(path, np.array(vectors), payloads)
+    return len(payloads)
+
+
+def main() -> None:
+    path = BACKEND_ROOT / settings.search.vectors_path
+    count = export_vectors(QdrantRepository(), path)
+    print(f'Exported {count} places to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,36 @@
+"""
+Loads places from data_cleaned.csv into the Qdrant collection.
+
+The CSV is read in chunks. Every point keeps a hash of its content in the
+payload, so rows that have not changed since the previous run are neither
+embedded nor uploaded again. A failed run can simply be restarted.
+Embeddings of the next chunk are computed while the previous chunk is
+upserted in parallel batches with retries.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import pathlib
 import re
+import sys
+import time
+import typing
 
+import numpy as np
 import pandas as pd
-from qdrant_client import models
+from qdrant_client import QdrantClient, models
+
+sys.path.append(str(pathlib.Path(__file__).parent / 'application'))
 
+from application.core.config import settings
 from application.db.qdrant_repo import QdrantRepository
-from application.services.ml import embedding_model
+from application.services import ml
+from export_vectors import export_vectors
 
-df = pd.read_csv('data_cleaned.csv', sep=';')
+BACKEND_ROOT = pathlib.Path(__file__).parent
+HASH_FIELD = 'content_hash'
 
 
 # "POINT (44.003277 56.331576)"
@@ -19,38 +43,199 @@ def parse_coordinates(coord_str: str) -> dict:
     return {'lat': None, 'lon': None}
 
 
-coords = df['coordinate'].apply(parse_coordinates)
-df['latitude'] = [c['lat'] for c in coords]
-df['longitude'] = [c['lon'] for c in coords]
+def content_hash(payload: dict) -> str:
+    """Hash of everything the stored point depends on, including the embedding model."""
+    content = json.dumps(
+        [ml._EmbeddingModel.name_model, payload['title'], payload['desc'], payload['location']],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def read_payloads(path: pathlib.Path, chunk_size: int) -> typing.Iterator[list[dict]]:
+    """Yields payloads of the CSV rows chunk by chunk."""
+    chunks = pd.read_csv(
+        path,
+        sep=';',
+        usecols=['id', 'title', 'description', 'coordinate'],
+        chunksize=chunk_size,
+    )
+    for chunk in chunks:
+        payloads: list[dict] = []
+        for row in chunk.to_dict('records'):
+            location = parse_coordinates(str(row['coordinate']))
+            if location['lat'] is None:
+                print(f'Place {row["id"]} has no valid coordinates, skipped')
+                continue
+
+            payload = {
+                'id': int(row['id']),
+                'title': str(row['title']),
+                'desc': str(row['description']),
+                'location': location,
+            }
+            payload[HASH_FIELD] = content_hash(payload)
+            payloads.append(payload)
+        yield payloads
+
+
+def changed_payloads(
+    client: QdrantClient,
+    collection_name: str,
+    payloads: list[dict],
+) -> list[dict]:
+    """Payloads whose point is missing or was stored with a different content hash."""
+    stored = client.retrieve(
+        collection_name=collection_name,
+        ids=[payload['id'] for payload in payloads],
+        with_payload=[HASH_FIELD],
+    )
+    hashes = {record.id: (record.payload or {}).get(HASH_FIELD) for record in stored}
+    return [payload for payload in payloads if hashes.get(payload['id']) != payload[HASH_FIELD]]
+
+
+def upsert_with_retries(
+    client: QdrantClient,
+    collection_name: str,
+    points: list[models.PointStruct],
+    retries: int,
+) -> None:
+    for attempt in range(retries + 1):
+        try:
+            client.upsert(collection_name=collection_name, points=points, wait=True)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = 0.5 * 2 ** attempt
+            print(f'Upsert of {len(points)} points failed ({e}), retrying in {delay:.1f}s')
+            time.sleep(delay)
+
+
+def ingest(
+    client: QdrantClient,
+    collection_name: str,
+    chunks: typing.Iterable[list[dict]],
+    embed: typing.Callable[[list[str]], np.ndarray],
+    upsert_batch_size: int = 64,
+    workers: int = 4,
+    retries: int = 5,
+) -> tuple[set[int], int]:
+    """
+    Embeds and upserts changed places.
+
+    Args:
+        client (QdrantClient): Qdrant client
+        collection_name (str): existing collection
+        chunks (Iterable[list[dict]]): payloads from read_payloads
+        embed (Callable[[list[str]], np.ndarray]): batch embedding function
+        upsert_batch_size (int): points per upsert request
+        workers (int): parallel upsert requests
+        retries (int): retries of a failed upsert request
+
+    Returns:
+        tuple[set[int], int]: ids of all places seen and the number of upserted points
+    """
+    seen: set[int] = set()
+    upserted = 0
+    pending: list[concurrent.futures.Future] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for payloads in chunks:
+            seen.update(payload['id'] for payload in payloads)
+            changed = changed_payloads(client, collection_name, payloads) if payloads else []
+            vectors = (
+                embed([f'{payload["title"]} {payload["desc"]}' for payload in changed])
+                if changed else []
+            )
+            points = [
+                models.PointStruct(id=payload['id'], payload=payload, vector=vector.tolist())
+                for payload, vector in zip(changed, vectors, strict=True)
+            ]
+
+            # Upserts of the previous chunk ran while this one was embedded.
+            for future in pending:
+                future.result()
+            pending = [
+                executor.submit(
+                    upsert_with_retries,
+                    client,
+                    collection_name,
+                    points[start:start + upsert_batch_size],
+                    retries,
+                )
+                for start in range(0, len(points), upsert_batch_size)
+            ]
+            upserted += len(points)
+            print(f'{len(seen)} places read, {upserted} upserted')
 
-texts_for_embedding = []
-payloads = []
+        for future in pending:
+            future.result()
+    return seen, upserted
 
-for _, row in df.iterrows():
-    payload = {
-        'id': row['id'],
-        'title': row['title'],
-        'desc': row['description'],
-        'location': {'lat': row['latitude'], 'lon': row['longitude']},
-    }
-    payloads.append(payload)
-    texts_for_embedding.append(f'{payload["title"]} {payload["desc"]}')
 
-repo = QdrantRepository()
+def prune(client: QdrantClient, collection_name: str, keep: set[int]) -> int:
+    """Deletes points of places that are no longer in the CSV."""
+    stale: list[int] = []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+        )
+        stale.extend(record.id for record in records if record.id not in keep)
+        if offset is None:
+            break
 
-repo.create_collection()
+    if stale:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=stale),
+            wait=True,
+        )
+    return len(stale)
 
-print('start embedding')
-vectors = embedding_model.multi_call(texts_for_embedding)
-print('end_embeding')
 
-points_to_upsert = []
-for i, (payload, vector) in enumerate(zip(payloads, vectors)):
-    point = models.PointStruct(
-        id=payload['id'],
-        payload=payload,
-        vector=vector,
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
     )
-    points_to_upsert.append(point)
+    parser.add_argument('--places', type=pathlib.Path, default=BACKEND_ROOT / 'data_cleaned.csv')
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--upsert-batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--prune', action='store_true', help='delete places missing from the CSV')
+    parser.add_argument(
+        '--vectors',
+        type=pathlib.Path,
+        default=BACKEND_ROOT / settings.search.vectors_path,
+    )
+    parser.add_argument('--no-export', action='store_true', help='do not write --vectors')
+    args = parser.parse_args()
+
+    repo = QdrantRepository()
+    repo.create_collection()
+
+    seen, upserted = ingest(
+        repo.client,
+        repo.collection_name,
+        read_payloads(args.places, args.chunk_size),
+        lambda texts: ml.get_embedding_model().encode(texts),
+        upsert_batch_size=args.upsert_batch_size,
+        workers=args.workers,
+        retries=args.retries,
+    )
+    print(f'{upserted} of {len(seen)} places were new or changed')
+
+    if args.prune:
+        print(f'{prune(repo.client, repo.collection_name, seen)} stale places deleted')
+    if not args.no_export:
+        count = export_vectors(repo, args.vectors)
+        print(f'Exported {count} places to {args.vectors}')
+
 
-repo.client.upsert(collection_name=repo.collection_name, points=points_to_upsert)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Pre-generates explanations of every place for the intents of services.explanation_store."""
+
+import argparse
+import csv
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(pathlib.Path(__file__).parent / 'application'))
+
+from application.core.config import settings
+from application.models.place_payload import PlacePayload
+from application.services.catalog import load_catalog
+from application.services.explanation_store import (
+    INTENTS,
+    get_fragment_prompt,
+    write_store,
+)
+from application.services.ml import get_embedding_model, get_text_generation_model
+
+BACKEND_ROOT = pathlib.Path(__file__).parent
+NO_INTENT = '-'
+
+
+def check_queries(path: pathlib.Path, intent_embeddings: dict[str, list[float]]) -> None:
+    """
+    Prints how the similarity threshold would route the labelled queries.
+
+    Every line of the file is an intent name and a query separated by a tab,
+    the intent is '-' for queries that none of the intents answers. For every
+    threshold the share of queries served from the store and the share served
+    with a wrong intent are printed, the threshold should be the lowest one
+    without wrong intents.
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        rows = [row for row in csv.reader(file, delimiter='\t') if row]
+    labels = [label for label, _ in rows]
+    unknown = set(labels) - set(INTENTS) - {NO_INTENT}
+    if unknown:
+        raise ValueError(f'Unknown intents in {path}: {", ".join(sorted(unknown))}')
+
+    names = list(intent_embeddings)
+    intents = np.array([intent_embeddings[name] for name in names], dtype=np.float32)
+    intents /= np.linalg.norm(intents, axis=1, keepdims=True)
+    queries = get_embedding_model().encode([query for _, query in rows])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    similarities = queries @ intents.T
+    best = similarities.argmax(axis=1)
+    best_similarity = similarities.max(axis=1)
+
+    for (label, query), index, similarity in zip(rows, best, best_similarity, strict=True):
+        print(f'{similarity:.3f} {names[index]:<12} {label:<12} {query}')
+    print('threshold served wrong')
+    for threshold in np.arange(0.5, 1., 0.025):
+        served = best_similarity >= threshold
+        wrong = served & (np.array([names[i] for i in best]) != np.array(labels))
+        print(f'{threshold:9.3f} {served.mean():6.0%} {wrong.mean():5.0%}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--places', type=pathlib.Path, default=BACKEND_ROOT / 'data_cleaned.csv')
+    parser.add_argument(
+        '--catalog',
+        type=pathlib.Path,
+        default=BACKEND_ROOT / settings.catalog.path,
+        help='catalog built from the same places, the store is only served with it',
+    )
+    parser.add_argument('--output', type=pathlib.Path, default=BACKEND_ROOT / 'explanations.json')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument(
+        '--check-queries',
+        type=pathlib.Path,
+        help=(
+            'only print how the similarity threshold routes the labelled queries of the file, '
+            'see explanation_queries.tsv'
+        ),
+    )
+    args = parser.parse_args()
+
+    intent_embeddings = dict(
+        zip(INTENTS, get_embedding_model().encode(list(INTENTS.values())).tolist(), strict=True),
+    )
+    if args.check_queries is not None:
+        print(f'Current threshold: {settings.explanation_store.similarity_threshold}')
+        check_queries(args.check_queries, intent_embeddings)
+        return
+
+    catalog_version = load_catalog(args.catalog).version
+    df = pd.read_csv(args.places, sep=';')
+    places = [
+        PlacePayload(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            score=None,
+            latitude=row['latitude'],
+            longitude=row['longitude'],
+        )
+        for _, row in df.iterrows()
+    ]
+
+    fragments: dict[str, dict[int, str]] = {}
+    for intent in INTENTS:
+        print(f'Generating explanations for intent {intent}')
+        fragments[intent] = {}
+        for start in range(0, len(places), args.batch_size):
+            batch = places[start:start + args.batch_size]
+            texts = get_text_generation_model().generate_batch(
+                [get_fragment_prompt(intent, place) for place in batch],
+            )
+            for place, text in zip(batch, texts, strict=True):
+                fragments[intent][place.id] = text
+            print(f'\r{start + len(batch)}/{len(places)}', end='', flush=True)
+        print()
+
+    write_store(args.output, intent_embeddings, fragments, catalog_version)
+    print(f'Explanations for catalog {catalog_version:016x} saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,90 +1,230 @@
+"""
+Restores the Qdrant collection from a snapshot archive.
+
+The archive is downloaded next to this script and an interrupted download
+is resumed with an HTTP Range request on the next run. The .snapshot member
+is streamed straight out of the tar.gz into the upload request, so the
+archive is never extracted to disk.
+
+The archive is checked against its sha256 before the upload: the pinned
+SNAPSHOT_SHA256 for the default URL or --sha256 for another source. A
+source without a known checksum is refused unless --no-verify is given.
+"""
+
+import argparse
+import hashlib
 import os
+import pathlib
+import sys
 import tarfile
-import tempfile
-from pathlib import Path
+import typing
+import urllib.parse
+import uuid
 
 import requests
 
+sys.path.append(str(pathlib.Path(__file__).parent / 'application'))
+
 from application.core.config import settings
 
+BACKEND_ROOT = pathlib.Path(__file__).parent
+SNAPSHOT_URL = 'https://github.com/user-attachments/files/23277068/qdrant_snapshot.tar.gz'
+# sha256 of the archive at SNAPSHOT_URL; update it together with the URL.
+# Until it is recorded, the default source needs --sha256 or --no-verify.
+SNAPSHOT_SHA256: str | None = None
+CHUNK_SIZE = 1024 * 1024
+MIN_SNAPSHOT_SIZE = 1024
 
-def download_snapshot(url: str, output_path: Path) -> None:
-    print(f'Скачивание snapshot из {url}...')
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
 
-    total_size = int(response.headers.get('content-length', 0))
-    downloaded = 0
+class ChecksumError(ValueError):
+    """Raised when the downloaded archive does not match the expected sha256."""
+
+
+def _is_url(source: str) -> bool:
+    return urllib.parse.urlparse(source).scheme in ('http', 'https')
+
+
+def _local_path(source: str) -> pathlib.Path:
+    parsed = urllib.parse.urlparse(source)
+    if parsed.scheme == 'file':
+        return pathlib.Path(urllib.parse.unquote(parsed.path))
+    return pathlib.Path(source)
+
 
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+def download_snapshot(url: str, output_path: pathlib.Path) -> pathlib.Path:
+    """
+    Downloads the archive, resuming a previous partial download.
+
+    Bytes are written to output_path with a .part suffix, which is renamed
+    only after the whole file has been received.
+
+    Returns:
+        pathlib.Path: output_path
+    """
+    if output_path.exists():
+        print(f'Snapshot уже скачан: {output_path}')
+        return output_path
+
+    part_path = output_path.with_name(f'{output_path.name}.part')
+    downloaded = part_path.stat().st_size if part_path.exists() else 0
+    headers = {'Range': f'bytes={downloaded}-'} if downloaded else {}
+
+    print(f'Скачивание snapshot из {url}...')
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416:
+            part_path.replace(output_path)
+            return output_path
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            print(f'Продолжение скачивания с {downloaded / (1024 * 1024):.2f} MB')
+            mode = 'ab'
+        else:
+            downloaded = 0
+            mode = 'wb'
+        total_size = downloaded + int(response.headers.get('content-length', 0))
+
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                file.write(chunk)
                 downloaded += len(chunk)
                 if total_size > 0:
                     progress = (downloaded / total_size) * 100
                     print(f'\rПрогресс: {progress:.1f}%', end='', flush=True)
 
+    if total_size > 0 and downloaded != total_size:
+        raise requests.exceptions.ConnectionError(
+            f'Скачано {downloaded} из {total_size} байт, запустите восстановление ещё раз',
+        )
+    part_path.replace(output_path)
     print(f'\nSnapshot успешно скачан в {output_path}')
     print(f'Размер файла: {output_path.stat().st_size / (1024 * 1024):.2f} MB')
-
-
-def extract_snapshot(tar_path: Path, extract_to: Path) -> Path:
-    print(f'\nРаспаковка архива {tar_path.name}...')
-    with tarfile.open(tar_path, 'r:gz') as tar:
-        tar.extractall(extract_to, filter='data')
-
-    snapshot_files = [
-        f for f in extract_to.rglob('*.snapshot')
-        if f.is_file() and not f.name.startswith('._')
-    ]
-
-    if not snapshot_files:
-        all_files = [
-            f for f in extract_to.rglob('*')
-            if f.is_file() and not f.name.startswith('._')
-        ]
-        if not all_files:
-            raise FileNotFoundError(
-                f'Не удалось найти snapshot файл в архиве {tar_path}',
-            )
-        snapshot_file = max(all_files, key=lambda f: f.stat().st_size)
-        print(f'Найден файл: {snapshot_file.name}')
-    else:
-        snapshot_file = max(snapshot_files, key=lambda f: f.stat().st_size)
-        print(f'Найден snapshot файл: {snapshot_file.name}')
-
-    file_size_mb = snapshot_file.stat().st_size / (1024 * 1024)
-    print(f'Размер snapshot: {file_size_mb:.2f} MB')
-
-    if snapshot_file.stat().st_size < 1024:
-        raise ValueError(
-            f'Найденный файл слишком мал ({file_size_mb:.2f} MB), '
-            'возможно это файл метаданных, а не snapshot',
-        )
-
-    return snapshot_file
+    return output_path
+
+
+def sha256_file(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_checksum(
+    path: pathlib.Path,
+    expected: str | None,
+    remove_on_mismatch: bool = False,
+) -> str:
+    """Checks the sha256 of the archive, a corrupted download may be removed."""
+    actual = sha256_file(path)
+    if expected is None:
+        print(f'sha256: {actual}')
+    elif actual != expected.lower():
+        if remove_on_mismatch:
+            path.unlink()
+        raise ChecksumError(f'sha256 архива {actual}, ожидался {expected}')
+    return actual
+
+
+def _is_snapshot_member(member: tarfile.TarInfo) -> bool:
+    name = pathlib.PurePosixPath(member.name).name
+    return (
+        member.isfile()
+        and name.endswith('.snapshot')
+        and not name.startswith('._')
+        and member.size >= MIN_SNAPSHOT_SIZE
+    )
+
+
+class _MultipartStream:
+    """
+    File-like multipart/form-data body with a single file field.
+
+    It has a known length, so requests sends a Content-Length header and
+    reads the body with read() in blocks instead of loading it into memory.
+    """
+
+    def __init__(
+        self: typing.Self,
+        field: str,
+        filename: str,
+        file: typing.BinaryIO,
+        size: int,
+    ) -> None:
+        self.boundary = uuid.uuid4().hex
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._file = file
+        self._size = size
+        self._chunks = self._iter_chunks()
+        self._buffer = memoryview(b'')
+
+    @property
+    def content_type(self: typing.Self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self: typing.Self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def read(self: typing.Self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            output = self._buffer.tobytes() + b''.join(self._chunks)
+            self._buffer = memoryview(b'')
+            return output
+
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b''
+            self._buffer = memoryview(chunk)
+        output = self._buffer[:size].tobytes()
+        self._buffer = self._buffer[size:]
+        return output
+
+    def _iter_chunks(self: typing.Self) -> typing.Iterator[bytes]:
+        yield self._head
+        sent = 0
+        while chunk := self._file.read(CHUNK_SIZE):
+            sent += len(chunk)
+            yield chunk
+        if sent != self._size:
+            raise OSError(f'Snapshot is truncated at {sent} of {self._size} bytes')
+        yield self._tail
 
 
 def upload_snapshot_to_qdrant(
-    snapshot_path: Path,
+    archive_path: pathlib.Path,
     collection_name: str,
     qdrant_url: str,
     api_key: str | None = None,
 ) -> None:
+    """Streams the .snapshot member of the archive to the Qdrant upload endpoint."""
     print('\nЗагрузка snapshot в Qdrant...')
     print(f'URL: {qdrant_url}')
     print(f'Коллекция: {collection_name}')
 
     upload_url = f'{qdrant_url}/collections/{collection_name}/snapshots/upload?priority=snapshot'
 
-    headers = {}
-    if api_key:
-        headers['api-key'] = api_key
-
-    with open(snapshot_path, 'rb') as f:
-        files = {'snapshot': (snapshot_path.name, f, 'application/octet-stream')}
-        response = requests.post(upload_url, files=files, headers=headers, timeout=300)
+    with tarfile.open(archive_path, 'r|gz') as tar:
+        member = next((member for member in tar if _is_snapshot_member(member)), None)
+        if member is None:
+            raise FileNotFoundError(f'Не удалось найти snapshot файл в архиве {archive_path}')
+        print(f'Найден snapshot файл: {member.name} ({member.size / (1024 * 1024):.2f} MB)')
+
+        body = _MultipartStream(
+            'snapshot',
+            pathlib.PurePosixPath(member.name).name,
+            tar.extractfile(member),
+            member.size,
+        )
+        headers = {'Content-Type': body.content_type, 'Content-Length': str(len(body))}
+        if api_key:
+            headers['api-key'] = api_key
+        response = requests.post(upload_url, data=body, headers=headers, timeout=300)
 
     if response.status_code != 200:
         print(f'\nОшибка ответа сервера: {response.status_code}')
@@ -94,37 +234,85 @@ def upload_snapshot_to_qdrant(
     print('Snapshot успешно загружен в Qdrant!')
 
 
-def main() -> None:
-    snapshot_url = 'https://github.com/user-attachments/files/23277068/qdrant_snapshot.tar.gz'
-    qdrant_url = settings.qdrant.connection_string
-    collection_name = settings.qdrant.collection
-    api_key = os.getenv('QDRANT_API_KEY')  
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        snapshot_path = Path(temp_dir) / 'qdrant_snapshot.tar.gz'
-
-        try:
-            download_snapshot(snapshot_url, snapshot_path)
-
-            extracted_snapshot = extract_snapshot(snapshot_path, Path(temp_dir))
+def restore(
+    source: str,
+    download_dir: pathlib.Path,
+    qdrant_url: str,
+    collection_name: str,
+    sha256: str | None = None,
+    api_key: str | None = None,
+    verify: bool = True,
+) -> None:
+    """
+    Restores the collection from a snapshot archive.
+
+    Args:
+        source (str): http(s) URL or local path of the tar.gz archive
+        download_dir (pathlib.Path): where downloads are kept between runs
+        qdrant_url (str): Qdrant REST address
+        collection_name (str): collection to restore
+        sha256 (str | None): expected checksum of the archive
+        api_key (str | None): Qdrant API key
+        verify (bool): refuse an archive without the expected checksum
+    """
+    if verify and sha256 is None:
+        raise ChecksumError(
+            f'Неизвестна контрольная сумма архива {source}: '
+            'передайте --sha256 или отключите проверку --no-verify',
+        )
+    downloaded = _is_url(source)
+    if downloaded:
+        download_dir.mkdir(parents=True, exist_ok=True)
+        name = pathlib.PurePosixPath(urllib.parse.urlparse(source).path).name
+        archive_path = download_snapshot(source, download_dir / (name or 'qdrant_snapshot.tar.gz'))
+    else:
+        archive_path = _local_path(source)
+        if not archive_path.is_file():
+            raise FileNotFoundError(f'Архив {archive_path} не найден')
 
-            upload_snapshot_to_qdrant(
-                snapshot_path=extracted_snapshot,
-                collection_name=collection_name,
-                qdrant_url=qdrant_url,
-                api_key=api_key,
-            )
+    # Only a corrupted download is removed, a local archive belongs to the user.
+    verify_checksum(archive_path, sha256 if verify else None, remove_on_mismatch=downloaded)
+    upload_snapshot_to_qdrant(archive_path, collection_name, qdrant_url, api_key)
 
-            print('\n✓ Восстановление завершено успешно!')
 
-        except requests.exceptions.RequestException as e:
-            print(f'\n✗ Ошибка при работе с API: {e}')
-            raise
-        except Exception as e:
-            print(f'\n✗ Произошла ошибка: {e}')
-            raise
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--source', default=SNAPSHOT_URL, help='URL или путь к архиву')
+    parser.add_argument(
+        '--sha256',
+        help='ожидаемая контрольная сумма архива, для архива по умолчанию она известна',
+    )
+    parser.add_argument(
+        '--no-verify',
+        action='store_true',
+        help='не проверять контрольную сумму архива',
+    )
+    parser.add_argument('--download-dir', type=pathlib.Path, default=BACKEND_ROOT / 'snapshots')
+    parser.add_argument('--qdrant-url', default=settings.qdrant.connection_string)
+    parser.add_argument('--collection', default=settings.qdrant.collection)
+    args = parser.parse_args()
+
+    try:
+        restore(
+            args.source,
+            args.download_dir,
+            args.qdrant_url,
+            args.collection,
+            sha256=args.sha256 or (SNAPSHOT_SHA256 if args.source == SNAPSHOT_URL else None),
+            api_key=os.getenv('QDRANT_API_KEY'),
+            verify=not args.no_verify,
+        )
+        print('\n✓ Восстановление завершено успешно!')
+    except requests.exceptions.RequestException as e:
+        print(f'\n✗ Ошибка при работе с API: {e}')
+        raise
+    except Exception as e:
+        print(f'\n✗ Произошла ошибка: {e}')
+        raise
 
 
 if __name__ == '__main__':
     main()
-
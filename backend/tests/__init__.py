@@ -1,6 +1,15 @@
 """Tests for all backend services."""
+import atexit
 import pathlib
 import sys
+import tempfile
 
 project_root = pathlib.Path(__file__).parent.parent / 'application'
 sys.path.append(str(project_root))
+
+import core.config  # noqa: E402
+
+# Keep the embedding cache of the tests out of backend/embedding_cache.sqlite3.
+_cache_dir = tempfile.TemporaryDirectory()
+atexit.register(_cache_dir.cleanup)
+core.config.settings.embedding_cache.path = str(pathlib.Path(_cache_dir.name) / 'cache.sqlite3')
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import typing
+import unittest
+
+import services.admission as admission
+
+
+class TestStageGate(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self.gate = admission.StageGate('generation', max_concurrency=1, max_wait_seconds=1.)
+
+    def test_no_wait_with_free_slot(self: typing.Self) -> None:
+        self.gate.service_seconds = 10.
+        self.assertEqual(self.gate.estimated_wait(), 0.)
+        self.gate.check()
+
+    def test_rejects_when_queue_is_too_long(self: typing.Self) -> None:
+        async def run() -> None:
+            release = asyncio.Event()
+
+            async def hold() -> None:
+                async with self.gate.admit():
+                    await release.wait()
+
+            self.gate.service_seconds = 0.6
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            self.assertEqual(self.gate.estimated_wait(), 0.6)
+
+            waiter = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            self.assertEqual(self.gate.waiting, 1)
+            with self.assertRaises(admission.OverloadedError) as context:
+                async with self.gate.admit():
+                    pass
+            self.assertEqual(context.exception.retry_after, 2)
+
+            release.set()
+            await asyncio.gather(holder, waiter)
+            self.assertEqual((self.gate.running, self.gate.waiting), (0, 0))
+
+        asyncio.run(run())
+
+    def test_slot_is_held_until_the_thread_finishes(self: typing.Self) -> None:
+        async def run() -> None:
+            finished = threading.Event()
+
+            async def generate() -> None:
+                async with self.gate.slot():
+                    await admission.run_to_completion(finished.wait, 10)
+
+            task = asyncio.create_task(generate())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.gate.running, 1)
+
+            finished.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(self.gate.running, 0)
+
+        asyncio.run(run())
+
+    def test_service_time_is_averaged(self: typing.Self) -> None:
+        self.gate._observe(1.)
+        self.gate._observe(2.)
+        self.assertAlmostEqual(self.gate.service_seconds, 1.2)
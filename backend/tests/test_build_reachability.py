@@ -0,0 +1,197 @@
+import importlib.util
+import pathlib
+import tempfile
+import typing
+import unittest
+from unittest import mock
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+import build_reachability
+
+# Nodes of a straight north-south street, about 111 m apart.
+NODE_COORDINATES: typing.Final[np.ndarray] = np.array(
+    [[56. + 0.001 * i, 44.] for i in range(5)],
+)
+SPEED: typing.Final[float] = 1.5
+
+OSM_XML: typing.Final[str] = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <node id="1" lat="56.000" lon="44.0"/>
+ <node id="2" lat="56.001" lon="44.0"/>
+ <node id="3" lat="56.002" lon="44.0"/>
+ <node id="4" lat="56.100" lon="44.0"/>
+ <node id="5" lat="56.101" lon="44.0"/>
+ <node id="6" lat="56.200" lon="44.0"/>
+ <node id="7" lat="56.201" lon="44.0"/>
+ <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="footway"/></way>
+ <way id="11"><nd ref="4"/><nd ref="5"/><tag k="highway" v="residential"/></way>
+ <way id="12"><nd ref="6"/><nd ref="7"/><tag k="highway" v="motorway"/></way>
+</osm>
+"""
+
+PARALLEL_WAYS_XML: typing.Final[str] = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <node id="1" lat="56.000" lon="44.0"/>
+ <node id="2" lat="56.001" lon="44.0"/>
+ <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="residential"/></way>
+ <way id="11"><nd ref="1"/><nd ref="2"/><tag k="highway" v="footway"/></way>
+ <way id="12"><nd ref="1"/><nd ref="2"/><tag k="highway" v="path"/></way>
+</osm>
+"""
+
+
+def _street_graph() -> scipy.sparse.csr_matrix:
+    sources = np.arange(len(NODE_COORDINATES) - 1)
+    seconds = np.full(len(sources), 111. / SPEED)
+    return scipy.sparse.coo_matrix(
+        (seconds, (sources, sources + 1)),
+        shape=(len(NODE_COORDINATES), len(NODE_COORDINATES)),
+    ).tocsr()
+
+
+class TestSnapPlaces(unittest.TestCase):
+    def test_nearest_node(self: typing.Self) -> None:
+        places = np.array([[56.0031, 44.], [55.9999, 44.0005]])
+
+        nodes, meters = build_reachability.snap_places(places, NODE_COORDINATES)
+
+        np.testing.assert_array_equal(nodes, [3, 0])
+        np.testing.assert_allclose(meters, [11.1, 32.], rtol=0.05)
+
+    def test_far_place(self: typing.Self) -> None:
+        _, meters = build_reachability.snap_places(np.array([[56.01, 44.]]), NODE_COORDINATES)
+        self.assertGreater(meters[0], build_reachability.FAR_SNAP_METERS)
+
+
+@unittest.skipUnless(importlib.util.find_spec('osmium'), 'osmium is not installed')
+class TestBuildWalkGraph(unittest.TestCase):
+    def test_largest_walkable_component(self: typing.Self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / 'extract.osm'
+            path.write_text(OSM_XML, encoding='utf-8')
+            graph, coordinates = build_reachability.build_walk_graph(path, SPEED)
+
+        np.testing.assert_allclose(coordinates, [[56., 44.], [56.001, 44.], [56.002, 44.]])
+        self.assertEqual(graph.nnz, 2)
+        np.testing.assert_allclose(graph.data, 111.2 / SPEED, rtol=0.01)
+
+    def test_parallel_ways(self: typing.Self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / 'extract.osm'
+            path.write_text(PARALLEL_WAYS_XML, encoding='utf-8')
+            graph, _ = build_reachability.build_walk_graph(path, SPEED)
+
+        seconds = scipy.sparse.csgraph.dijkstra(graph, directed=False, indices=0)
+        self.assertAlmostEqual(seconds[1], 111.2 / SPEED, delta=1.)
+
+
+class TestShortestEdges(unittest.TestCase):
+    def test_keeps_shortest_duplicate(self: typing.Self) -> None:
+        sources, targets, seconds = build_reachability._shortest_edges(
+            np.array([0, 1, 0, 1, 2]),
+            np.array([1, 0, 1, 2, 2]),
+            np.array([30., 10., 20., 5., 1.]),
+        )
+
+        np.testing.assert_array_equal(sources, [0, 1])
+        np.testing.assert_array_equal(targets, [1, 2])
+        np.testing.assert_array_equal(seconds, [10., 5.])
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.output = pathlib.Path(self._tmp_dir.name) / 'walking_matrix.npy'
+        self.signature = np.array([100, 200], dtype=np.int64)
+        self.graph = _street_graph()
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def _build(
+        self: typing.Self,
+        ids: np.ndarray,
+        coordinates: np.ndarray,
+        previous: tuple[np.ndarray, np.ndarray, np.ndarray] | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        place_nodes, snap_meters = build_reachability.snap_places(coordinates, NODE_COORDINATES)
+        matrix, stale = build_reachability.reuse_previous(ids, coordinates, previous)
+        build_reachability.fill_stale_rows(
+            matrix,
+            stale,
+            self.graph,
+            place_nodes,
+            snap_meters / SPEED,
+            workers=1,
+        )
+        return matrix, stale
+
+    def test_only_changed_places_are_recomputed(self: typing.Self) -> None:
+        ids = np.array([1, 2, 3])
+        coordinates = NODE_COORDINATES[[0, 2, 4]]
+        matrix, _ = self._build(ids, coordinates, None)
+        build_reachability.save_matrix(
+            self.output,
+            matrix,
+            ids,
+            coordinates,
+            self.signature,
+            SPEED,
+        )
+
+        # Place 2 moves, place 3 is removed and place 4 is added.
+        new_ids = np.array([4, 2, 1])
+        new_coordinates = NODE_COORDINATES[[3, 1, 0]]
+        previous = build_reachability.load_previous(self.output, self.signature, SPEED)
+        with mock.patch.object(
+            build_reachability,
+            'compute_rows',
+            wraps=build_reachability.compute_rows,
+        ) as compute_rows:
+            incremental, stale = self._build(new_ids, new_coordinates, previous)
+
+        np.testing.assert_array_equal(stale, [True, True, False])
+        np.testing.assert_array_equal(compute_rows.call_args.args[2], [0, 1])
+        full, _ = self._build(new_ids, new_coordinates, None)
+        np.testing.assert_allclose(incremental, full)
+
+    def test_unchanged_places_are_reused(self: typing.Self) -> None:
+        ids = np.array([1, 2])
+        coordinates = NODE_COORDINATES[[0, 4]]
+        matrix, _ = self._build(ids, coordinates, None)
+
+        reused, stale = build_reachability.reuse_previous(ids, coordinates, (ids, coordinates, matrix))
+
+        self.assertFalse(stale.any())
+        np.testing.assert_array_equal(reused, matrix)
+
+    def test_changed_speed_invalidates_state(self: typing.Self) -> None:
+        ids = np.array([1])
+        build_reachability.save_matrix(
+            self.output,
+            np.zeros((1, 1)),
+            ids,
+            NODE_COORDINATES[:1],
+            self.signature,
+            SPEED,
+        )
+
+        self.assertIsNotNone(build_reachability.load_previous(self.output, self.signature, SPEED))
+        self.assertIsNone(build_reachability.load_previous(self.output, self.signature, 2.))
+        self.assertIsNone(
+            build_reachability.load_previous(self.output, self.signature + 1, SPEED),
+        )
+
+    def test_state_without_speed_is_rebuilt(self: typing.Self) -> None:
+        np.save(self.output, np.zeros((1, 1)))
+        np.savez(
+            build_reachability._state_path(self.output),
+            ids=np.array([1]),
+            coordinates=NODE_COORDINATES[:1],
+            extract=self.signature,
+        )
+
+        self.assertIsNone(build_reachability.load_previous(self.output, self.signature, SPEED))
@@ -0,0 +1,105 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+
+import numpy as np
+
+import application.services.catalog as catalog
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self._tmp_dir.name) / 'catalog.bin'
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_round_trip(self: typing.Self) -> None:
+        travel_seconds = np.array([[0., 125.], [610., 0.]])
+        version = catalog.write_catalog(
+            self.path,
+            ids=[4, 1],
+            coordinates=[(56.3, 43.9), (56.2, 44.0)],
+            visit_minutes=[15, 30],
+            travel_seconds=travel_seconds,
+        )
+        loaded = catalog.load_catalog(self.path)
+
+        self.assertEqual(loaded.version, version)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.row(4), 0)
+        self.assertEqual(loaded.row(1), 1)
+        self.assertNotIn(2, loaded)
+        self.assertNotIn(100, loaded)
+        self.assertEqual(loaded.travel_minutes.dtype, np.uint16)
+        self.assertEqual(loaded.travel_minutes.tolist(), [[0, 2], [10, 0]])
+        self.assertEqual(loaded.visit_minutes.tolist(), [15, 30])
+        self.assertEqual(loaded.coordinates[1].tolist(), [56.2, 44.0])
+
+    def test_unreachable_pairs(self: typing.Self) -> None:
+        catalog.write_catalog(
+            self.path,
+            ids=[0, 1],
+            coordinates=[(56.3, 43.9), (56.2, 44.0)],
+            visit_minutes=[15, 30],
+            travel_seconds=np.array([[0., np.inf], [np.inf, 0.]]),
+        )
+        loaded = catalog.load_catalog(self.path)
+        self.assertEqual(
+            loaded.travel_minutes.tolist(),
+            [[0, catalog.MAX_MINUTES], [catalog.MAX_MINUTES, 0]],
+        )
+
+    def test_wrong_file(self: typing.Self) -> None:
+        self.path.write_bytes(b'not a catalog at all, just some bytes')
+        with self.assertRaises(catalog.CatalogError):
+            catalog.load_catalog(self.path)
+
+    def test_bundled_catalog(self: typing.Self) -> None:
+        bundled = catalog.load_catalog(
+            pathlib.Path(__file__).parent.parent / 'place_catalog.bin',
+        )
+        self.assertEqual(bundled.travel_minutes.shape, (len(bundled), len(bundled)))
+        self.assertEqual(bundled.row(0), 0)
+
+
+class TestCatalogHolder(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self._tmp_dir.name) / 'catalog.bin'
+        self._write([1, 2])
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def _write(self: typing.Self, ids: list[int]) -> int:
+        return catalog.write_catalog(
+            self.path,
+            ids=ids,
+            coordinates=[(56.3, 43.9)] * len(ids),
+            visit_minutes=[15] * len(ids),
+            travel_seconds=np.full((len(ids), len(ids)), 120.),
+        )
+
+    def test_swap(self: typing.Self) -> None:
+        holder = catalog.CatalogHolder(self.path)
+        swapped: list[catalog.Catalog] = []
+        holder.add_listener(swapped.append)
+        old = holder.get()
+
+        self.assertFalse(holder.reload_if_changed())
+        version = self._write([1, 2, 7])
+        self.assertTrue(holder.reload_if_changed())
+
+        self.assertEqual(holder.get().version, version)
+        self.assertIn(7, holder.get())
+        self.assertEqual(swapped, [holder.get()])
+        self.assertNotIn(7, old)
+        self.assertEqual(old.travel_minutes.tolist(), [[2, 2], [2, 2]])
+
+    def test_reload_same_version(self: typing.Self) -> None:
+        holder = catalog.CatalogHolder(self.path)
+        self._write([1, 2])
+        self.assertFalse(holder.reload())
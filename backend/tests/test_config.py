@@ -0,0 +1,64 @@
+import os
+import typing
+import unittest
+from unittest import mock
+
+import application.core.config as config
+
+
+class TestEnvBinding(unittest.TestCase):
+    def test_model_server_socket(self: typing.Self) -> None:
+        with mock.patch.dict(
+            os.environ,
+            {'MODEL_SERVER_SOCKET': '/tmp/nextstop-models.sock', 'MODELS_PRELOAD': 'false'},
+        ):
+            settings = config.Settings()
+
+        self.assertEqual(settings.models.server_socket, '/tmp/nextstop-models.sock')
+        self.assertFalse(settings.models.preload)
+
+    def test_defaults_without_env(self: typing.Self) -> None:
+        with mock.patch.dict(os.environ, clear=True):
+            settings = config.Settings()
+
+        self.assertIsNone(settings.models.server_socket)
+        self.assertEqual(settings.models.server_timeout_seconds, 300)
+        self.assertFalse(settings.explanation_store.enabled)
+
+    def test_invalid_value(self: typing.Self) -> None:
+        with (
+            mock.patch.dict(os.environ, {'MODEL_SERVER_BATCH_WAIT_MS': 'soon'}),
+            self.assertRaises(ValueError),
+        ):
+            config.Settings()
+
+    def test_field_names_are_not_env_vars(self: typing.Self) -> None:
+        with mock.patch.dict(os.environ, {'PATH': '/usr/bin', 'TOKEN': 'secret'}):
+            settings = config.Settings()
+
+        self.assertEqual(settings.catalog.path, 'place_catalog.bin')
+        self.assertIsNone(settings.admin.token)
+
+    def test_search_backend(self: typing.Self) -> None:
+        with mock.patch.dict(
+            os.environ,
+            {
+                'SEARCH_BACKEND': 'numpy',
+                'SEARCH_VECTORS_PATH': 'vectors/places.npz',
+                'SEARCH_GEO_FILTER': 'false',
+                'SEARCH_TOP_K': '20',
+            },
+        ):
+            settings = config.Settings()
+
+        self.assertEqual(settings.search.backend, 'numpy')
+        self.assertEqual(settings.search.vectors_path, 'vectors/places.npz')
+        self.assertFalse(settings.search.geo_filter)
+        self.assertEqual(settings.search.top_k, 20)
+
+    def test_unknown_search_backend(self: typing.Self) -> None:
+        with (
+            mock.patch.dict(os.environ, {'SEARCH_BACKEND': 'faiss'}),
+            self.assertRaises(ValueError),
+        ):
+            config.Settings()
@@ -1,4 +1,10 @@
+import asyncio
 import concurrent.futures
+import json
+import os
+import pathlib
+import subprocess
+import sys
 import typing
 import unittest
 import unittest.mock as mock
@@ -10,8 +16,20 @@ import parameterized
 import application.main
 import application.models.place_payload as place_payload
 
+ADMIN_CLIENT_SCRIPT: typing.Final[str] = """
+import fastapi.testclient
+import main
+
+client = fastapi.testclient.TestClient(main.app)
+for token in ('secret', 'wrong'):
+    print(client.post('/admin/cache/invalidate', headers={'X-Admin-Token': token}).status_code)
+"""
+
 
 class TestUserInput(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        application.main.services.limiter.limiter.reset()
+
     def test_user_input_positive(self: typing.Self) -> None:
         with mock.patch(
             'db.qdrant_repo.QdrantRepository.search',
@@ -36,6 +54,40 @@ class TestUserInput(unittest.TestCase):
             url = '/handle'
             response = client.post(url=url, json=data)
             self.assertEqual(response.status_code, 200)
+            self.assertIn('embedding;dur=', response.headers['Server-Timing'])
+            self.assertIn('total;dur=', response.headers['Server-Timing'])
+
+    def test_user_input_stream(self: typing.Self) -> None:
+        with mock.patch(
+            'db.qdrant_repo.QdrantRepository.search',
+            return_value=[
+                place_payload.PlacePayload(
+                    id=1,
+                    title='Танковый музей',
+                    description='Танковый музей',
+                    score=0.77,
+                    latitude=56.12,
+                    longitude=43.12,
+                ),
+            ],
+        ):
+            client = fastapi.testclient.TestClient(application.main.app)
+            data = {
+                'prompt': 'Хочу прогуляться рядом с военной техникой',
+                'time_for_walk': 6,
+                'latitude': 56.307,
+                'longitude': 43.9843,
+            }
+            response = client.post(url='/handle/stream', json=data)
+            self.assertEqual(response.status_code, 200)
+
+            events = [json.loads(line) for line in response.text.splitlines()]
+            self.assertEqual(events[0]['event'], 'route')
+            self.assertEqual(events[-1]['event'], 'done')
+            self.assertEqual(
+                len(events) - 2,
+                max(len(events[0]['walking_path']), 1),
+            )
 
     @parameterized.parameterized.expand(
         [
@@ -114,3 +166,234 @@ class TestUserInput(unittest.TestCase):
         self.assertEqual(len(status_codes), 4)
         self.assertEqual(status_codes[:3], [200, 200, 200])
         self.assertEqual(status_codes.count(429), 1)
+
+    def test_search_widens_top_k(self: typing.Self) -> None:
+        def search(
+            vector: list[float],
+            top_k: int,
+            origin: tuple[float, float],
+            radius: float,
+        ) -> list[place_payload.PlacePayload]:
+            return [
+                place_payload.PlacePayload(
+                    id=place_id,
+                    title='Далёкое место',
+                    description='Далёкое место',
+                    score=0.5,
+                    latitude=14.88,
+                    longitude=88.41,
+                )
+                for place_id in range(top_k)
+            ]
+
+        with mock.patch(
+            'db.qdrant_repo.QdrantRepository.search',
+            side_effect=search,
+        ) as search_mock:
+            client = fastapi.testclient.TestClient(application.main.app)
+            data = {
+                'prompt': 'Хочу посмотреть на что-нибудь далёкое',
+                'time_for_walk': 1,
+                'latitude': 56.307,
+                'longitude': 43.9843,
+            }
+            response = client.post('/handle', json=data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [call.args[1] for call in search_mock.call_args_list],
+            [10, 20, 40, 80],
+        )
+        _, _, origin, radius = search_mock.call_args.args
+        self.assertEqual(origin, (56.307, 43.9843))
+        self.assertEqual(radius, 12000)
+
+    def test_generation_overload(self: typing.Self) -> None:
+        admission = application.main.services.admission
+        data = {
+            'prompt': 'Хочу прогуляться у воды',
+            'time_for_walk': 2,
+            'latitude': 56.307,
+            'longitude': 43.9843,
+        }
+        place = application.main.models.place_payload.PlacePayload(
+            id=1,
+            title='Памятник Максиму Горькому',
+            description='Памятник Максиму Горькому',
+            score=0.77,
+            latitude=56.32448,
+            longitude=43.983546,
+        )
+        with (
+            mock.patch('db.qdrant_repo.QdrantRepository.search', return_value=[place]),
+            mock.patch.object(
+                application.main.services.scheduler,
+                'embed',
+                mock.AsyncMock(return_value=[0.] * 1536),
+            ),
+            mock.patch.object(
+                admission.generation_gate,
+                'estimated_wait',
+                return_value=60.,
+            ),
+            mock.patch.object(
+                application.main.core.config.settings.response_cache,
+                'enabled',
+                False,
+            ),
+            mock.patch.object(
+                application.main.core.config.settings.explanation_store,
+                'enabled',
+                False,
+            ),
+        ):
+            client = fastapi.testclient.TestClient(application.main.app)
+            degraded = client.post('/handle', json=data)
+            with mock.patch.object(
+                application.main.core.config.settings.admission,
+                'generation_overload',
+                'reject',
+            ):
+                rejected = client.post('/handle', json=data)
+
+        self.assertEqual(degraded.status_code, 200)
+        self.assertGreater(len(degraded.json()['walking_path']), 0)
+        self.assertEqual(degraded.json()['explanation'], [])
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.headers['Retry-After'], '60')
+
+    def test_model_is_resolved_off_the_event_loop(self: typing.Self) -> None:
+        data = {
+            'prompt': 'Хочу прогуляться у воды',
+            'time_for_walk': 2,
+            'latitude': 56.307,
+            'longitude': 43.9843,
+        }
+        place = application.main.models.place_payload.PlacePayload(
+            id=1,
+            title='Памятник Максиму Горькому',
+            description='Памятник Максиму Горькому',
+            score=0.77,
+            latitude=56.32448,
+            longitude=43.983546,
+        )
+        model = mock.Mock()
+        model.get_desc_selection.return_value = ['Памятник у воды.']
+        model.iter_desc_selection.return_value = iter(['Памятник у воды.'])
+        loop_calls: list[bool] = []
+
+        def get_text_generation_model() -> mock.Mock:
+            try:
+                asyncio.get_running_loop()
+                loop_calls.append(True)
+            except RuntimeError:
+                loop_calls.append(False)
+            return model
+
+        with (
+            mock.patch('db.qdrant_repo.QdrantRepository.search', return_value=[place]),
+            mock.patch.object(
+                application.main.services.scheduler,
+                'embed',
+                mock.AsyncMock(return_value=[0.] * 1536),
+            ),
+            mock.patch.object(
+                application.main.services.ml,
+                'get_text_generation_model',
+                get_text_generation_model,
+            ),
+            mock.patch.object(
+                application.main.core.config.settings.response_cache,
+                'enabled',
+                False,
+            ),
+            mock.patch.object(
+                application.main.core.config.settings.explanation_store,
+                'enabled',
+                False,
+            ),
+        ):
+            client = fastapi.testclient.TestClient(application.main.app)
+            response = client.post('/handle', json=data)
+            stream = client.post('/handle/stream', json=data)
+
+        self.assertEqual(response.json()['explanation'], ['Памятник у воды.'])
+        self.assertIn('Памятник у воды.', stream.text)
+        self.assertEqual(loop_calls, [False, False])
+
+    def test_invalidate_response_cache(self: typing.Self) -> None:
+        client = fastapi.testclient.TestClient(application.main.app)
+        with mock.patch.object(application.main.core.config.settings.admin, 'token', 'secret'):
+            response = client.post(
+                '/admin/cache/invalidate',
+                headers={'X-Admin-Token': 'secret'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dropped', response.json())
+
+    def test_reload_catalog(self: typing.Self) -> None:
+        client = fastapi.testclient.TestClient(application.main.app)
+        with mock.patch.object(application.main.core.config.settings.admin, 'token', 'secret'):
+            response = client.post(
+                '/admin/catalog/reload',
+                headers={'X-Admin-Token': 'secret'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['reloaded'])
+        self.assertGreater(response.json()['places'], 0)
+
+    def test_admin_token_required(self: typing.Self) -> None:
+        client = fastapi.testclient.TestClient(application.main.app)
+        self.assertEqual(client.post('/admin/cache/invalidate').status_code, 403)
+        with mock.patch.object(application.main.core.config.settings.admin, 'token', 'secret'):
+            response = client.post(
+                '/admin/catalog/reload',
+                headers={'X-Admin-Token': 'wrong'},
+            )
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_token_from_env(self: typing.Self) -> None:
+        # Settings are read at import, so the app runs in a fresh process.
+        result = subprocess.run(
+            [sys.executable, '-c', ADMIN_CLIENT_SCRIPT],
+            cwd=pathlib.Path(application.main.__file__).parent,
+            env={**os.environ, 'ADMIN_TOKEN': 'secret'},
+            capture_output=True,
+            text=True,
+            timeout=300,
+            check=True,
+        )
+        self.assertEqual(result.stdout.split(), ['200', '403'])
+
+    def test_ready_before_startup(self: typing.Self) -> None:
+        client = fastapi.testclient.TestClient(application.main.app)
+        response = client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['models'])
+
+    def test_wait_for_model_server(self: typing.Self) -> None:
+        app = mock.Mock()
+        with (
+            mock.patch.object(
+                application.main.core.config.settings.models,
+                'server_socket',
+                '/tmp/models.sock',
+            ),
+            mock.patch.object(application.main, 'MODEL_SERVER_RETRY_MIN_SECONDS', 0.),
+            mock.patch.object(
+                application.main,
+                '_load_models',
+                side_effect=[ConnectionError, ConnectionError, None],
+            ) as load_mock,
+        ):
+            asyncio.run(application.main._prepare_models(app))
+
+        self.assertEqual(load_mock.call_count, 3)
+        self.assertTrue(app.state.models_ready)
+
+    def test_metrics(self: typing.Self) -> None:
+        client = fastapi.testclient.TestClient(application.main.app)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain'))
+        self.assertIn('# TYPE nextstop_stage_duration_seconds histogram', response.text)
@@ -0,0 +1,118 @@
+import pathlib
+import sqlite3
+import tempfile
+import typing
+import unittest
+import unittest.mock as mock
+
+import application.services.embedding_cache as embedding_cache
+
+
+class TestNormalizePrompt(unittest.TestCase):
+    def test_normalize(self: typing.Self) -> None:
+        self.assertEqual(embedding_cache.normalize_prompt('  Музей!!  '), 'музей')
+        self.assertEqual(
+            embedding_cache.normalize_prompt('Парк,\tкофе  и «пиво»'),
+            'парк кофе и пиво',
+        )
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self._tmp_dir.name) / 'cache.sqlite3'
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_hit_and_miss(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(self.path, max_entries=10, ttl_seconds=60)
+        self.assertIsNone(cache.get('музей'))
+        cache.put('музей', [0.5, 0.25])
+
+        self.assertEqual(cache.get('Музей.'), [0.5, 0.25])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.hit_ratio, 0.5)
+
+    def test_shared_between_instances(self: typing.Self) -> None:
+        embedding_cache.EmbeddingCache(self.path, 10, 60).put('парк', [1., 2.])
+        cache = embedding_cache.EmbeddingCache(self.path, 10, 60)
+        self.assertEqual(cache.get('парк'), [1., 2.])
+
+    def test_namespaces_are_separate(self: typing.Self) -> None:
+        embedding_cache.EmbeddingCache(self.path, 10, 60, namespace='torch').put('парк', [1.])
+        cache = embedding_cache.EmbeddingCache(self.path, 10, 60, namespace='onnx')
+        self.assertIsNone(cache.get('парк'))
+
+    def test_float32_on_put_and_get(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(self.path, max_entries=10, ttl_seconds=60)
+        stored = cache.put('кофе', [0.1, 1 / 3])
+        self.assertEqual(stored, cache.get('кофе'))
+        self.assertNotEqual(stored, [0.1, 1 / 3])
+
+    def test_ttl(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(self.path, max_entries=10, ttl_seconds=60)
+        with mock.patch('time.time', return_value=1000.):
+            cache.put('кофе', [1.])
+        with mock.patch('time.time', return_value=1100.):
+            self.assertIsNone(cache.get('кофе'))
+
+    def test_lru_eviction(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(
+            self.path,
+            max_entries=2,
+            ttl_seconds=60,
+            eviction_interval=1,
+        )
+        with mock.patch('time.time', return_value=1.):
+            cache.put('a', [1.])
+        with mock.patch('time.time', return_value=2.):
+            cache.put('b', [2.])
+        with mock.patch('time.time', return_value=3.):
+            cache.get('a')
+        with mock.patch('time.time', return_value=4.):
+            cache.put('c', [3.])
+
+        self.assertEqual(len(cache), 2)
+        with mock.patch('time.time', return_value=5.):
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), [1.])
+
+    def _accessed_at(self: typing.Self, key: str) -> float:
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(
+                'SELECT accessed_at FROM embeddings WHERE key = ?',
+                (f'|{key}',),
+            ).fetchone()[0]
+
+    def test_access_times_are_batched(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(self.path, max_entries=10, ttl_seconds=60)
+        with mock.patch('time.time', return_value=1.):
+            cache.put('a', [1.])
+        with mock.patch('time.time', return_value=2.):
+            cache.get('a')
+        self.assertEqual(self._accessed_at('a'), 1.)
+
+        with mock.patch('time.time', return_value=2. + embedding_cache.ACCESS_FLUSH_SECONDS):
+            cache.get('a')
+        self.assertEqual(self._accessed_at('a'), 2. + embedding_cache.ACCESS_FLUSH_SECONDS)
+
+    def test_eviction_waits_for_slack(self: typing.Self) -> None:
+        cache = embedding_cache.EmbeddingCache(
+            self.path,
+            max_entries=10,
+            ttl_seconds=60,
+            eviction_interval=4,
+        )
+        for i in range(11):
+            with mock.patch('time.time', return_value=float(i)):
+                cache.put(str(i), [float(i)])
+        # The check after the 8th put found the table within max_entries.
+        self.assertEqual(len(cache), 11)
+
+        with mock.patch('time.time', return_value=11.):
+            cache.put('11', [11.])
+            self.assertEqual(len(cache), 10)
+            self.assertIsNone(cache.get('0'))
+            self.assertIsNone(cache.get('1'))
+            self.assertEqual(cache.get('2'), [2.])
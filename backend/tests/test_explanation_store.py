@@ -0,0 +1,109 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+from unittest import mock
+
+import application.models.place_payload as place_payload
+import application.services.explanation_store as explanation_store
+
+PLACES: typing.Final[list[place_payload.PlacePayload]] = [
+    place_payload.PlacePayload(
+        id=1,
+        title='Танковый музей',
+        description='Танковый музей',
+        score=0.77,
+        latitude=56.12,
+        longitude=43.12,
+    ),
+    place_payload.PlacePayload(
+        id=2,
+        title='Парк',
+        description='Парк с деревьями',
+        score=0.7,
+        latitude=56.13,
+        longitude=43.13,
+    ),
+]
+
+
+class TestExplanationStore(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        path = pathlib.Path(self._tmp_dir.name) / 'explanations.json'
+        explanation_store.write_store(
+            path,
+            {'history': [1., 0.], 'nature': [0., 1.]},
+            {
+                'history': {1: 'Музей о военной истории.', 2: 'Парк у старой крепости.'},
+                'nature': {2: 'Тенистый парк.'},
+            },
+            catalog_version=7,
+        )
+        self.path = path
+        self.store = explanation_store.ExplanationStore(path, similarity_threshold=0.8)
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_match_intent(self: typing.Self) -> None:
+        self.assertEqual(self.store.match_intent([0.95, 0.1]), 'history')
+        self.assertEqual(self.store.match_intent([0.1, 0.95]), 'nature')
+        self.assertIsNone(self.store.match_intent([0.7, 0.7]))
+
+    def test_explain_hit(self: typing.Self) -> None:
+        self.assertEqual(
+            self.store.explain(' военная история ', [1., 0.], PLACES),
+            [
+                'Для Вашего запроса «военная история» подойдёт место «Танковый музей». Музей о военной истории.',
+                'Для Вашего запроса «военная история» подойдёт место «Парк». Парк у старой крепости.',
+            ],
+        )
+        self.assertEqual(self.store.hits, 1)
+
+    def test_explain_fills_prompt(self: typing.Self) -> None:
+        first = self.store.explain('музеи', [1., 0.], PLACES)
+        second = self.store.explain('крепость', [1., 0.], PLACES)
+        self.assertNotEqual(first, second)
+
+    def test_explain_miss(self: typing.Self) -> None:
+        self.assertIsNone(self.store.explain('парки', [0., 1.], PLACES))
+        self.assertIsNone(self.store.explain('что-нибудь', [0.7, 0.7], PLACES))
+        self.assertEqual(self.store.misses, 2)
+
+
+    def _get_store(
+        self: typing.Self,
+        catalog_version: int,
+    ) -> explanation_store.ExplanationStore | None:
+        store_settings = explanation_store.settings.explanation_store
+        catalog = mock.Mock(version=catalog_version)
+        with (
+            mock.patch.object(store_settings, 'enabled', True),
+            mock.patch.object(store_settings, 'path', str(self.path)),
+            mock.patch.object(
+                explanation_store.services.utils.catalog_holder,
+                'get',
+                return_value=catalog,
+            ),
+        ):
+            return explanation_store.get_explanation_store()
+
+    def test_store_of_current_catalog(self: typing.Self) -> None:
+        explanation_store.invalidate()
+        self.addCleanup(explanation_store.invalidate)
+
+        store = self._get_store(catalog_version=7)
+
+        self.assertIsNotNone(store)
+        self.assertEqual(store.catalog_version, 7)
+
+    def test_store_of_other_catalog_is_not_served(self: typing.Self) -> None:
+        explanation_store.invalidate()
+        self.addCleanup(explanation_store.invalidate)
+
+        self.assertIsNotNone(self._get_store(catalog_version=7))
+        # The store is kept until the catalog swap invalidates it.
+        self.assertIsNotNone(self._get_store(catalog_version=8))
+        explanation_store.invalidate()
+        self.assertIsNone(self._get_store(catalog_version=8))
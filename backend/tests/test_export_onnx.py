@@ -0,0 +1,57 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+from unittest import mock
+
+import export_onnx
+
+
+def _fake_export(output_dir: pathlib.Path, quantize: bool = True) -> pathlib.Path:
+    (output_dir / 'tokenizer.json').write_text('{}', encoding='utf-8')
+    (output_dir / 'model.onnx').write_bytes(b'fp32')
+    model_path = output_dir / 'model_int8.onnx'
+    model_path.write_bytes(b'int8')
+    return model_path
+
+
+class TestExportChecked(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._tmp_dir.name)
+        self.output_dir = self.root / 'frida_onnx'
+        patchers = [
+            mock.patch.object(export_onnx, 'export_onnx', side_effect=_fake_export),
+            mock.patch.object(export_onnx, '_EmbeddingModel'),
+            mock.patch.object(export_onnx, 'OnnxEmbeddingModel'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def _export(self: typing.Self, similarity: float) -> tuple[pathlib.Path, float]:
+        with mock.patch.object(export_onnx, 'check_parity', return_value=similarity):
+            return export_onnx.export_checked(self.output_dir, ['музей'], min_cosine=0.99)
+
+    def test_published_after_parity(self: typing.Self) -> None:
+        model_path, similarity = self._export(0.995)
+
+        self.assertEqual(model_path, self.output_dir / 'model_int8.onnx')
+        self.assertEqual(model_path.read_bytes(), b'int8')
+        self.assertTrue((self.output_dir / 'tokenizer.json').exists())
+        self.assertEqual(similarity, 0.995)
+        self.assertEqual(list(self.root.iterdir()), [self.output_dir])
+
+    def test_failed_model_is_not_published(self: typing.Self) -> None:
+        self.output_dir.mkdir()
+        (self.output_dir / 'model_int8.onnx').write_bytes(b'previous')
+
+        with self.assertRaises(export_onnx.ParityError):
+            self._export(0.9)
+
+        self.assertEqual((self.output_dir / 'model_int8.onnx').read_bytes(), b'previous')
+        self.assertFalse((self.output_dir / 'tokenizer.json').exists())
+        self.assertEqual(list(self.root.iterdir()), [self.output_dir])
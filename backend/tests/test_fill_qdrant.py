@@ -0,0 +1,74 @@
+import typing
+import unittest
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+import fill_qdrant
+
+COLLECTION: typing.Final[str] = 'places'
+
+
+def _payload(place_id: int, title: str) -> dict:
+    payload = {
+        'id': place_id,
+        'title': title,
+        'desc': f'{title} в центре города',
+        'location': {'lat': 56.3, 'lon': 44.},
+    }
+    payload[fill_qdrant.HASH_FIELD] = fill_qdrant.content_hash(payload)
+    return payload
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self.client = QdrantClient(':memory:')
+        self.client.create_collection(
+            COLLECTION,
+            vectors_config=models.VectorParams(size=3, distance=models.Distance.COSINE),
+        )
+        self.embedded: list[str] = []
+
+    def _embed(self: typing.Self, texts: list[str]) -> np.ndarray:
+        self.embedded.extend(texts)
+        return np.array([[1., len(text), 0.] for text in texts])
+
+    def _ingest(self: typing.Self, chunks: list[list[dict]]) -> tuple[set[int], int]:
+        return fill_qdrant.ingest(
+            self.client,
+            COLLECTION,
+            chunks,
+            self._embed,
+            upsert_batch_size=2,
+            workers=2,
+        )
+
+    def test_unchanged_rows_are_skipped(self: typing.Self) -> None:
+        chunks = [[_payload(1, 'Кремль'), _payload(2, 'Парк')], [_payload(3, 'Музей')]]
+        seen, upserted = self._ingest(chunks)
+        self.assertEqual(seen, {1, 2, 3})
+        self.assertEqual(upserted, 3)
+        self.assertEqual(self.client.count(COLLECTION).count, 3)
+
+        self.embedded.clear()
+        chunks[1] = [_payload(3, 'Новый музей')]
+        _, upserted = self._ingest(chunks)
+        self.assertEqual(upserted, 1)
+        self.assertEqual(self.embedded, ['Новый музей Новый музей в центре города'])
+        (record,) = self.client.retrieve(COLLECTION, [3], with_payload=True)
+        self.assertEqual(record.payload['title'], 'Новый музей')
+
+    def test_prune(self: typing.Self) -> None:
+        self._ingest([[_payload(1, 'Кремль'), _payload(2, 'Парк')]])
+        self.assertEqual(fill_qdrant.prune(self.client, COLLECTION, {2}), 1)
+        self.assertEqual(
+            [record.id for record in self.client.scroll(COLLECTION)[0]],
+            [2],
+        )
+
+    def test_read_payloads(self: typing.Self) -> None:
+        chunks = list(
+            fill_qdrant.read_payloads(fill_qdrant.BACKEND_ROOT / 'data_cleaned.csv', 100),
+        )
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 59])
+        self.assertEqual(chunks[0][0]['location'], {'lat': 56.331576, 'lon': 44.003277})
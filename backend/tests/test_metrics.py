@@ -0,0 +1,84 @@
+import typing
+import unittest
+
+import application.services.metrics as metrics
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self.registry = metrics.Registry()
+
+    def test_counter(self: typing.Self) -> None:
+        counter = self.registry.register(metrics.Counter('requests_total', 'Requests.'))
+        counter.inc(endpoint='/handle')
+        counter.inc(2, endpoint='/handle')
+        self.assertEqual(counter.value(endpoint='/handle'), 3)
+        self.assertEqual(
+            self.registry.render(),
+            '# HELP requests_total Requests.\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{endpoint="/handle"} 3.0\n',
+        )
+
+    def test_histogram_buckets_are_cumulative(self: typing.Self) -> None:
+        histogram = self.registry.register(
+            metrics.Histogram('stage_seconds', 'Stages.', buckets=(0.1, 1.)),
+        )
+        for value in (0.05, 0.1, 0.5, 3.):
+            histogram.observe(value, stage='route')
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('stage_seconds_bucket{stage="route",le="0.1"} 2', lines)
+        self.assertIn('stage_seconds_bucket{stage="route",le="1.0"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="route",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_sum{stage="route"} 3.65', lines)
+        self.assertIn('stage_seconds_count{stage="route"} 4', lines)
+
+    def test_duplicate_name(self: typing.Self) -> None:
+        self.registry.register(metrics.Gauge('in_flight', 'In flight.'))
+        with self.assertRaises(ValueError):
+            self.registry.register(metrics.Gauge('in_flight', 'In flight.'))
+
+    def test_metric_without_samples(self: typing.Self) -> None:
+        class NoSamples(metrics._Metric):
+            type_name = 'gauge'
+
+        with self.assertRaises(TypeError):
+            NoSamples('no_samples', 'No samples.')
+
+    def test_callback_counter(self: typing.Self) -> None:
+        self.registry.register(
+            metrics.CallbackCounter('lookups_total', 'Lookups.', lambda: [({'cache': 'a'}, 2)]),
+        )
+        self.assertEqual(
+            self.registry.render(),
+            '# HELP lookups_total Lookups.\n'
+            '# TYPE lookups_total counter\n'
+            'lookups_total{cache="a"} 2.0\n',
+        )
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_server_timing(self: typing.Self) -> None:
+        count = metrics.STAGE_SECONDS.count(stage='search')
+        timer = metrics.StageTimer()
+        with timer.stage('search'):
+            self.assertEqual(metrics.STAGES_IN_FLIGHT.value(stage='search'), 1)
+        with timer.stage('search'):
+            pass
+
+        self.assertEqual(metrics.STAGES_IN_FLIGHT.value(stage='search'), 0)
+        self.assertEqual(metrics.STAGE_SECONDS.count(stage='search'), count + 2)
+        stages = [part.split(';')[0] for part in timer.server_timing().split(', ')]
+        self.assertEqual(stages, ['search', 'total'])
+
+    def test_observe_once(self: typing.Self) -> None:
+        count = metrics.STAGE_SECONDS.count(stage='generation')
+        timer = metrics.StageTimer()
+        for _ in range(3):
+            with timer.stage('generation', observe=False):
+                pass
+        self.assertEqual(metrics.STAGE_SECONDS.count(stage='generation'), count)
+
+        timer.observe('generation')
+        self.assertEqual(metrics.STAGE_SECONDS.count(stage='generation'), count + 1)
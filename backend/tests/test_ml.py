@@ -1,6 +1,9 @@
+import importlib.util
 import typing
 import unittest
+from unittest import mock
 
+import numpy as np
 import parametrize
 
 import application.models.place_payload as place_payload
@@ -42,6 +45,135 @@ class TestTextGenerationModel(unittest.TestCase):
         )
         self.assertIsInstance(response[0], str)
 
+    @parametrize.parametrize('mode', ['sequential', 'batched', 'prefix_cache'])
+    def test_get_desc_modes(self: typing.Self, mode: str) -> None:
+        places = [
+            place_payload.PlacePayload(
+                id=place_id,
+                title=title,
+                description=f'{title} в центре города',
+                score=None,
+                latitude=10,
+                longitude=10,
+            )
+            for place_id, title in enumerate(['Кремль', 'Набережная', 'Исторический музей'])
+        ]
+        with mock.patch.object(ml.settings.generation, 'mode', mode):
+            response = ml.text_generation_model.get_desc_selection(PROMPT_FOR_TEST, places)
+            streamed = list(
+                ml.text_generation_model.iter_desc_selection(PROMPT_FOR_TEST, places),
+            )
+
+        self.assertEqual(len(response), len(places))
+        self.assertEqual(len(streamed), len(places))
+        for answer in response + streamed:
+            self.assertIsInstance(answer, str)
+
+    def test_generate_batch(self: typing.Self) -> None:
+        prompts = [PROMPT_FOR_TEST, 'Назови любой музей.', 'Привет!']
+        response = ml.text_generation_model.generate_batch(
+            prompts,
+            max_new_tokens=16,
+        )
+        self.assertEqual(len(response), len(prompts))
+        for answer in response:
+            self.assertIsInstance(answer, str)
+
+
+def _find_spec_without_torchao(name: str, *args: object) -> object:
+    return None if name == 'torchao' else importlib.util.find_spec(name, *args)
+
+
+@mock.patch.object(ml.transformers.AutoTokenizer, 'from_pretrained')
+@mock.patch.object(ml.transformers.AutoModelForCausalLM, 'from_pretrained')
+@mock.patch.object(ml.settings.generation, 'report_stats', False)
+class TestPrecisionSelection(unittest.TestCase):
+    def test_auto(
+        self: typing.Self,
+        load_model: mock.MagicMock,
+        _load_tokenizer: mock.MagicMock,
+    ) -> None:
+        with (
+            mock.patch.object(ml.settings.generation, 'precision', 'auto'),
+            mock.patch.object(ml, '_quantize_weights') as quantize_weights,
+        ):
+            model = ml._TextGenerationModel()
+
+        self.assertEqual(load_model.call_args.kwargs['dtype'], 'auto')
+        quantize_weights.assert_not_called()
+        self.assertIs(model._model, load_model.return_value)
+
+    def test_stats(
+        self: typing.Self,
+        _load_model: mock.MagicMock,
+        _load_tokenizer: mock.MagicMock,
+    ) -> None:
+        with mock.patch.object(
+            ml._TextGenerationModel,
+            '_measure_tokens_per_second',
+            return_value=12.5,
+        ) as measure:
+            model = ml._TextGenerationModel()
+            measure.assert_not_called()
+            self.assertNotIn('tokens_per_second', model.stats)
+
+            with mock.patch.object(ml.settings.generation, 'report_stats', True):
+                model = ml._TextGenerationModel()
+
+        with mock.patch.dict(ml._models, {'text_generation_model': model}):
+            lines = ml.metrics.registry.render().splitlines()
+        self.assertIn(
+            f'nextstop_model_memory_bytes{{model="text_generation"}} {float(model.stats["memory_bytes"])!r}',
+            lines,
+        )
+        self.assertIn('nextstop_model_tokens_per_second{model="text_generation"} 12.5', lines)
+
+    def test_bf16_unsupported(
+        self: typing.Self,
+        load_model: mock.MagicMock,
+        _load_tokenizer: mock.MagicMock,
+    ) -> None:
+        with (
+            mock.patch.object(ml.settings.generation, 'precision', 'bf16'),
+            mock.patch.object(ml, '_bf16_supported', return_value=False),
+        ):
+            ml._TextGenerationModel()
+
+        self.assertEqual(load_model.call_args.kwargs['dtype'], ml.torch.float32)
+
+    def test_int4_without_torchao(
+        self: typing.Self,
+        load_model: mock.MagicMock,
+        _load_tokenizer: mock.MagicMock,
+    ) -> None:
+        with (
+            mock.patch.object(ml.settings.generation, 'precision', 'int4'),
+            mock.patch.object(ml.importlib.util, 'find_spec', _find_spec_without_torchao),
+            self.assertRaisesRegex(RuntimeError, 'torchao'),
+        ):
+            ml._TextGenerationModel()
+
+        self.assertEqual(load_model.call_args.kwargs['dtype'], ml.torch.float32)
+
+    def test_int8_without_torchao(
+        self: typing.Self,
+        load_model: mock.MagicMock,
+        _load_tokenizer: mock.MagicMock,
+    ) -> None:
+        with (
+            mock.patch.object(ml.settings.generation, 'precision', 'int8'),
+            mock.patch.object(ml.importlib.util, 'find_spec', _find_spec_without_torchao),
+            mock.patch.object(
+                ml.torch.ao.quantization,
+                'quantize_dynamic',
+            ) as quantize_dynamic,
+        ):
+            model = ml._TextGenerationModel()
+
+        self.assertEqual(load_model.call_args.kwargs['dtype'], ml.torch.float32)
+        quantize_dynamic.assert_called_once()
+        self.assertIs(model._model, quantize_dynamic.return_value)
+
 
 class TestEmbeddingModel(unittest.TestCase):
     @parametrize.parametrize('text', TESTS_FOR_TEST)
@@ -59,3 +191,31 @@ class TestEmbeddingModel(unittest.TestCase):
 
         ans2 = ml.embedding_model.multi_call(TESTS_FOR_TEST)
         self.assertEqual(ans1, ans2)
+
+    def test_encode(self: typing.Self) -> None:
+        expected = np.array([ml.embedding_model(el) for el in TESTS_FOR_TEST])
+
+        embeddings = ml.embedding_model.encode(TESTS_FOR_TEST, batch_size=4)
+        self.assertIsInstance(embeddings, np.ndarray)
+        self.assertEqual(embeddings.shape, (len(TESTS_FOR_TEST), ml.EMBEDDING_LENGTH))
+        np.testing.assert_allclose(embeddings, expected, atol=1e-5)
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('onnxruntime')
+    and (ml.BACKEND_ROOT / ml.settings.embedding.onnx_path).exists(),
+    'ONNX model is not exported',
+)
+class TestOnnxEmbeddingModel(unittest.TestCase):
+    def test_parity(self: typing.Self) -> None:
+        import application.services.onnx_embedding as onnx_embedding
+
+        model = onnx_embedding.OnnxEmbeddingModel(
+            ml.BACKEND_ROOT / ml.settings.embedding.onnx_path,
+        )
+        min_cosine = onnx_embedding.check_parity(
+            ml.embedding_model,
+            model,
+            TESTS_FOR_TEST,
+        )
+        self.assertGreaterEqual(min_cosine, 0.99)
@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+import time
+import typing
+import unittest
+
+import numpy as np
+
+import models.place_payload as place_payload
+import services.ml as ml
+import services.model_server as model_server
+
+PLACES: typing.Final[list[place_payload.PlacePayload]] = [
+    place_payload.PlacePayload(
+        id=place_id,
+        title=title,
+        description=title,
+        score=None,
+        latitude=56.32,
+        longitude=43.98,
+    )
+    for place_id, title in ((1, 'Исторический музей'), (2, 'Парк Швейцария'))
+]
+
+
+class TestModelServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls: type[typing.Self]) -> None:
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'models.sock')
+        cls.loop = asyncio.new_event_loop()
+        cls.task = cls.loop.create_task(model_server.ModelServer().serve(cls.path))
+        cls.thread = threading.Thread(target=cls._run_server, daemon=True)
+        cls.thread.start()
+        deadline = time.monotonic() + 120
+        while not os.path.exists(cls.path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @classmethod
+    def _run_server(cls: type[typing.Self]) -> None:
+        with contextlib.suppress(asyncio.CancelledError):
+            cls.loop.run_until_complete(cls.task)
+
+    @classmethod
+    def tearDownClass(cls: type[typing.Self]) -> None:
+        cls.loop.call_soon_threadsafe(cls.task.cancel)
+        cls.thread.join(timeout=10)
+        cls.loop.close()
+        cls.directory.cleanup()
+
+    def test_encode(self: typing.Self) -> None:
+        texts = ['музей', 'парк и кофе', 'пиво']
+        remote = model_server.RemoteEmbeddingModel(self.path)
+        np.testing.assert_allclose(
+            remote.encode(texts),
+            ml.get_embedding_model().encode(texts),
+            atol=1e-5,
+        )
+        self.assertEqual(len(remote('музей')), ml.EMBEDDING_LENGTH)
+
+    def test_desc_selection(self: typing.Self) -> None:
+        remote = model_server.RemoteTextGenerationModel(self.path)
+        explanations = remote.get_desc_selection('Хочу в музей', PLACES)
+        self.assertEqual(len(explanations), len(PLACES))
+        self.assertTrue(all(isinstance(text, str) for text in explanations))
+        self.assertEqual(len(list(remote.iter_desc_selection('Хочу в музей', PLACES))), 2)
+
+    def test_call_during_stream(self: typing.Self) -> None:
+        remote = model_server.RemoteTextGenerationModel(self.path)
+        places = PLACES * 2
+        expected = remote.get_desc_selection('Хочу в музей', places)
+        stream = remote.iter_desc_selection('Хочу в музей', places)
+        streamed = [next(stream)]
+        self.assertEqual(len(remote.get_desc_selection('Хочу в парк', PLACES)), len(PLACES))
+        streamed.extend(stream)
+        self.assertEqual(len(streamed), len(expected))
+
+    def test_concurrent_workers(self: typing.Self) -> None:
+        remote = model_server.RemoteTextGenerationModel(self.path)
+        results: list[list[str]] = []
+
+        def generate() -> None:
+            results.append(remote.generate_batch(['a b', 'c'], max_new_tokens=2))
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([len(answers) for answers in results], [2] * 4)
+
+    def test_error(self: typing.Self) -> None:
+        remote = model_server.RemoteEmbeddingModel(self.path)
+        with self.assertRaises(model_server.ModelServerError):
+            remote._connection.call('unknown')
+        self.assertEqual(remote.encode(['музей']).shape, (1, ml.EMBEDDING_LENGTH))
+
+    def test_unavailable(self: typing.Self) -> None:
+        remote = model_server.RemoteEmbeddingModel(os.path.join(self.directory.name, 'missing.sock'))
+        with self.assertRaises(model_server.ModelServerError):
+            remote.encode(['музей'])
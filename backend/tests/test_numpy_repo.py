@@ -0,0 +1,76 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+
+import numpy as np
+
+import application.db.numpy_repo as numpy_repo
+
+PAYLOADS: typing.Final[list[dict]] = [
+    {
+        'id': 3,
+        'title': 'Танковый музей',
+        'desc': 'Военная техника',
+        'location': {'lat': 56.31, 'lon': 43.98},
+    },
+    {
+        'id': 7,
+        'title': 'Парк',
+        'desc': 'Деревья и скамейки',
+        'location': {'lat': 56.32, 'lon': 44.01},
+    },
+    {
+        'id': 9,
+        'title': 'Кофейня',
+        'desc': 'Кофе и десерты',
+        'location': {'lat': 56.33, 'lon': 44.02},
+    },
+]
+
+
+class TestNumpyRepository(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self._tmp_dir.name) / 'vectors.npz'
+        numpy_repo.write_vectors(
+            self.path,
+            np.array([[1., 0., 0.], [0., 2., 0.], [1., 1., 0.]]),
+            PAYLOADS,
+        )
+        self.repository = numpy_repo.NumpyRepository(self.path)
+
+    def tearDown(self: typing.Self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_search_order(self: typing.Self) -> None:
+        places = self.repository.search([0., 1., 0.], top_k=2)
+
+        self.assertEqual([place.id for place in places], [7, 9])
+        self.assertAlmostEqual(places[0].score, 1.)
+        self.assertAlmostEqual(places[1].score, 2 ** -0.5, places=6)
+        self.assertEqual(places[0].title, 'Парк')
+        self.assertEqual(places[0].description, 'Деревья и скамейки')
+        self.assertEqual((places[0].latitude, places[0].longitude), (56.32, 44.01))
+
+    def test_top_k_larger_than_catalog(self: typing.Self) -> None:
+        places = self.repository.search([1., 0., 0.], top_k=10)
+        self.assertEqual([place.id for place in places], [3, 9, 7])
+
+    def test_search_within_radius(self: typing.Self) -> None:
+        places = self.repository.search(
+            [1., 0., 0.],
+            top_k=10,
+            origin=(56.31, 43.98),
+            radius=2500,
+        )
+        self.assertEqual([place.id for place in places], [3, 7])
+        self.assertAlmostEqual(places[0].score, 1.)
+
+    def test_nothing_within_radius(self: typing.Self) -> None:
+        places = self.repository.search(
+            [1., 0., 0.],
+            origin=(55.75, 37.61),
+            radius=1000,
+        )
+        self.assertEqual(places, [])
@@ -0,0 +1,49 @@
+import typing
+import unittest
+
+import application.schemas.user_io as user_io
+import application.services.response_cache as response_cache
+
+RESPONSE: typing.Final[user_io.UserOutput] = user_io.UserOutput(
+    walking_time=1,
+    walking_path=[],
+    explanation=['Для Вашего запроса подходит танковый музей.'],
+)
+
+
+class TestGeohash(unittest.TestCase):
+    def test_known_value(self: typing.Self) -> None:
+        self.assertEqual(response_cache.geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        self.cache = response_cache.ResponseCache(
+            similarity_threshold=0.95,
+            max_entries=2,
+            ttl_seconds=60,
+            geohash_precision=6,
+        )
+        self.cache.put([1., 0.], 56.3071, 43.9843, 3, RESPONSE)
+
+    def test_similar_request_hits(self: typing.Self) -> None:
+        self.assertIs(self.cache.get([0.99, 0.05], 56.3072, 43.9844, 3), RESPONSE)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+    def test_misses(self: typing.Self) -> None:
+        self.assertIsNone(self.cache.get([0., 1.], 56.3071, 43.9843, 3))
+        self.assertIsNone(self.cache.get([1., 0.], 56.3071, 43.9843, 4))
+        self.assertIsNone(self.cache.get([1., 0.], 56.2, 43.9, 3))
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_eviction(self: typing.Self) -> None:
+        self.cache.put([0., 1.], 56.3071, 43.9843, 3, RESPONSE)
+        self.cache.put([1., 1.], 56.3071, 43.9843, 3, RESPONSE)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get([1., 0.], 56.3071, 43.9843, 3))
+
+    def test_invalidate(self: typing.Self) -> None:
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNone(self.cache.get([1., 0.], 56.3071, 43.9843, 3))
@@ -0,0 +1,147 @@
+import email.parser
+import email.policy
+import hashlib
+import http.server
+import io
+import os
+import pathlib
+import tarfile
+import tempfile
+import threading
+import typing
+import unittest
+
+import restore_qdrant_snapshot
+
+SNAPSHOT: typing.Final[bytes] = os.urandom(300_000)
+
+
+def _make_archive() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, data in [
+            ('snapshot/._nn_places.snapshot', b'resource fork'),
+            ('snapshot/meta.json', b'{}' * 1024),
+            ('snapshot/nn_places.snapshot', SNAPSHOT),
+        ]:
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+ARCHIVE: typing.Final[bytes] = _make_archive()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    ranges: typing.ClassVar[list[str | None]] = []
+    uploads: typing.ClassVar[list[tuple[str, bytes]]] = []
+
+    def do_GET(self: typing.Self) -> None:  # noqa: N802
+        range_header = self.headers.get('Range')
+        self.ranges.append(range_header)
+        start = int(range_header.removeprefix('bytes=').rstrip('-')) if range_header else 0
+        self.send_response(206 if range_header else 200)
+        self.send_header('Content-Length', str(len(ARCHIVE) - start))
+        self.end_headers()
+        self.wfile.write(ARCHIVE[start:])
+
+    def do_POST(self: typing.Self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + body,
+        )
+        (part,) = message.iter_parts()
+        self.uploads.append((self.path, part.get_payload(decode=True)))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self: typing.Self, *args: object) -> None:
+        pass
+
+
+class TestRestoreSnapshot(unittest.TestCase):
+    def setUp(self: typing.Self) -> None:
+        _Handler.ranges.clear()
+        _Handler.uploads.clear()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.download_dir = pathlib.Path(self._tmp_dir.name)
+
+    def tearDown(self: typing.Self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmp_dir.cleanup()
+
+    def _restore(
+        self: typing.Self,
+        source: str,
+        sha256: str | None = None,
+        verify: bool = True,
+    ) -> None:
+        restore_qdrant_snapshot.restore(
+            source,
+            self.download_dir,
+            self.url,
+            'nn_places',
+            sha256=sha256,
+            verify=verify,
+        )
+
+    def test_resume_download(self: typing.Self) -> None:
+        (self.download_dir / 'snapshot.tar.gz.part').write_bytes(ARCHIVE[:1000])
+
+        self._restore(
+            f'{self.url}/snapshot.tar.gz',
+            sha256=hashlib.sha256(ARCHIVE).hexdigest(),
+        )
+
+        self.assertEqual(_Handler.ranges, ['bytes=1000-'])
+        self.assertEqual((self.download_dir / 'snapshot.tar.gz').read_bytes(), ARCHIVE)
+        self.assertEqual(
+            _Handler.uploads,
+            [('/collections/nn_places/snapshots/upload?priority=snapshot', SNAPSHOT)],
+        )
+
+    def test_checksum_mismatch(self: typing.Self) -> None:
+        with self.assertRaises(restore_qdrant_snapshot.ChecksumError):
+            self._restore(f'{self.url}/snapshot.tar.gz', sha256='0' * 64)
+
+        self.assertFalse((self.download_dir / 'snapshot.tar.gz').exists())
+        self.assertEqual(_Handler.uploads, [])
+
+    def test_local_archive_checksum_mismatch(self: typing.Self) -> None:
+        archive_path = self.download_dir / 'local.tar.gz'
+        archive_path.write_bytes(ARCHIVE)
+
+        with self.assertRaises(restore_qdrant_snapshot.ChecksumError):
+            self._restore(archive_path.as_uri(), sha256='0' * 64)
+
+        self.assertEqual(archive_path.read_bytes(), ARCHIVE)
+        self.assertEqual(_Handler.uploads, [])
+
+    def test_local_archive(self: typing.Self) -> None:
+        archive_path = self.download_dir / 'local.tar.gz'
+        archive_path.write_bytes(ARCHIVE)
+
+        self._restore(str(archive_path), sha256=hashlib.sha256(ARCHIVE).hexdigest())
+
+        self.assertEqual(_Handler.ranges, [])
+        self.assertEqual(_Handler.uploads[0][1], SNAPSHOT)
+
+    def test_unknown_checksum_is_refused(self: typing.Self) -> None:
+        with self.assertRaises(restore_qdrant_snapshot.ChecksumError):
+            self._restore(f'{self.url}/snapshot.tar.gz')
+
+        self.assertEqual(_Handler.ranges, [])
+        self.assertFalse((self.download_dir / 'snapshot.tar.gz').exists())
+        self.assertEqual(_Handler.uploads, [])
+
+    def test_no_verify(self: typing.Self) -> None:
+        self._restore(f'{self.url}/snapshot.tar.gz', sha256='0' * 64, verify=False)
+
+        self.assertEqual(_Handler.uploads[0][1], SNAPSHOT)
@@ -0,0 +1,50 @@
+import asyncio
+import typing
+import unittest
+
+import application.services.scheduler as scheduler
+
+
+class TestMicroBatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_are_batched(self: typing.Self) -> None:
+        batches: list[list[int]] = []
+
+        def batch_fn(items: list[int]) -> list[int]:
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        batcher = scheduler.MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.close()
+
+        self.assertEqual(results, [0, 2, 4, 6, 8])
+        self.assertEqual(batches, [[0, 1, 2, 3, 4]])
+
+    async def test_max_batch_size(self: typing.Self) -> None:
+        batches: list[list[int]] = []
+
+        def batch_fn(items: list[int]) -> list[int]:
+            batches.append(items)
+            return items
+
+        batcher = scheduler.MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.close()
+
+        self.assertEqual(results, list(range(5)))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+    async def test_error_is_propagated(self: typing.Self) -> None:
+        calls: list[list[int]] = []
+
+        def batch_fn(items: list[int]) -> list[int]:
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError('model failed')
+            return items
+
+        batcher = scheduler.MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=1)
+        with self.assertRaises(RuntimeError):
+            await batcher.submit(1)
+        self.assertEqual(await batcher.submit(2), 2)
+        await batcher.close()
@@ -1,7 +1,10 @@
+import itertools
+import random
 import typing
 import unittest
 
 import application.models.place_payload as place_payload
+import application.services.route_solver as route_solver
 import application.services.utils as utils
 
 PLACES: typing.Final[list[place_payload.PlacePayload]] = [
@@ -35,3 +38,103 @@ class TestGetBestRoute(unittest.TestCase):
         )
         self.assertIsInstance(result, list|type(None))
 
+
+
+def _brute_force_route(
+    scores: list[float],
+    start_times: list[float],
+    edge_times: list[list[float]],
+    time_limit: float,
+    max_len: int,
+    min_len: int,
+) -> tuple[float, float] | None:
+    best: tuple[float, float] | None = None
+    for length in range(max(min_len, 1), max_len + 1):
+        for perm in itertools.permutations(range(len(scores)), length):
+            time = start_times[perm[0]] + sum(
+                edge_times[a][b] for a, b in itertools.pairwise(perm)
+            )
+            if time > time_limit:
+                continue
+            score = sum(scores[i] for i in perm)
+            if best is None or (round(score, 9), -time) > (round(best[0], 9), -best[1]):
+                best = (score, time)
+    return best
+
+
+class TestSolveRoute(unittest.TestCase):
+    def test_matches_brute_force(self: typing.Self) -> None:
+        rng = random.Random(42)
+        for _ in range(200):
+            count = rng.randint(1, 7)
+            scores = [rng.uniform(0.3, 0.9) for _ in range(count)]
+            start_times = [rng.uniform(5, 90) for _ in range(count)]
+            edge_times = [
+                [rng.uniform(5, 60) for _ in range(count)] for _ in range(count)
+            ]
+            time_limit = rng.uniform(30, 200)
+            max_len = rng.randint(1, 5)
+            min_len = rng.randint(0, max_len)
+
+            expected = _brute_force_route(
+                scores, start_times, edge_times, time_limit, max_len, min_len,
+            )
+            result = route_solver.solve_route(
+                scores, start_times, edge_times, time_limit, max_len, min_len,
+            )
+            if expected is None:
+                self.assertIsNone(result)
+                continue
+            route, time = result.route, result.time
+            self.assertTrue(result.optimal)
+            self.assertLessEqual(len(route), max_len)
+            self.assertGreaterEqual(len(route), max(min_len, 1))
+            self.assertEqual(len(set(route)), len(route))
+            self.assertAlmostEqual(sum(scores[i] for i in route), expected[0])
+            self.assertAlmostEqual(time, expected[1])
+
+    def test_twenty_candidates(self: typing.Self) -> None:
+        rng = random.Random(7)
+        count = 20
+        scores = [rng.uniform(0.6, 0.8) for _ in range(count)]
+        start_times = [rng.uniform(5, 30) for _ in range(count)]
+        edge_times = [[rng.uniform(15, 45) for _ in range(count)] for _ in range(count)]
+        result = route_solver.solve_route(
+            scores, start_times, edge_times, 180, 5,
+        )
+        self.assertEqual(len(result.route), 5)
+        self.assertLessEqual(result.time, 180)
+
+    def test_expired_deadline_before_feasible_route(self: typing.Self) -> None:
+        # Places 0..99 are far from everything, only 100 and 101 make a
+        # route of min_len, and the greedy seed never reaches it.
+        count = 102
+        scores = [0.9] * 100 + [0.4, 0.4]
+        start_times = [10.] * count
+        edge_times = [[1000.] * count for _ in range(count)]
+        edge_times[100][101] = edge_times[101][100] = 10.
+        result = route_solver.solve_route(
+            scores, start_times, edge_times, 50, 2, 2, deadline=0.,
+        )
+        self.assertIsNotNone(result)
+        self.assertCountEqual(result.route, [100, 101])
+
+    def test_expired_deadline(self: typing.Self) -> None:
+        rng = random.Random(11)
+        count = 40
+        scores = [rng.uniform(0.3, 0.9) for _ in range(count)]
+        start_times = [rng.uniform(5, 30) for _ in range(count)]
+        edge_times = [[rng.uniform(10, 40) for _ in range(count)] for _ in range(count)]
+        result = route_solver.solve_route(
+            scores, start_times, edge_times, 150, 5, 2, deadline=0.,
+        )
+        self.assertFalse(result.optimal)
+        self.assertGreaterEqual(len(result.route), 2)
+        self.assertEqual(len(set(result.route)), len(result.route))
+        self.assertAlmostEqual(
+            result.time,
+            start_times[result.route[0]] + sum(
+                edge_times[a][b] for a, b in itertools.pairwise(result.route)
+            ),
+        )
+        self.assertLessEqual(result.time, 150)